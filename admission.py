@@ -0,0 +1,202 @@
+"""
+Admission control for job submission.
+
+POST /api/generate-test-cases is checked before anything is saved:
+
+1. size limits: request body bytes, stories per request and characters per
+   story are capped (413);
+2. hard queue cap: no more than ADMISSION_MAX_QUEUED_JOBS jobs IN_QUEUE
+   (429);
+3. per-user quota: a user may have at most ADMISSION_USER_MAX_PENDING_STORIES
+   stories queued or in progress (429);
+4. estimated wait: stories already pending divided by cluster throughput
+   (an EWMA of stories/second per job that workers record through the queue
+   backend, times the number of live workers; see job_queue.py). Submissions
+   that would not start within ADMISSION_MAX_WAIT_SECONDS get 429.
+
+Queue depth and pending stories come from scheduled_jobs, so admission only
+needs Postgres: the caller's own pending stories are counted on every
+submit, cluster-wide totals and throughput are cached for
+ADMISSION_STATS_TTL seconds. If the queue backend can't report throughput
+(e.g. Redis is down) admission fails open: the wait check is skipped and
+the failure logged.
+
+Rejections carry Retry-After; admitted jobs get an estimated start time.
+"""
+import logging
+import math
+import os
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+from db import get_connection
+from job_queue import get_job_queue
+
+MAX_BODY_BYTES = int(os.environ.get("ADMISSION_MAX_BODY_BYTES", str(1024 * 1024)))
+MAX_STORIES_PER_REQUEST = int(os.environ.get("ADMISSION_MAX_STORIES_PER_REQUEST", "50"))
+MAX_STORY_CHARS = int(os.environ.get("ADMISSION_MAX_STORY_CHARS", "20000"))
+MAX_QUEUED_JOBS = int(os.environ.get("ADMISSION_MAX_QUEUED_JOBS", "500"))
+USER_MAX_PENDING_STORIES = int(os.environ.get("ADMISSION_USER_MAX_PENDING_STORIES", "200"))
+MAX_WAIT_SECONDS = float(os.environ.get("ADMISSION_MAX_WAIT_SECONDS", "900"))
+STATS_TTL = float(os.environ.get("ADMISSION_STATS_TTL", "5"))
+
+logger = logging.getLogger("admission")
+
+
+def _reject(status: int, message: str, retry_after: Optional[float] = None, **extra):
+    headers = None
+    detail: Dict[str, Any] = {"message": message, **extra}
+    if retry_after is not None:
+        retry_after = max(1, math.ceil(retry_after))
+        headers = {"Retry-After": str(retry_after)}
+        detail["retry_after"] = retry_after
+    raise HTTPException(status_code=status, detail=detail, headers=headers)
+
+
+async def request_size_middleware(request, call_next):
+    """
+    Reject oversized submissions from Content-Length before the body is read.
+    """
+    length = request.headers.get("content-length")
+    if request.method == "POST" and length and length.isdigit() and int(length) > MAX_BODY_BYTES:
+        return JSONResponse(
+            status_code=413,
+            content={"detail": {"message": f"Request body exceeds {MAX_BODY_BYTES} bytes"}},
+        )
+    return await call_next(request)
+
+
+def check_request_size(payloads: List[Dict[str, Any]]):
+    if len(payloads) > MAX_STORIES_PER_REQUEST:
+        _reject(413, f"At most {MAX_STORIES_PER_REQUEST} user stories per request")
+    for index, payload in enumerate(payloads):
+        size = len(payload.get("user_story") or "") + len(payload.get("acceptance_criteria") or "")
+        if size > MAX_STORY_CHARS:
+            _reject(413, f"User story {index} exceeds {MAX_STORY_CHARS} characters")
+
+
+def _pending_stories(user_ids) -> Dict[Any, int]:
+    """
+    Stories in queued or running jobs of each of the given users.
+    """
+    conn = get_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT sj.user_id, count(*) AS stories
+                FROM scheduled_jobs sj
+                JOIN user_stories us ON us.job_id = sj.job_id AND us.submitted_at = sj.submitted_at
+                WHERE sj.status IN ('IN_QUEUE', 'IN_PROGRESS')
+                  AND sj.user_id = ANY(%s)
+                GROUP BY sj.user_id
+                """,
+                (list(user_ids),),
+            )
+            rows = cursor.fetchall()
+    finally:
+        conn.close()
+
+    pending = {user_id: 0 for user_id in user_ids}
+    for row in rows:
+        pending[row["user_id"]] = row["stories"]
+    return pending
+
+
+def _backlog() -> Dict[str, int]:
+    """
+    Jobs waiting to start and stories queued or running, across all users.
+    """
+    conn = get_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT
+                    (SELECT count(*) FROM scheduled_jobs WHERE status = 'IN_QUEUE') AS queued_jobs,
+                    (SELECT count(*)
+                     FROM scheduled_jobs sj
+                     JOIN user_stories us ON us.job_id = sj.job_id AND us.submitted_at = sj.submitted_at
+                     WHERE sj.status IN ('IN_QUEUE', 'IN_PROGRESS')) AS pending_stories
+                """
+            )
+            return cursor.fetchone()
+    finally:
+        conn.close()
+
+
+def _throughput() -> Optional[float]:
+    try:
+        return get_job_queue().throughput()
+    except Exception:
+        logger.warning("Queue backend throughput unavailable; skipping the wait estimate", exc_info=True)
+        return None
+
+
+_stats_cache = {"at": 0.0, "value": None}
+
+
+def _cluster_stats():
+    """
+    (queued jobs, pending stories, throughput), cached for
+    ADMISSION_STATS_TTL seconds so submissions share the cluster-wide
+    counts and at most one queue backend call per interval.
+    """
+    now = time.monotonic()
+    if _stats_cache["value"] is None or now - _stats_cache["at"] > STATS_TTL:
+        backlog = _backlog()
+        _stats_cache["value"] = (backlog["queued_jobs"], backlog["pending_stories"], _throughput())
+        _stats_cache["at"] = now
+    return _stats_cache["value"]
+
+
+def admit(payloads: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Decide whether a submission may be queued. Raises HTTPException (413/429)
+    when it may not; otherwise returns the estimated wait before it starts.
+    """
+    check_request_size(payloads)
+
+    new_stories = Counter(p["user_id"] for p in payloads)
+    pending = _pending_stories(new_stories)
+    queued_jobs, pending_stories, throughput = _cluster_stats()
+    wait = pending_stories / throughput if throughput else None
+
+    if queued_jobs >= MAX_QUEUED_JOBS:
+        # Time for the jobs over the cap to drain, assuming similar job sizes.
+        excess = (queued_jobs - MAX_QUEUED_JOBS + 1) / queued_jobs
+        _reject(
+            429,
+            "Job queue is full",
+            retry_after=wait * excess if wait else 60,
+            queued_jobs=queued_jobs,
+        )
+
+    for user_id, count in new_stories.items():
+        if pending[user_id] + count > USER_MAX_PENDING_STORIES:
+            excess = pending[user_id] + count - USER_MAX_PENDING_STORIES
+            _reject(
+                429,
+                f"User {user_id} has {pending[user_id]} stories pending "
+                f"(limit {USER_MAX_PENDING_STORIES})",
+                retry_after=excess / throughput if throughput else 60,
+                pending_stories=pending[user_id],
+            )
+
+    if wait is None:
+        return {"estimated_wait_seconds": None, "estimated_start": None}
+    if wait > MAX_WAIT_SECONDS:
+        _reject(
+            429,
+            "Generation backlog is too long; try again later",
+            retry_after=wait - MAX_WAIT_SECONDS,
+            estimated_wait_seconds=round(wait),
+        )
+    return {
+        "estimated_wait_seconds": round(wait),
+        "estimated_start": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() + wait)),
+    }
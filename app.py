@@ -3,6 +3,7 @@ import uuid
 from fastapi import FastAPI, HTTPException, Form, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi import Body,BackgroundTasks
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel, HttpUrl
 from typing import Optional, List, Dict, Any, Union
 import json
@@ -13,25 +14,58 @@ from uuid import uuid4
 import logging
 import traceback
 import threading
+from contextlib import asynccontextmanager
 # Import your existing utilities/config
 
 
 from tools.save_job import save_scheduled_job
-from rq_config import test_generation_queue
+from job_queue import PRIORITY_INTERACTIVE, get_job_queue
 from tools.extract_rows import extract_test_cases
 from tools.priority_summary import summarize_test_case_priorities
+from tools.export import EXPORTERS, stream_scripts_zip
+from tools.search import search as search_corpus
+from tools.batch_results import PROJECTIONS, RESULTS_BATCH_MAX_JOBS, fetch_results
+from tools.minhash import archived_job_count, find_redundant_clusters
 from psycopg.rows import dict_row
+import admission
+import archive
+import db
+import outbox
 from db import get_connection as get_db
+import metrics
+import sql_profiler
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
 # Configure logging
 logging.basicConfig(
-    level=logging.DEBUG,
+    level=os.environ.get("LOG_LEVEL", "INFO").upper(),
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
 
+# Run the outbox relay in API processes too, so submitted jobs are published
+# even when no worker is running.
+OUTBOX_RELAY_IN_API = os.environ.get("OUTBOX_RELAY_IN_API", "1") == "1"
 
-app = FastAPI(title="AI-SageScript Backend (FastAPI)")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Resources are created here rather than at import time so importing
+    # app.py is cheap and does not require DATABASE_URL/REDIS_URL.
+    try:
+        db.open_pool()
+    except KeyError:
+        logger.error("DATABASE_URL is not set; /readyz will report the database as unavailable")
+    else:
+        if OUTBOX_RELAY_IN_API:
+            outbox.start_relay()
+    try:
+        yield
+    finally:
+        db.close_pool()
+
+
+app = FastAPI(title="AI-SageScript Backend (FastAPI)", lifespan=lifespan)
 
 origins = [
     "http://localhost:4200",
@@ -45,8 +79,16 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[db.PRIMARY_HEADER],
 )
 
+app.middleware("http")(admission.request_size_middleware)
+app.middleware("http")(db.primary_affinity_middleware)
+app.middleware("http")(metrics.metrics_middleware)
+if sql_profiler.ENABLED:
+    app.middleware("http")(sql_profiler.profiler_middleware)
+metrics.register_queue_collector()
+
 
 
 
@@ -112,6 +154,32 @@ def _map_framework_label_to_key(label: str) -> str:
 # ------------ Endpoints ------------
 from fastapi import HTTPException
 
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+@app.get("/healthz", include_in_schema=False)
+async def liveness():
+    """
+    Liveness: the process is up and serving requests.
+    """
+    return {"status": "ok"}
+
+
+@app.get("/readyz", include_in_schema=False)
+def readiness():
+    """
+    Readiness: the database pool and the queue backend both answer.
+    """
+    checks = {"database": db.pool_health(), "queue": get_job_queue().health()}
+    ready = all(check["ok"] for check in checks.values())
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "unavailable", "checks": checks},
+    )
+
+
 @app.post("/api/login")
 async def login(req: LoginRequest):
     conn = get_db()
@@ -254,7 +322,7 @@ async def get_user_projects(username: str):
     Return list of projects for the user with display_name == username.
     If user not found, returns 404.
     """
-    conn = get_db()
+    conn = db.get_read_connection()
     try:
         with conn.cursor() as cur:
             # 1. Fetch user
@@ -317,21 +385,20 @@ async def submit_tests(
     # 2️⃣ Convert to dicts
     payload_dicts = [p.model_dump() for p in payloads]
 
-    # 3️⃣ Save job + user stories
-    job_id = save_scheduled_job(payload_dicts)
-
+    # Size limits, queue depth and per-user quota (413/429 with Retry-After)
+    estimate = admission.admit(payload_dicts)
 
-    # 4️⃣ Enqueue async processing
-    test_generation_queue.enqueue(
-        "worker.generate_functional_tests_job",
-        job_id
-    )
+    # 3️⃣ Save job + user stories; the enqueue is written to the outbox in
+    # the same transaction and published by the relay
+    job_id = save_scheduled_job(payload_dicts)
+    metrics.record_job_transition(None, "IN_QUEUE")
 
 
     return {
         "job_id": job_id,
         "status": "IN_QUEUE",
-        "user_story_count": len(payloads)
+        "user_story_count": len(payloads),
+        **estimate,
     }
 
 
@@ -395,7 +462,7 @@ async def submit_tests(
 async def get_all_jobs():
     jobs_list = []
 
-    conn = get_db()
+    conn = db.get_read_connection()
     try:
         with conn.cursor() as cursor:
             cursor.execute(
@@ -418,10 +485,12 @@ async def get_all_jobs():
                                 END
                             ),
                             0
-                        ) AS test_count
+                        ) + COALESCE(MAX(ja.test_case_count), 0) AS test_count
                     FROM scheduled_jobs sj
                     LEFT JOIN function_test_cases ftc
-                        ON sj.job_id = ftc.job_id
+                        ON sj.job_id = ftc.job_id AND ftc.submitted_at = sj.submitted_at
+                    LEFT JOIN job_archive ja
+                        ON ja.job_id = sj.job_id
                     GROUP BY
                         sj.job_id,
                         sj.project_name,
@@ -464,7 +533,7 @@ async def get_job_by_id(job_id: str):
     """
     Fetch job details by job_id.
     """
-    conn = get_db()
+    conn = db.get_read_connection()
     try:
         with conn.cursor() as cursor:
             # 1️⃣ Fetch job details
@@ -477,7 +546,8 @@ async def get_job_by_id(job_id: str):
                     description,
                     status,
                     submitted_at,
-                    framework_choice
+                    framework_choice,
+                    archived_at
                 FROM scheduled_jobs
                 WHERE job_id = %s
                 """,
@@ -488,6 +558,15 @@ async def get_job_by_id(job_id: str):
             if not job:
                 raise HTTPException(status_code=404, detail="Job not found")
 
+            if job["archived_at"]:
+                document = archive.load_archived(cursor, job["job_id"])
+                return {
+                    "id": job["job_id"],
+                    "project": job["project_name"],
+                    "status": job["status"],
+                    "test_count": len(document["user_stories"]),
+                }
+
             # 2️⃣ Fetch associated user stories
             cursor.execute(
                 """
@@ -496,9 +575,9 @@ async def get_job_by_id(job_id: str):
                     user_story_text,
                     acceptance_criteria
                 FROM user_stories
-                WHERE job_id = %s
+                WHERE job_id = %s AND submitted_at = %s
                 """,
-                (job_id,),
+                (job_id, job["submitted_at"]),
             )
             user_stories = cursor.fetchall()
 
@@ -510,9 +589,9 @@ async def get_job_by_id(job_id: str):
                     """
                     SELECT test_case_id, result
                     FROM function_test_cases
-                    WHERE user_story_id = %s
+                    WHERE user_story_id = %s AND submitted_at = %s
                     """,
-                    (story["user_story_id"],),
+                    (story["user_story_id"], job["submitted_at"]),
                 )
                 functional_rows = cursor.fetchall()
 
@@ -521,9 +600,9 @@ async def get_job_by_id(job_id: str):
                     """
                     SELECT automation_id, script
                     FROM automation_scripts
-                    WHERE user_story_id = %s
+                    WHERE user_story_id = %s AND submitted_at = %s
                     """,
-                    (story["user_story_id"],),
+                    (story["user_story_id"], job["submitted_at"]),
                 )
                 automation_scripts = cursor.fetchall()
 
@@ -614,7 +693,7 @@ async def verify_user(token: str):
 
 
 @app.post("/api/jobs/{job_id}/regenerate")
-async def regenerate_job(job_id: str, background_tasks: BackgroundTasks):
+async def regenerate_job(job_id: str):
     """
     Re-submit a job for processing by resetting its status and re-queuing it.
     """
@@ -624,9 +703,10 @@ async def regenerate_job(job_id: str, background_tasks: BackgroundTasks):
             # 1️⃣ Check if job exists
             cursor.execute(
                 """
-                SELECT job_id
+                SELECT job_id, status, submitted_at, archived_at, lease_expires_at > now() AS leased
                 FROM scheduled_jobs
                 WHERE job_id = %s
+                FOR UPDATE
                 """,
                 (job_id,),
             )
@@ -634,26 +714,52 @@ async def regenerate_job(job_id: str, background_tasks: BackgroundTasks):
 
             if not job:
                 raise HTTPException(status_code=404, detail="Job not found")
+            # A live lease means a worker is still on it; a dead one is
+            # recovered by the lease reaper.
+            if job["status"] == "IN_PROGRESS" and job["leased"]:
+                raise HTTPException(status_code=409, detail="Job is currently being processed")
+            # Archived jobs no longer have their stories in the hot tables.
+            if job["archived_at"]:
+                raise HTTPException(status_code=409, detail="Job is archived")
+
+            # 2️⃣ Clear previous results, so moving the job to the current
+            # month's partition only carries its stories along
+            cursor.execute(
+                "DELETE FROM function_test_cases WHERE job_id = %s AND submitted_at = %s",
+                (job["job_id"], job["submitted_at"]),
+            )
+            cursor.execute(
+                """
+                DELETE FROM automation_scripts
+                WHERE submitted_at = %s
+                  AND user_story_id IN (
+                      SELECT user_story_id FROM user_stories WHERE job_id = %s AND submitted_at = %s
+                  )
+                """,
+                (job["submitted_at"], job["job_id"], job["submitted_at"]),
+            )
 
-            # 2️⃣ Reset job state
+            # 3️⃣ Reset job state
             cursor.execute(
                 """
                 UPDATE scheduled_jobs
                 SET status = 'IN_QUEUE',
-                    submitted_at = CURRENT_TIMESTAMP
+                    submitted_at = CURRENT_TIMESTAMP,
+                    attempts = 0,
+                    lease_owner = NULL,
+                    lease_attempt_id = NULL,
+                    lease_expires_at = NULL,
+                    next_attempt_at = NULL
                 WHERE job_id = %s
                 """,
                 (job_id,),
             )
 
-        conn.commit()
+            # 4️⃣ Re-trigger processing (published by the outbox relay)
+            outbox.enqueue_job(cursor, job["job_id"], priority=PRIORITY_INTERACTIVE)
 
-        # 3️⃣ Re-trigger processing
-        background_tasks.add_task(
-            test_generation_queue.enqueue,
-            "worker.generate_functional_tests_job",
-            job_id,
-        )
+        conn.commit()
+        metrics.record_job_transition(job["status"], "IN_QUEUE")
 
         return {
             "status": "success",
@@ -665,52 +771,49 @@ async def regenerate_job(job_id: str, background_tasks: BackgroundTasks):
         conn.close()
 
 
-@app.get("/api/results/{job_id}")
-async def get_job_results(job_id: str):
-    # Fetch job from mock DBasync def create_project(req: CreateProjectRequest, request: Request):
-    conn = get_db()
+@app.get("/api/jobs/{job_id}/attempts")
+async def get_job_attempts(job_id: int):
+    """
+    Execution attempts of a job (worker, timing, outcome), oldest first.
+    """
+    conn = db.get_read_connection()
     try:
         with conn.cursor() as cursor:
-            # 1️⃣ Fetch functional test cases for the job
             cursor.execute(
                 """
-                SELECT
-                    ftc.test_case_id,
-                    ftc.result
-                FROM function_test_cases ftc
-                WHERE ftc.job_id = %s
+                SELECT job_id, status, attempts, lease_owner, lease_expires_at, next_attempt_at
+                FROM scheduled_jobs
+                WHERE job_id = %s
                 """,
                 (job_id,),
             )
-            functional_rows = cursor.fetchall()
-
-            # 2️⃣ Extract test cases
-            #test_cases = extract_test_cases(functional_rows)
-            results_payloads = [row["result"] for row in functional_rows]
-            test_cases = extract_test_cases(results_payloads)
-            # 4️⃣ Summarize priorities
-            summary = summarize_test_case_priorities(test_cases)
+            job = cursor.fetchone()
+            if not job:
+                raise HTTPException(status_code=404, detail="Job not found")
 
-            # 5️⃣ Fetch automation scripts for the job
             cursor.execute(
                 """
-                SELECT
-                    ascr.script
-                FROM automation_scripts ascr
-                JOIN user_stories us ON ascr.user_story_id = us.user_story_id
-                WHERE us.job_id = %s
+                SELECT attempt, worker_id, started_at, heartbeat_at, finished_at, outcome
+                FROM job_attempts
+                WHERE job_id = %s
+                ORDER BY attempt, attempt_id
                 """,
                 (job_id,),
             )
-            automation_rows = cursor.fetchall()
+            job["history"] = cursor.fetchall()
+            return job
 
-            # 6️⃣ Process automation scripts
-            # dict comprehension to store scripts by their 
+    finally:
+        conn.close()
 
-            automation_scripts = automation_rows[0]["script"] if automation_rows else {}
 
-   
-            # 3️⃣ Fetch job info
+@app.get("/api/results/{job_id}")
+async def get_job_results(job_id: str):
+    conn = db.get_read_connection()
+    try:
+        with conn.cursor() as cursor:
+            # 1️⃣ Fetch job info (its submitted_at prunes the lookups below
+            # to one partition)
             cursor.execute(
                 """
                 SELECT
@@ -718,13 +821,58 @@ async def get_job_results(job_id: str):
                     project_name,
                     description,
                     status,
-                    submitted_at
+                    submitted_at,
+                    archived_at
                 FROM scheduled_jobs
                 WHERE job_id = %s
                 """,
                 (job_id,),
-            )   
-            job = cursor.fetchone() 
+            )
+            job = cursor.fetchone()
+            if not job:
+                raise HTTPException(status_code=404, detail="Job not found")
+
+            if job["archived_at"]:
+                # Old jobs' results live compressed in job_archive.
+                document = archive.load_archived(cursor, job["job_id"])
+                functional_rows = document["function_test_cases"]
+                automation_rows = document["automation_scripts"]
+            else:
+                # 2️⃣ Fetch functional test cases for the job
+                cursor.execute(
+                    """
+                    SELECT
+                        ftc.test_case_id,
+                        ftc.result
+                    FROM function_test_cases ftc
+                    WHERE ftc.job_id = %s AND ftc.submitted_at = %s
+                    """,
+                    (job_id, job["submitted_at"]),
+                )
+                functional_rows = cursor.fetchall()
+
+                # 3️⃣ Fetch automation scripts for the job
+                cursor.execute(
+                    """
+                    SELECT
+                        ascr.script
+                    FROM automation_scripts ascr
+                    JOIN user_stories us
+                        ON ascr.user_story_id = us.user_story_id AND ascr.submitted_at = us.submitted_at
+                    WHERE us.job_id = %s AND us.submitted_at = %s
+                    """,
+                    (job_id, job["submitted_at"]),
+                )
+                automation_rows = cursor.fetchall()
+
+            # 4️⃣ Extract test cases
+            results_payloads = [row["result"] for row in functional_rows]
+            test_cases = extract_test_cases(results_payloads)
+            # 5️⃣ Summarize priorities
+            summary = summarize_test_case_priorities(test_cases)
+
+            automation_scripts = automation_rows[0]["script"] if automation_rows else {}
+
             STATUS_MAP = {
                 "IN_QUEUE": "In Queue",
                 "IN_PROGRESS": "In Progress",
@@ -753,39 +901,79 @@ async def get_job_results(job_id: str):
     finally:
         conn.close()
 
+
+@app.get("/api/results")
+async def get_jobs_results(job_ids: str, fields: str = "summary"):
+    """
+    Results for many jobs at once, e.g. ?job_ids=12,15,31&fields=titles.
+    fields is summary (counts), titles (counts plus test case ID/title/priority)
+    or full (the /api/results/{job_id} payload per job).
+    """
+    if fields not in PROJECTIONS:
+        raise HTTPException(status_code=400, detail=f"fields must be one of: {', '.join(PROJECTIONS)}")
+    try:
+        ids = [int(part) for part in job_ids.split(",") if part.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="job_ids must be comma-separated integers")
+    if not ids or len(set(ids)) > RESULTS_BATCH_MAX_JOBS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Between 1 and {RESULTS_BATCH_MAX_JOBS} job ids are required",
+        )
+    return fetch_results(ids, fields)
+
 @app.get("/api/dashboard/{user_id}")
 async def get_dashboard_stats(user_id: int):
-    conn = get_db()
+    conn = db.get_read_connection()
     try:
         with conn.cursor() as cur:
             # 1. Aggregate Top Stats
-            cur.execute("""
+            # Test case rows hold batches of cases, so count the cases in them
+            cur.execute(f"""
                 SELECT 
                     (SELECT COUNT(*) FROM user_projects WHERE user_id = %s) as total_projects,
                     (SELECT COUNT(*) FROM user_projects WHERE user_id = %s AND sub_project_name IS NULL) as root_projects,
-                    (SELECT COUNT(*) FROM function_test_cases ftc 
-                     JOIN scheduled_jobs sj ON ftc.job_id = sj.job_id 
+                    (SELECT COALESCE(SUM({archive.TEST_COUNT_SQL}), 0) FROM function_test_cases ftc 
+                     JOIN scheduled_jobs sj ON ftc.job_id = sj.job_id AND ftc.submitted_at = sj.submitted_at
                      WHERE sj.user_id = %s) as total_test_cases,
                     (SELECT COUNT(*) FROM automation_scripts ascr 
-                     JOIN user_stories us ON ascr.user_story_id = us.user_story_id 
-                     JOIN scheduled_jobs sj ON us.job_id = sj.job_id 
+                     JOIN user_stories us ON ascr.user_story_id = us.user_story_id AND ascr.submitted_at = us.submitted_at
+                     JOIN scheduled_jobs sj ON us.job_id = sj.job_id AND us.submitted_at = sj.submitted_at
                      WHERE sj.user_id = %s) as total_scripts
             """, (user_id, user_id, user_id, user_id))
             top_stats = cur.fetchone()
 
-            # 2. Recent Jobs (Last 5)
+            # Archived jobs keep their counts in job_archive
             cur.execute("""
+                SELECT
+                    COALESCE(SUM(ja.test_case_count), 0) as test_case_count,
+                    COALESCE(SUM(ja.script_count), 0) as script_count
+                FROM job_archive ja
+                JOIN scheduled_jobs sj ON ja.job_id = sj.job_id AND ja.submitted_at = sj.submitted_at
+                WHERE sj.user_id = %s
+            """, (user_id,))
+            archived = cur.fetchone()
+
+            # 2. Recent Jobs (Last 5): pick them first so only the newest
+            # partitions are read, then count their test cases
+            cur.execute(f"""
                 SELECT 
                     sj.project_name as name, 
                     sj.description, 
                     sj.status,
-                    COUNT(ftc.test_case_id) as test_count
-                FROM scheduled_jobs sj
-                LEFT JOIN function_test_cases ftc ON sj.job_id = ftc.job_id
-                WHERE sj.user_id = %s
+                    COALESCE(SUM({archive.TEST_COUNT_SQL}), 0) + COALESCE(MAX(ja.test_case_count), 0) as test_count
+                FROM (
+                    SELECT job_id, project_name, description, status, submitted_at
+                    FROM scheduled_jobs
+                    WHERE user_id = %s
+                    ORDER BY submitted_at DESC
+                    LIMIT 5
+                ) sj
+                LEFT JOIN function_test_cases ftc
+                    ON sj.job_id = ftc.job_id AND ftc.submitted_at = sj.submitted_at
+                LEFT JOIN job_archive ja ON ja.job_id = sj.job_id
                 GROUP BY sj.job_id, sj.project_name, sj.description, sj.status, sj.submitted_at
                 ORDER BY sj.submitted_at DESC
-                LIMIT 5
             """, (user_id,))
             recent_jobs = cur.fetchall()
 
@@ -804,8 +992,8 @@ async def get_dashboard_stats(user_id: int):
             return {
                 "stats": [
                     { "label": "Total Projects", "value": str(top_stats['total_projects']), "subtext": f"{top_stats['root_projects']} root folders" },
-                    { "label": "Test Cases", "value": str(top_stats['total_test_cases']), "subtext": "Generated across all jobs" },
-                    { "label": "Automation Scripts", "value": str(top_stats['total_scripts']), "subtext": "Java/Selenium/JS" },
+                    { "label": "Test Cases", "value": str(top_stats['total_test_cases'] + archived['test_case_count']), "subtext": "Generated across all jobs" },
+                    { "label": "Automation Scripts", "value": str(top_stats['total_scripts'] + archived['script_count']), "subtext": "Java/Selenium/JS" },
                     { "label": "Active Jobs", "value": str(status_map.get('IN_PROGRESS', 0) + status_map.get('IN_QUEUE', 0)), "subtext": "Currently in pipeline" }
                 ],
                 "recentJobs": [
@@ -827,3 +1015,156 @@ async def get_dashboard_stats(user_id: int):
     
     finally:
         conn.close()
+
+
+@app.get("/api/search")
+async def search(
+    q: str,
+    user_id: int,
+    tenant_id: Optional[int] = None,
+    project_name: Optional[str] = None,
+    type: str = "all",
+    limit: int = 20,
+    cursor: Optional[str] = None,
+):
+    """
+    Full-text search across user stories and generated test cases, scoped to
+    the user's jobs (or a tenant they belong to), ranked and highlighted.
+    """
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="q is required")
+    if type not in ("all", "stories", "test_cases"):
+        raise HTTPException(status_code=400, detail="type must be one of: all, stories, test_cases")
+    try:
+        return search_corpus(
+            q,
+            user_id,
+            tenant_id=tenant_id,
+            project_name=project_name,
+            kind=type,
+            limit=max(1, min(limit, 100)),
+            cursor=cursor,
+        )
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+# ------------ Exports ------------
+
+def _export_scope(scope: str, scope_id: int):
+    """
+    Resolve an export scope to the params tools.export expects, or 404.
+    """
+    conn = db.get_read_connection()
+    try:
+        with conn.cursor() as cursor:
+            if scope == "job":
+                cursor.execute("SELECT job_id FROM scheduled_jobs WHERE job_id = %s", (scope_id,))
+                if not cursor.fetchone():
+                    raise HTTPException(status_code=404, detail="Job not found")
+                return (scope_id,), f"job_{scope_id}"
+
+            cursor.execute(
+                "SELECT user_id, project_name FROM user_projects WHERE project_id = %s",
+                (scope_id,),
+            )
+            project = cursor.fetchone()
+            if not project:
+                raise HTTPException(status_code=404, detail="Project not found")
+            return (project["user_id"], project["project_name"]), f"project_{scope_id}"
+
+    finally:
+        conn.close()
+
+
+def _export_response(scope: str, scope_id: int, format: str):
+    if format not in EXPORTERS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {sorted(EXPORTERS)}")
+    params, name = _export_scope(scope, scope_id)
+    exporter, media_type, extension = EXPORTERS[format]
+    return StreamingResponse(
+        exporter(scope, params),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{name}_test_cases.{extension}"'},
+    )
+
+
+def _scripts_zip_response(scope: str, scope_id: int):
+    params, name = _export_scope(scope, scope_id)
+    return StreamingResponse(
+        stream_scripts_zip(scope, params),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{name}_scripts.zip"'},
+    )
+
+
+@app.get("/api/jobs/{job_id}/export")
+async def export_job_test_cases(job_id: int, format: str = "csv"):
+    """
+    Stream a job's test cases as CSV or XLSX.
+    """
+    return _export_response("job", job_id, format)
+
+
+@app.get("/api/projects/{project_id}/export")
+async def export_project_test_cases(project_id: int, format: str = "csv"):
+    """
+    Stream every test case in a project as CSV or XLSX.
+    """
+    return _export_response("project", project_id, format)
+
+
+@app.get("/api/jobs/{job_id}/scripts.zip")
+async def export_job_scripts(job_id: int):
+    """
+    Stream a job's automation scripts as a zip with one file per story.
+    """
+    return _scripts_zip_response("job", job_id)
+
+
+@app.get("/api/projects/{project_id}/scripts.zip")
+async def export_project_scripts(project_id: int):
+    """
+    Stream a project's automation scripts as a zip with one file per story.
+    """
+    return _scripts_zip_response("project", project_id)
+
+
+# ------------ Redundant test detection ------------
+
+@app.get("/api/projects/{project_id}/redundant-tests")
+async def redundant_tests(project_id: int, threshold: float = 0.8):
+    """
+    Clusters of near-duplicate test cases in a project (MinHash/LSH, see
+    tools.minhash). Each cluster names the oldest test case to keep and the
+    redundant ones with their estimated Jaccard similarity. Archived jobs
+    are not compared; archivedJobsExcluded counts them.
+    """
+    if not 0 < threshold <= 1:
+        raise HTTPException(status_code=400, detail="threshold must be in (0, 1]")
+    (user_id, project_name), _ = _export_scope("project", project_id)
+    clusters = find_redundant_clusters(user_id, project_name, threshold)
+    return {
+        "projectId": project_id,
+        "threshold": threshold,
+        "clusterCount": len(clusters),
+        "redundantCount": sum(len(c["redundant"]) for c in clusters),
+        "archivedJobsExcluded": archived_job_count(user_id, project_name),
+        "clusters": clusters,
+    }
+
+
+@app.post("/api/projects/{project_id}/redundant-tests/reindex")
+async def reindex_redundant_tests(project_id: int):
+    """
+    Queue a backfill that signs every test case in the project not yet indexed.
+    """
+    (user_id, project_name), _ = _export_scope("project", project_id)
+    conn = get_db()
+    try:
+        with conn.cursor() as cursor:
+            key = outbox.add(cursor, "worker.index_project_duplicates", user_id, project_name)
+        conn.commit()
+    finally:
+        conn.close()
+    return {"projectId": project_id, "queued": key}
@@ -0,0 +1,334 @@
+"""
+Monthly job partitions and cold archival of old results.
+
+scheduled_jobs, user_stories, function_test_cases and automation_scripts are
+range-partitioned by month on the job's submitted_at (migration 008), so
+queries for recent jobs only touch the newest partitions. This module keeps
+that layout in shape:
+
+- maintain_partitions() creates partitions PARTITION_MONTHS_AHEAD months
+  ahead, so inserts never land in the default partitions, and drops child
+  partitions that archival has emptied;
+- archive_jobs() moves the stories, test cases and scripts of finished jobs
+  older than ARCHIVE_AFTER_DAYS into job_archive, one gzip-compressed JSON
+  document per job. The scheduled_jobs row stays (with archived_at set), so
+  job lists and counts are unchanged; load_archived()/unpack() read the
+  document back for job results and exports. Search and redundant-test
+  detection don't see archived jobs and report how many they left out.
+
+Every worker process runs maintenance every ARCHIVE_INTERVAL seconds (0
+disables it); one pass can also be run from cron:
+
+    python archive.py
+"""
+import gzip
+import json
+import logging
+import os
+import re
+import threading
+import time
+from datetime import date, timedelta
+from typing import Optional
+
+from psycopg import sql
+
+from db import get_connection
+
+logger = logging.getLogger("archive")
+
+ARCHIVE_AFTER_DAYS = int(os.environ.get("ARCHIVE_AFTER_DAYS", "90"))
+ARCHIVE_BATCH_SIZE = int(os.environ.get("ARCHIVE_BATCH_SIZE", "50"))
+ARCHIVE_INTERVAL = float(os.environ.get("ARCHIVE_INTERVAL", "3600"))
+ARCHIVE_COMPRESS_LEVEL = int(os.environ.get("ARCHIVE_COMPRESS_LEVEL", "6"))
+PARTITION_MONTHS_AHEAD = int(os.environ.get("PARTITION_MONTHS_AHEAD", "3"))
+
+PARTITIONED_TABLES = ("scheduled_jobs", "user_stories", "function_test_cases", "automation_scripts")
+# Tables archival empties; scheduled_jobs keeps its (small) rows.
+ARCHIVED_TABLES = PARTITIONED_TABLES[1:]
+# pg advisory lock key serialising partition DDL across workers.
+PARTITION_LOCK_ID = 80_080_008
+
+# Same count as the job list: arrays of arrays count their first element.
+TEST_COUNT_SQL = """
+    CASE
+        WHEN jsonb_typeof(result) = 'array' AND jsonb_typeof(result->0) = 'array'
+        THEN jsonb_array_length(result->0)
+        WHEN jsonb_typeof(result) = 'array'
+        THEN jsonb_array_length(result)
+        ELSE 0
+    END
+"""
+
+
+def _add_months(day: date, months: int) -> date:
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def archive_cutoff(older_than_days: int = ARCHIVE_AFTER_DAYS) -> date:
+    return date.today() - timedelta(days=older_than_days)
+
+
+def ensure_partitions(cursor, start: date, end: date) -> int:
+    """
+    Create the monthly partitions covering start..end for every partitioned
+    table, in the caller's transaction. Returns how many were created.
+    """
+    created = 0
+    for table in PARTITIONED_TABLES:
+        cursor.execute(
+            "SELECT create_monthly_partitions(%s::regclass, %s, %s) AS created",
+            (table, start, end),
+        )
+        created += cursor.fetchone()["created"]
+    return created
+
+
+def drop_archived_partitions(cursor, before: date) -> int:
+    """
+    Drop empty child-table partitions whose month ends on or before `before`.
+    Returns how many were dropped.
+    """
+    cursor.execute(
+        """
+        SELECT child.relname AS partition, parent.relname AS parent
+        FROM pg_inherits i
+        JOIN pg_class child ON child.oid = i.inhrelid
+        JOIN pg_class parent ON parent.oid = i.inhparent
+        WHERE parent.relname = ANY(%s)
+        """,
+        (list(ARCHIVED_TABLES),),
+    )
+    dropped = 0
+    for row in cursor.fetchall():
+        match = re.fullmatch(r"(\w+)_p(\d{4})(\d{2})", row["partition"])
+        if not match or match.group(1) != row["parent"]:
+            continue
+        month = date(int(match.group(2)), int(match.group(3)), 1)
+        if _add_months(month, 1) > before:
+            continue
+        partition = sql.Identifier(row["partition"])
+        cursor.execute(sql.SQL("SELECT EXISTS (SELECT 1 FROM {}) AS used").format(partition))
+        if cursor.fetchone()["used"]:
+            continue
+        cursor.execute(sql.SQL("DROP TABLE {}").format(partition))
+        dropped += 1
+    return dropped
+
+
+def maintain_partitions(older_than_days: int = ARCHIVE_AFTER_DAYS) -> dict:
+    """
+    Create upcoming partitions and drop emptied ones. Only one process does
+    partition DDL at a time; the others skip it.
+    """
+    conn = get_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_try_advisory_xact_lock(%s) AS locked", (PARTITION_LOCK_ID,))
+            if not cur.fetchone()["locked"]:
+                conn.commit()
+                return {"created": 0, "dropped": 0}
+            today = date.today()
+            created = ensure_partitions(cur, today, _add_months(today, PARTITION_MONTHS_AHEAD))
+            dropped = drop_archived_partitions(cur, archive_cutoff(older_than_days).replace(day=1))
+        conn.commit()
+        return {"created": created, "dropped": dropped}
+
+    except Exception:
+        conn.rollback()
+        raise
+
+    finally:
+        conn.close()
+
+
+def _pack(document: dict) -> tuple:
+    raw = json.dumps(document, default=str).encode()
+    return len(raw), gzip.compress(raw, compresslevel=ARCHIVE_COMPRESS_LEVEL)
+
+
+def archive_jobs(older_than_days: int = ARCHIVE_AFTER_DAYS, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """
+    Archive one batch of finished jobs submitted more than older_than_days
+    ago. Returns the number of jobs archived.
+    """
+    conn = get_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT job_id, submitted_at
+                FROM scheduled_jobs
+                WHERE archived_at IS NULL
+                  AND status IN ('COMPLETED', 'FAILED')
+                  AND submitted_at < %s
+                ORDER BY submitted_at
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+                """,
+                (archive_cutoff(older_than_days), batch_size),
+            )
+            jobs = cur.fetchall()
+            if not jobs:
+                conn.commit()
+                return 0
+
+            job_ids = [job["job_id"] for job in jobs]
+            # The submitted_at bound prunes every query below to old partitions.
+            newest = max(job["submitted_at"] for job in jobs)
+            documents = {
+                job_id: {"user_stories": [], "function_test_cases": [], "automation_scripts": []}
+                for job_id in job_ids
+            }
+            test_counts = dict.fromkeys(job_ids, 0)
+
+            cur.execute(
+                """
+                SELECT job_id, user_story_id, user_story_text, acceptance_criteria
+                FROM user_stories
+                WHERE job_id = ANY(%s) AND submitted_at <= %s
+                ORDER BY user_story_id
+                """,
+                (job_ids, newest),
+            )
+            for row in cur.fetchall():
+                documents[row.pop("job_id")]["user_stories"].append(row)
+
+            cur.execute(
+                f"""
+                SELECT job_id, test_case_id, user_story_id, result, {TEST_COUNT_SQL} AS test_count
+                FROM function_test_cases
+                WHERE job_id = ANY(%s) AND submitted_at <= %s
+                ORDER BY test_case_id
+                """,
+                (job_ids, newest),
+            )
+            for row in cur.fetchall():
+                job_id = row.pop("job_id")
+                test_counts[job_id] += row.pop("test_count")
+                documents[job_id]["function_test_cases"].append(row)
+
+            cur.execute(
+                """
+                SELECT us.job_id, ascr.automation_id, ascr.user_story_id, ascr.script
+                FROM automation_scripts ascr
+                JOIN user_stories us
+                    ON us.user_story_id = ascr.user_story_id AND us.submitted_at = ascr.submitted_at
+                WHERE us.job_id = ANY(%s) AND us.submitted_at <= %s AND ascr.submitted_at <= %s
+                ORDER BY ascr.automation_id
+                """,
+                (job_ids, newest, newest),
+            )
+            for row in cur.fetchall():
+                documents[row.pop("job_id")]["automation_scripts"].append(row)
+
+            archive_rows = []
+            for job in jobs:
+                document = documents[job["job_id"]]
+                raw_bytes, payload = _pack(document)
+                archive_rows.append((
+                    job["job_id"],
+                    job["submitted_at"],
+                    len(document["user_stories"]),
+                    len(document["function_test_cases"]),
+                    test_counts[job["job_id"]],
+                    len(document["automation_scripts"]),
+                    raw_bytes,
+                    payload,
+                ))
+            cur.executemany(
+                """
+                INSERT INTO job_archive (
+                    job_id, submitted_at, story_count, test_case_rows,
+                    test_case_count, script_count, raw_bytes, payload
+                )
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                """,
+                archive_rows,
+            )
+
+            # Deleting the stories cascades to their test cases and scripts;
+            # test case rows without a story go explicitly.
+            cur.execute(
+                "DELETE FROM function_test_cases WHERE job_id = ANY(%s) AND submitted_at <= %s",
+                (job_ids, newest),
+            )
+            cur.execute(
+                "DELETE FROM user_stories WHERE job_id = ANY(%s) AND submitted_at <= %s",
+                (job_ids, newest),
+            )
+            cur.execute(
+                "UPDATE scheduled_jobs SET archived_at = now() WHERE job_id = ANY(%s) AND submitted_at <= %s",
+                (job_ids, newest),
+            )
+
+        conn.commit()
+        return len(jobs)
+
+    except Exception:
+        conn.rollback()
+        raise
+
+    finally:
+        conn.close()
+
+
+def unpack(payload: bytes) -> dict:
+    return json.loads(gzip.decompress(payload))
+
+
+def load_archived(cursor, job_id: int) -> Optional[dict]:
+    """
+    The archived document for a job (user_stories, function_test_cases and
+    automation_scripts rows as they were stored), or None if it isn't archived.
+    """
+    cursor.execute("SELECT payload FROM job_archive WHERE job_id = %s", (job_id,))
+    row = cursor.fetchone()
+    if not row:
+        return None
+    return unpack(row["payload"])
+
+
+def run_maintenance(older_than_days: int = ARCHIVE_AFTER_DAYS) -> dict:
+    """
+    Archive every eligible job in batches, then maintain partitions.
+    """
+    archived = 0
+    while True:
+        batch = archive_jobs(older_than_days)
+        archived += batch
+        if batch < ARCHIVE_BATCH_SIZE:
+            break
+    result = {"archived": archived, **maintain_partitions(older_than_days)}
+    if any(result.values()):
+        logger.info(
+            "Archived %(archived)d jobs; created %(created)d and dropped %(dropped)d partitions",
+            result,
+        )
+    return result
+
+
+def start_archiver() -> threading.Thread:
+    """
+    Run run_maintenance() every ARCHIVE_INTERVAL seconds in a daemon thread.
+    """
+    def loop():
+        while True:
+            time.sleep(ARCHIVE_INTERVAL)
+            try:
+                run_maintenance()
+            except Exception:
+                logger.exception("Archival failed")
+
+    thread = threading.Thread(target=loop, name="archiver", daemon=True)
+    thread.start()
+    return thread
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=os.environ.get("LOG_LEVEL", "INFO").upper(),
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    print(run_maintenance())
@@ -0,0 +1,64 @@
+"""
+Compare two bench.run result files:
+
+    python -m bench.compare bench/results/base.json bench/results/head.json --max-regression 0.15
+
+Prints per-endpoint deltas and exits 1 if any endpoint's p95 latency grew by
+more than --max-regression (a fraction) or its queries per request increased.
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+
+def _delta(base: float, head: float) -> float:
+    if not base:
+        return 0.0
+    return (head - base) / base
+
+
+def compare(base: dict, head: dict, max_regression: float) -> list[str]:
+    failures = []
+    print(f"{'endpoint':22s} {'p95 base':>10s} {'p95 head':>10s} {'delta':>8s} "
+          f"{'rps delta':>10s} {'queries':>12s}")
+    for name, head_r in head["endpoints"].items():
+        base_r = base["endpoints"].get(name)
+        if not base_r:
+            print(f"{name:22s} (new)")
+            continue
+        p95 = _delta(base_r["p95_ms"], head_r["p95_ms"])
+        rps = _delta(base_r["throughput_rps"], head_r["throughput_rps"])
+        queries = f"{base_r['db_queries_per_request']}->{head_r['db_queries_per_request']}"
+        print(f"{name:22s} {base_r['p95_ms']:10.2f} {head_r['p95_ms']:10.2f} {p95:+8.1%} "
+              f"{rps:+10.1%} {queries:>12s}")
+
+        if p95 > max_regression:
+            failures.append(f"{name}: p95 {p95:+.1%}")
+        bq, hq = base_r["db_queries_per_request"], head_r["db_queries_per_request"]
+        if bq is not None and hq is not None and hq > bq:
+            failures.append(f"{name}: queries/request {bq} -> {hq}")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("base")
+    parser.add_argument("head")
+    parser.add_argument("--max-regression", type=float, default=0.15)
+    args = parser.parse_args(argv)
+
+    base = json.loads(Path(args.base).read_text())
+    head = json.loads(Path(args.head).read_text())
+    print(f"base {base['meta']['commit']}  head {head['meta']['commit']}")
+
+    failures = compare(base, head, args.max_regression)
+    if failures:
+        print("Regressions:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""
+Fake OpenAI-compatible LLM server for offline pipeline benchmarks.
+
+Serves POST /v1/chat/completions (streaming and non-streaming) with
+schema-valid test cases and scripts (llm.render_stub_completion), after a
+configurable time to first token and at a configurable token rate, and
+injects 429s and 500s at configurable rates:
+
+    python -m bench.fake_llm --port 8100 --latency lognormal:800:0.5 \\
+        --tokens-per-second 80 --rate-limit-rate 0.05 --error-rate 0.01
+
+Point the openai backend at it with OPENAI_BASE_URL=http://127.0.0.1:8100/v1.
+Latency specs (milliseconds): fixed:MS, uniform:LOW:HIGH,
+lognormal:MEDIAN:SIGMA, exponential:MEAN. GET /stats returns request, token
+and injected-failure counts.
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from llm import render_stub_completion
+
+# Rough OpenAI tokenizer average; only used for pacing and usage counts.
+CHARS_PER_TOKEN = 4
+
+
+def parse_latency(spec: str):
+    """
+    Return a function rng -> seconds for a latency spec like "lognormal:800:0.5".
+    """
+    kind, *params = spec.split(":")
+    try:
+        values = [float(p) for p in params]
+        if kind == "fixed":
+            (ms,) = values
+            return lambda rng: ms / 1000
+        if kind == "uniform":
+            low, high = values
+            return lambda rng: rng.uniform(low, high) / 1000
+        if kind == "lognormal":
+            median, sigma = values
+            return lambda rng: rng.lognormvariate(0, sigma) * median / 1000
+        if kind == "exponential":
+            (mean,) = values
+            return lambda rng: rng.expovariate(1 / mean) / 1000 if mean else 0.0
+    except ValueError:
+        pass
+    raise ValueError(f"Bad latency spec {spec!r}; expected fixed:MS, uniform:LOW:HIGH, "
+                     f"lognormal:MEDIAN:SIGMA or exponential:MEAN")
+
+
+def create_app(
+    latency: str = "fixed:500",
+    tokens_per_second: float = 100,
+    tokens_per_chunk: int = 4,
+    test_cases: int = 5,
+    rate_limit_rate: float = 0.0,
+    error_rate: float = 0.0,
+    retry_after: float = 1.0,
+    seed: int = None,
+) -> FastAPI:
+    app = FastAPI(title="fake-llm")
+    first_token = parse_latency(latency)
+    rng = random.Random(seed)
+    stats = Counter()
+
+    def _error(status: int, message: str, kind: str, headers=None):
+        return JSONResponse(
+            status_code=status,
+            content={"error": {"message": message, "type": kind, "code": kind}},
+            headers=headers,
+        )
+
+    def _chunk(completion_id, model, delta, finish_reason=None, usage=None):
+        chunk = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [] if usage else [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+        if usage:
+            chunk["usage"] = usage
+        return f"data: {json.dumps(chunk)}\n\n"
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok"}
+
+    @app.get("/stats")
+    async def get_stats():
+        return dict(stats)
+
+    @app.get("/v1/models")
+    async def models():
+        return {"object": "list", "data": [{"id": "fake-model", "object": "model", "owned_by": "bench"}]}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats["requests"] += 1
+
+        roll = rng.random()
+        if roll < rate_limit_rate:
+            stats["rate_limited"] += 1
+            return _error(429, "Rate limit reached (injected)", "rate_limit_exceeded",
+                          headers={"Retry-After": str(retry_after)})
+        if roll < rate_limit_rate + error_rate:
+            stats["errors"] += 1
+            return _error(500, "Internal error (injected)", "server_error")
+
+        model = body.get("model", "fake-model")
+        prompt = "\n".join(
+            m["content"] if isinstance(m.get("content"), str) else json.dumps(m.get("content"))
+            for m in body.get("messages", [])
+        )
+        text = render_stub_completion(prompt, test_cases)
+        usage = {
+            "prompt_tokens": len(prompt) // CHARS_PER_TOKEN,
+            "completion_tokens": len(text) // CHARS_PER_TOKEN,
+            "total_tokens": (len(prompt) + len(text)) // CHARS_PER_TOKEN,
+        }
+        stats["prompt_tokens"] += usage["prompt_tokens"]
+        stats["completion_tokens"] += usage["completion_tokens"]
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        step = CHARS_PER_TOKEN * tokens_per_chunk
+        chunk_delay = tokens_per_chunk / tokens_per_second if tokens_per_second else 0
+
+        await asyncio.sleep(first_token(rng))
+
+        if not body.get("stream"):
+            await asyncio.sleep(chunk_delay * (len(text) // step))
+            stats["completions"] += 1
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": text},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            }
+
+        include_usage = (body.get("stream_options") or {}).get("include_usage")
+
+        async def events():
+            yield _chunk(completion_id, model, {"role": "assistant", "content": ""})
+            for i in range(0, len(text), step):
+                if i:
+                    await asyncio.sleep(chunk_delay)
+                yield _chunk(completion_id, model, {"content": text[i:i + step]})
+            yield _chunk(completion_id, model, {}, finish_reason="stop")
+            if include_usage:
+                yield _chunk(completion_id, model, None, usage=usage)
+            yield "data: [DONE]\n\n"
+            stats["completions"] += 1
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency", default="lognormal:800:0.5",
+                        help="time to first token distribution (ms), e.g. fixed:500, lognormal:800:0.5")
+    parser.add_argument("--tokens-per-second", type=float, default=80,
+                        help="generation speed per call (0 = instant)")
+    parser.add_argument("--tokens-per-chunk", type=int, default=4)
+    parser.add_argument("--test-cases", type=int, default=5, help="test cases per generated story")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of calls answered 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls answered 500")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds on 429s")
+
+
+def app_from_args(args) -> FastAPI:
+    return create_app(
+        latency=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        tokens_per_chunk=args.tokens_per_chunk,
+        test_cases=args.test_cases,
+        rate_limit_rate=args.rate_limit_rate,
+        error_rate=args.error_rate,
+        retry_after=args.retry_after,
+        seed=args.seed,
+    )
+
+
+def main(argv=None):
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible LLM server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--seed", type=int, default=None)
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+    parse_latency(args.latency)
+    uvicorn.run(app_from_args(args), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
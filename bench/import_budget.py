@@ -0,0 +1,80 @@
+"""
+Cold-start import budget for the API.
+
+Imports app.py in a fresh interpreter with DATABASE_URL/REDIS_URL unset and
+fails if it takes longer than --budget-ms or pulls in a heavy dependency that
+only worker code paths need:
+
+    python -m bench.import_budget --budget-ms 1500
+
+Run it in CI next to bench.compare so new uvicorn replicas keep starting fast.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+
+# Modules that must stay out of the API import graph.
+FORBIDDEN_MODULES = [
+    "pandas",
+    "torch",
+    "sentence_transformers",
+    "langchain",
+    "langchain_core",
+    "langchain_openai",
+    "langchain_google_genai",
+    "langgraph",
+    "streamlit",
+    "openpyxl",
+]
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import app
+elapsed = (time.perf_counter() - started) * 1000
+print(json.dumps({"ms": elapsed, "modules": sorted(sys.modules)}))
+"""
+
+
+def measure(runs: int) -> tuple[float, list[str]]:
+    env = {k: v for k, v in os.environ.items()
+           if k not in ("DATABASE_URL", "database_url", "REDIS_URL")}
+    best, modules = None, []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", PROBE],
+            cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+        )
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        if best is None or result["ms"] < best:
+            best, modules = result["ms"], result["modules"]
+    return best, modules
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the API's import-time budget")
+    parser.add_argument("--budget-ms", type=float, default=float(os.environ.get("IMPORT_BUDGET_MS", "1500")))
+    parser.add_argument("--runs", type=int, default=3, help="best of N fresh interpreters")
+    args = parser.parse_args(argv)
+
+    elapsed, modules = measure(args.runs)
+    heavy = [m for m in FORBIDDEN_MODULES if m in modules]
+    print(f"import app: {elapsed:.0f} ms (budget {args.budget_ms:.0f} ms), {len(modules)} modules")
+
+    failed = False
+    if heavy:
+        print(f"FAIL: heavy modules imported at startup: {', '.join(heavy)}")
+        failed = True
+    if elapsed > args.budget_ms:
+        print("FAIL: import time over budget; inspect with `python -X importtime -c 'import app'`")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
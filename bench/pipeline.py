@@ -0,0 +1,393 @@
+"""
+End-to-end pipeline throughput benchmark.
+
+Starts the fake LLM server (bench.fake_llm), the API and K worker processes
+pointed at it, submits jobs through POST /api/generate-test-cases, waits for
+them to finish and reports:
+
+- stories/minute from the first submission to the last job finishing;
+- queue wait (submitted -> first attempt started) vs processing time (final
+  attempt started -> finished), p50/p95/max;
+- DB write time: server-side time in INSERT/UPDATE/DELETE/COPY statements
+  (pg_stat_statements, when installed) and SQL time measured in the workers
+  (their /metrics), both per story.
+
+    python -m bench.pipeline --workers 4 --jobs 40 --stories-per-job 5 \\
+        --latency lognormal:800:0.5 --tokens-per-second 80 --rate-limit-rate 0.02
+
+Postgres (DATABASE_URL) and, for QUEUE_BACKEND=rq, Redis (REDIS_URL) must be
+running; the harness starts and stops everything else. Admission limits are
+raised for the API it starts unless they are set in the environment, so the
+run measures the pipeline rather than admission control. Results are written
+to bench/results/pipeline-<timestamp>-<commit>.json; process logs go to a
+temporary directory printed at startup.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+import requests
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from bench import fake_llm
+from bench.run import RESULTS_DIR, _git_commit, _story_payload, percentile
+from bench.seed import seed
+from db import get_connection, init_db
+
+ROOT = Path(__file__).parent.parent
+
+ADMISSION_OVERRIDES = {
+    "ADMISSION_MAX_QUEUED_JOBS": "100000",
+    "ADMISSION_USER_MAX_PENDING_STORIES": "1000000",
+    "ADMISSION_MAX_WAIT_SECONDS": "86400",
+}
+WRITE_STATEMENT_TIME_SQL = r"""
+    SELECT COALESCE(SUM(total_exec_time), 0) AS ms, COALESCE(SUM(calls), 0) AS calls
+    FROM pg_stat_statements
+    WHERE dbid = (SELECT oid FROM pg_database WHERE datname = current_database())
+      AND query ~* '^\s*(INSERT|UPDATE|DELETE|COPY)'
+"""
+
+
+def _spawn(args: list, env: dict, log_dir: Path, name: str) -> subprocess.Popen:
+    log = open(log_dir / f"{name}.log", "w")
+    return subprocess.Popen(
+        [sys.executable, *args], cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+
+
+def _wait_http(url: str, proc: subprocess.Popen, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"process for {url} exited with {proc.returncode}; see its log")
+        try:
+            if requests.get(url, timeout=1).ok:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def _stop(procs: list):
+    for proc in procs:
+        if proc.poll() is None:
+            proc.terminate()
+    for proc in procs:
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def _write_statement_time():
+    """
+    (ms, calls) spent in write statements so far, or None without pg_stat_statements.
+    """
+    conn = None
+    try:
+        # An unreachable database degrades like a missing extension.
+        conn = get_connection()
+        with conn.cursor() as cur:
+            cur.execute(WRITE_STATEMENT_TIME_SQL)
+            row = cur.fetchone()
+            return float(row["ms"]), int(row["calls"])
+    except Exception:
+        return None
+    finally:
+        if conn is not None:
+            conn.close()
+
+
+def _worker_sql_time(ports: list) -> tuple:
+    """
+    (seconds, statements) of SQL timed by the workers, summed from their /metrics.
+    """
+    seconds, statements = 0.0, 0
+    for port in ports:
+        text = requests.get(f"http://127.0.0.1:{port}/metrics", timeout=5).text
+        for line in text.splitlines():
+            if line.startswith("sagescript_db_query_duration_seconds_sum"):
+                seconds += float(line.rsplit(" ", 1)[1])
+            elif line.startswith("sagescript_db_query_duration_seconds_count"):
+                statements += int(float(line.rsplit(" ", 1)[1]))
+    return seconds, statements
+
+
+def submit_jobs(base_url: str, user_ids: list, jobs: int, stories_per_job: int,
+                concurrency: int, seed_value: int) -> dict:
+    """
+    Submit `jobs` jobs, retrying 429s after their Retry-After.
+    """
+    local = threading.local()
+    lock = threading.Lock()
+    job_ids, latencies = [], []
+    counts = {"rejected_429": 0, "errors": 0}
+
+    def one(i: int):
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        rng = random.Random(seed_value + i)
+        user_id = user_ids[i % len(user_ids)]
+        body = [_story_payload(user_id, rng) for _ in range(stories_per_job)]
+        while True:
+            started = time.perf_counter()
+            response = local.session.post(f"{base_url}/api/generate-test-cases", json=body, timeout=60)
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                latencies.append(elapsed)
+                if response.status_code == 429:
+                    counts["rejected_429"] += 1
+                elif response.ok:
+                    job_ids.append(response.json()["job_id"])
+                else:
+                    counts["errors"] += 1
+            if response.status_code != 429:
+                return
+            time.sleep(float(response.headers.get("Retry-After", "1")))
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(jobs)))
+
+    return {
+        "job_ids": job_ids,
+        "rejected_429": counts["rejected_429"],
+        "errors": counts["errors"],
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+    }
+
+
+def wait_for_jobs(job_ids: list, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        conn = get_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    SELECT count(*) AS pending
+                    FROM scheduled_jobs
+                    WHERE job_id = ANY(%s) AND status IN ('IN_QUEUE', 'IN_PROGRESS')
+                    """,
+                    (job_ids,),
+                )
+                if cur.fetchone()["pending"] == 0:
+                    return True
+        finally:
+            conn.close()
+        time.sleep(1)
+    return False
+
+
+def job_timings(job_ids: list) -> list:
+    conn = get_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT
+                    sj.job_id,
+                    sj.status,
+                    sj.user_story_count,
+                    sj.submitted_at::timestamptz AS submitted_at,
+                    min(ja.started_at) AS first_started,
+                    max(ja.started_at) AS last_started,
+                    max(ja.finished_at) AS finished_at,
+                    count(ja.attempt_id) AS attempts
+                FROM scheduled_jobs sj
+                LEFT JOIN job_attempts ja
+                    ON ja.job_id = sj.job_id AND ja.submitted_at = sj.submitted_at
+                WHERE sj.job_id = ANY(%s)
+                GROUP BY sj.job_id, sj.status, sj.user_story_count, sj.submitted_at
+                """,
+                (job_ids,),
+            )
+            return cur.fetchall()
+    finally:
+        conn.close()
+
+
+def _distribution(samples: list) -> dict:
+    return {
+        "p50": round(percentile(samples, 50), 3),
+        "p95": round(percentile(samples, 95), 3),
+        "max": round(max(samples), 3) if samples else 0.0,
+    }
+
+
+def summarize(rows: list) -> dict:
+    completed = [r for r in rows if r["status"] == "COMPLETED"]
+    finished = [r for r in rows if r["finished_at"] is not None]
+    queue_wait = [(r["first_started"] - r["submitted_at"]).total_seconds()
+                  for r in rows if r["first_started"] is not None]
+    processing = [(r["finished_at"] - r["last_started"]).total_seconds() for r in finished]
+    end_to_end = [(r["finished_at"] - r["submitted_at"]).total_seconds() for r in finished]
+
+    stories = sum(r["user_story_count"] for r in completed)
+    wall = 0.0
+    if finished:
+        wall = (max(r["finished_at"] for r in finished) - min(r["submitted_at"] for r in rows)).total_seconds()
+    return {
+        "throughput": {
+            "jobs_completed": len(completed),
+            "jobs_failed": sum(r["status"] == "FAILED" for r in rows),
+            "jobs_unfinished": sum(r["status"] in ("IN_QUEUE", "IN_PROGRESS") for r in rows),
+            "jobs_retried": sum(r["attempts"] > 1 for r in rows),
+            "stories_completed": stories,
+            "wall_seconds": round(wall, 2),
+            "stories_per_minute": round(stories / wall * 60, 1) if wall else 0.0,
+        },
+        "queue_wait_seconds": _distribution(queue_wait),
+        "processing_seconds": _distribution(processing),
+        "end_to_end_seconds": _distribution(end_to_end),
+    }
+
+
+def run(args) -> dict:
+    log_dir = Path(tempfile.mkdtemp(prefix="bench-pipeline-"))
+    print(f"Process logs in {log_dir}")
+
+    init_db()
+    user_ids = seed(args.users, 1, 0, 0, 0, seed_value=args.seed)["user_ids"]
+
+    env = dict(
+        os.environ,
+        LLM_BACKEND="openai",
+        LLM_MODEL="fake-model",
+        OPENAI_API_KEY="bench",
+        OPENAI_BASE_URL=f"http://127.0.0.1:{args.llm_port}/v1",
+        ARCHIVE_INTERVAL="0",
+    )
+    for key, value in ADMISSION_OVERRIDES.items():
+        env.setdefault(key, value)
+
+    llm_args = [
+        "--latency", args.latency,
+        "--tokens-per-second", str(args.tokens_per_second),
+        "--tokens-per-chunk", str(args.tokens_per_chunk),
+        "--test-cases", str(args.test_cases),
+        "--rate-limit-rate", str(args.rate_limit_rate),
+        "--error-rate", str(args.error_rate),
+        "--retry-after", str(args.retry_after),
+        "--seed", str(args.seed),
+    ]
+    procs = []
+    try:
+        llm = _spawn(["-m", "bench.fake_llm", "--port", str(args.llm_port), *llm_args], env, log_dir, "fake_llm")
+        procs.append(llm)
+        _wait_http(f"http://127.0.0.1:{args.llm_port}/health", llm)
+
+        api = _spawn(["-m", "uvicorn", "app:app", "--port", str(args.api_port), "--log-level", "warning"],
+                     env, log_dir, "api")
+        procs.append(api)
+        _wait_http(f"http://127.0.0.1:{args.api_port}/readyz", api)
+
+        metrics_ports = [args.metrics_port + i for i in range(args.workers)]
+        for i, port in enumerate(metrics_ports):
+            worker = _spawn(["worker.py"], dict(env, WORKER_METRICS_PORT=str(port)), log_dir, f"worker-{i}")
+            procs.append(worker)
+            _wait_http(f"http://127.0.0.1:{port}/metrics", worker)
+
+        writes_before = _write_statement_time()
+        sql_before = _worker_sql_time(metrics_ports)
+
+        submission = submit_jobs(
+            f"http://127.0.0.1:{args.api_port}", user_ids, args.jobs, args.stories_per_job,
+            args.concurrency, args.seed,
+        )
+        job_ids = submission.pop("job_ids")
+        if not wait_for_jobs(job_ids, args.timeout):
+            print(f"Timed out after {args.timeout}s; reporting finished jobs only")
+
+        writes_after = _write_statement_time()
+        sql_after = _worker_sql_time(metrics_ports)
+        llm_stats = requests.get(f"http://127.0.0.1:{args.llm_port}/stats", timeout=5).json()
+    finally:
+        _stop(procs)
+
+    report = summarize(job_timings(job_ids))
+    stories = report["throughput"]["stories_completed"] or 1
+    worker_sql = sql_after[0] - sql_before[0]
+    db = {
+        "worker_sql_seconds": round(worker_sql, 3),
+        "worker_sql_statements": sql_after[1] - sql_before[1],
+        "worker_sql_ms_per_story": round(worker_sql * 1000 / stories, 2),
+        "write_statement_ms": None,
+        "write_statements": None,
+        "write_ms_per_story": None,
+    }
+    if writes_before and writes_after:
+        write_ms = writes_after[0] - writes_before[0]
+        db.update(
+            write_statement_ms=round(write_ms, 1),
+            write_statements=writes_after[1] - writes_before[1],
+            write_ms_per_story=round(write_ms / stories, 2),
+        )
+    report.update(submission=submission, db=db, llm=llm_stats)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="End-to-end pipeline throughput benchmark")
+    parser.add_argument("--workers", type=int, default=2, help="worker processes (K)")
+    parser.add_argument("--jobs", type=int, default=20)
+    parser.add_argument("--stories-per-job", type=int, default=5)
+    parser.add_argument("--users", type=int, default=4, help="bench users the jobs are spread over")
+    parser.add_argument("--concurrency", type=int, default=4, help="concurrent submissions")
+    parser.add_argument("--timeout", type=float, default=1800, help="seconds to wait for jobs to finish")
+    parser.add_argument("--api-port", type=int, default=8200)
+    parser.add_argument("--llm-port", type=int, default=8100)
+    parser.add_argument("--metrics-port", type=int, default=9200, help="first worker metrics port")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", help="result file (default bench/results/pipeline-<ts>-<commit>.json)")
+    fake_llm.add_arguments(parser)
+    args = parser.parse_args(argv)
+    fake_llm.parse_latency(args.latency)
+
+    report = run(args)
+
+    t = report["throughput"]
+    print(f"stories/min={t['stories_per_minute']:.1f} completed={t['jobs_completed']} "
+          f"failed={t['jobs_failed']} unfinished={t['jobs_unfinished']} wall={t['wall_seconds']}s")
+    for name in ("queue_wait_seconds", "processing_seconds", "end_to_end_seconds"):
+        d = report[name]
+        print(f"{name:20s} p50={d['p50']:8.2f} p95={d['p95']:8.2f} max={d['max']:8.2f}")
+    print(f"db write ms/story={report['db']['write_ms_per_story']} "
+          f"worker sql ms/story={report['db']['worker_sql_ms_per_story']}")
+
+    commit = _git_commit()
+    timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    report["meta"] = {
+        "commit": commit,
+        "timestamp": timestamp,
+        "workers": args.workers,
+        "jobs": args.jobs,
+        "stories_per_job": args.stories_per_job,
+        "queue_backend": os.environ.get("QUEUE_BACKEND", "rq"),
+        "llm": {
+            "latency": args.latency,
+            "tokens_per_second": args.tokens_per_second,
+            "rate_limit_rate": args.rate_limit_rate,
+            "error_rate": args.error_rate,
+        },
+    }
+    out = Path(args.out) if args.out else RESULTS_DIR / f"pipeline-{timestamp}-{commit}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2))
+    print(f"Results written to {out}")
+
+
+if __name__ == "__main__":
+    main()
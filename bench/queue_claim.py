@@ -0,0 +1,110 @@
+"""
+Queue backend claim-throughput benchmark.
+
+Enqueues N no-op items on a scratch queue, then drains it with K burst-mode
+worker processes and reports enqueue rate and items claimed per second for
+each backend:
+
+    python -m bench.queue_claim --backend rq postgres --items 5000 --workers 4
+
+Needs DATABASE_URL (migrations applied) and, for rq, REDIS_URL. Results are
+written to bench/results/queue-<timestamp>-<commit>.json.
+"""
+import argparse
+import json
+import multiprocessing
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from bench.run import RESULTS_DIR, _git_commit
+from db import get_connection
+from job_queue import get_job_queue
+
+BENCH_QUEUE = "bench-queue-claim"
+
+
+def noop(i):
+    return i
+
+
+def _clear(backend: str):
+    if backend == "rq":
+        get_job_queue(backend, BENCH_QUEUE).queue.empty()
+        return
+    conn = get_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM job_queue WHERE queue_name = %s", (BENCH_QUEUE,))
+            cur.execute("DELETE FROM queue_workers WHERE queue_name = %s", (BENCH_QUEUE,))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _drain(backend: str):
+    get_job_queue(backend, BENCH_QUEUE).work(burst=True)
+
+
+def run_backend(backend: str, items: int, workers: int) -> dict:
+    _clear(backend)
+    queue = get_job_queue(backend, BENCH_QUEUE)
+
+    started = time.perf_counter()
+    for i in range(items):
+        queue.enqueue("bench.queue_claim.noop", i)
+    enqueue_seconds = time.perf_counter() - started
+
+    # Fresh processes, so no connection is shared across a fork.
+    ctx = multiprocessing.get_context("spawn")
+    procs = [ctx.Process(target=_drain, args=(backend,)) for _ in range(workers)]
+    started = time.perf_counter()
+    for proc in procs:
+        proc.start()
+    for proc in procs:
+        proc.join()
+    drain_seconds = time.perf_counter() - started
+
+    remaining = queue.count()
+    return {
+        "items": items,
+        "workers": workers,
+        "enqueue_per_second": round(items / enqueue_seconds, 1),
+        "drain_seconds": round(drain_seconds, 2),
+        "claims_per_second": round((items - remaining) / drain_seconds, 1),
+        "remaining": remaining,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark queue backend claim throughput")
+    parser.add_argument("--backend", nargs="+", default=["postgres"], choices=["rq", "postgres"])
+    parser.add_argument("--items", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--out", help="result file (default bench/results/queue-<ts>-<commit>.json)")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for backend in args.backend:
+        results[backend] = r = run_backend(backend, args.items, args.workers)
+        print(f"{backend:9s} enqueue={r['enqueue_per_second']:9.1f}/s "
+              f"claims={r['claims_per_second']:9.1f}/s drain={r['drain_seconds']:7.2f}s "
+              f"remaining={r['remaining']}")
+
+    commit = _git_commit()
+    timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    report = {
+        "meta": {"commit": commit, "timestamp": timestamp, "items": args.items, "workers": args.workers},
+        "backends": results,
+    }
+    out = Path(args.out) if args.out else RESULTS_DIR / f"queue-{timestamp}-{commit}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2))
+    print(f"Results written to {out}")
+
+
+if __name__ == "__main__":
+    main()
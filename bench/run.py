@@ -0,0 +1,266 @@
+"""
+Endpoint load generator.
+
+Drives every endpoint in app.py at a controlled concurrency against a running
+server seeded by bench.seed, and reports p50/p95/p99 latency, throughput and
+DB queries per request:
+
+    uvicorn app:app --port 8000 &
+    python -m bench.seed
+    python -m bench.run --base-url http://localhost:8000 --requests 200 --concurrency 16
+
+Results are written as JSON to bench/results/<timestamp>-<commit>.json so they
+can be diffed with bench.compare. DB queries per request are taken from
+pg_stat_statements when the extension is installed, otherwise reported as null.
+"""
+import argparse
+import json
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+import requests
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from bench.seed import BENCH_PASSWORD, VOCABULARY
+from db import get_connection
+
+RESULTS_DIR = Path(__file__).parent / "results"
+RESULTS_BATCH_SIZE = 20
+
+
+def _story_payload(user_id: int, rng: random.Random) -> dict:
+    return {
+        "user_story": f"As a member I want to update my enrollment {rng.randint(0, 10**6)}",
+        "acceptance_criteria": "Given a member When they submit Then the change is saved",
+        "framework_choice": "java_selenium",
+        "user_id": user_id,
+        "project_name": "Project 0",
+        "description": "bench submission",
+    }
+
+
+def build_scenarios(seeded: dict, created_jobs: list) -> list[tuple]:
+    """
+    (name, method, path factory, body factory) for every endpoint in app.py.
+    Write endpoints run last; regenerate/delete use jobs created by this run.
+    Project-scoped endpoints are skipped for seed files without project_ids.
+    """
+    usernames = seeded["usernames"]
+    user_ids = seeded["user_ids"]
+    job_ids = seeded["job_ids"]
+    project_ids = seeded.get("project_ids") or []
+
+    def pick(seq, rng):
+        return rng.choice(seq)
+
+    def batch(rng):
+        # A dashboard-sized page of jobs for the batch results endpoint.
+        return ",".join(str(job_id) for job_id in rng.sample(job_ids, min(RESULTS_BATCH_SIZE, len(job_ids))))
+
+    reads = [
+        ("login", "POST", lambda r: "/api/login",
+         lambda r: {"username": pick(usernames, r), "password": BENCH_PASSWORD}),
+        ("get_user_projects", "GET", lambda r: f"/api/projects/{pick(usernames, r)}", None),
+        ("get_all_jobs", "GET", lambda r: "/api/jobs", None),
+        ("get_job_by_id", "GET", lambda r: f"/api/jobs/{pick(job_ids, r)}", None),
+        ("get_job_attempts", "GET", lambda r: f"/api/jobs/{pick(job_ids, r)}/attempts", None),
+        ("get_job_results", "GET", lambda r: f"/api/results/{pick(job_ids, r)}", None),
+        ("get_jobs_results_summary", "GET", lambda r: f"/api/results?job_ids={batch(r)}&fields=summary", None),
+        ("get_jobs_results_titles", "GET", lambda r: f"/api/results?job_ids={batch(r)}&fields=titles", None),
+        ("get_jobs_results_full", "GET", lambda r: f"/api/results?job_ids={batch(r)}&fields=full", None),
+        ("get_dashboard_stats", "GET", lambda r: f"/api/dashboard/{pick(user_ids, r)}", None),
+        ("search", "GET",
+         lambda r: f"/api/search?q={'+'.join(r.sample(VOCABULARY, 2))}&user_id={pick(user_ids, r)}", None),
+        ("export_job_csv", "GET", lambda r: f"/api/jobs/{pick(job_ids, r)}/export?format=csv", None),
+        ("export_job_xlsx", "GET", lambda r: f"/api/jobs/{pick(job_ids, r)}/export?format=xlsx", None),
+        ("export_job_scripts", "GET", lambda r: f"/api/jobs/{pick(job_ids, r)}/scripts.zip", None),
+    ]
+    if project_ids:
+        reads += [
+            ("export_project_csv", "GET",
+             lambda r: f"/api/projects/{pick(project_ids, r)}/export?format=csv", None),
+            ("export_project_scripts", "GET",
+             lambda r: f"/api/projects/{pick(project_ids, r)}/scripts.zip", None),
+            ("redundant_tests", "GET",
+             lambda r: f"/api/projects/{pick(project_ids, r)}/redundant-tests", None),
+        ]
+
+    return reads + [
+        ("request_onboarding", "POST", lambda r: "/api/onboard/request",
+         lambda r: {"email": "bench@bench.local"}),
+        ("verify_user", "GET", lambda r: "/api/onboard/verify/bench-token", None),
+        ("create_project", "POST", lambda r: "/api/projects/create",
+         lambda r: {"name": f"Bench {r.randint(0, 10**6)}", "parentId": "root",
+                    "user_id": pick(user_ids, r)}),
+        ("submit_tests", "POST", lambda r: "/api/generate-test-cases",
+         lambda r: [_story_payload(pick(user_ids, r), r) for _ in range(3)]),
+        ("regenerate_job", "POST", lambda r: f"/api/jobs/{pick(created_jobs or job_ids, r)}/regenerate", None),
+        ("delete_job", "DELETE", lambda r: f"/api/jobs/{created_jobs.pop() if created_jobs else 0}", None),
+    ]
+
+
+def _statement_calls() -> int | None:
+    """
+    Total statements executed in this database according to pg_stat_statements.
+    """
+    conn = None
+    try:
+        # An unreachable database degrades like a missing extension.
+        conn = get_connection()
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT COALESCE(SUM(calls), 0) AS calls
+                FROM pg_stat_statements
+                WHERE dbid = (SELECT oid FROM pg_database WHERE datname = current_database())
+                """
+            )
+            return int(cur.fetchone()["calls"])
+    except Exception:
+        return None
+    finally:
+        if conn is not None:
+            conn.close()
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    k = (len(ordered) - 1) * pct / 100
+    lower = int(k)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (k - lower)
+
+
+def run_scenario(base_url, scenario, total, concurrency, seed_value, created_jobs) -> dict:
+    name, method, path_factory, body_factory = scenario
+    local = threading.local()
+    lock = threading.Lock()
+    latencies, statuses, errors = [], {}, 0
+
+    def one(i):
+        nonlocal errors
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        rng = random.Random(seed_value * 100003 + i)
+        with lock:
+            path = path_factory(rng)
+        body = body_factory(rng) if body_factory else None
+        started = time.perf_counter()
+        try:
+            resp = local.session.request(method, base_url + path, json=body, timeout=60)
+            status = resp.status_code
+            if name == "submit_tests" and status == 200:
+                with lock:
+                    created_jobs.append(resp.json()["job_id"])
+        except requests.RequestException:
+            status = "error"
+        elapsed = (time.perf_counter() - started) * 1000
+        with lock:
+            latencies.append(elapsed)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+            if status == "error":
+                errors += 1
+
+    calls_before = _statement_calls()
+    wall_started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total)))
+    wall = time.perf_counter() - wall_started
+    calls_after = _statement_calls()
+
+    queries = None
+    if calls_before is not None and calls_after is not None:
+        # The two SUM(calls) probes themselves are counted once in the delta.
+        queries = round(max(calls_after - calls_before - 1, 0) / total, 2)
+
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "mean_ms": round(statistics.fmean(latencies), 2) if latencies else 0.0,
+        "throughput_rps": round(total / wall, 2) if wall else 0.0,
+        "db_queries_per_request": queries,
+        "status_counts": statuses,
+        "errors": errors,
+    }
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except Exception:
+        return "unknown"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark every API endpoint")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--seeded", default="bench/results/seed.json",
+                        help="ids written by bench.seed")
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--only", nargs="*", help="endpoint names to run")
+    parser.add_argument("--skip-writes", action="store_true",
+                        help="skip endpoints that create, enqueue or delete data")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--out", help="result file (default bench/results/<ts>-<commit>.json)")
+    args = parser.parse_args(argv)
+
+    seeded = json.loads(Path(args.seeded).read_text())
+    created_jobs: list = []
+    write_endpoints = {"create_project", "submit_tests", "regenerate_job", "delete_job"}
+
+    results = {}
+    for scenario in build_scenarios(seeded, created_jobs):
+        name = scenario[0]
+        if args.only and name not in args.only:
+            continue
+        if args.skip_writes and name in write_endpoints:
+            continue
+        total = args.requests
+        if name == "delete_job":
+            total = min(total, len(created_jobs))
+            if not total:
+                continue
+        results[name] = run_scenario(args.base_url, scenario, total, args.concurrency, args.seed, created_jobs)
+        r = results[name]
+        print(f"{name:22s} p50={r['p50_ms']:8.2f}ms p95={r['p95_ms']:8.2f}ms "
+              f"p99={r['p99_ms']:8.2f}ms rps={r['throughput_rps']:8.2f} "
+              f"queries/req={r['db_queries_per_request']}")
+
+    commit = _git_commit()
+    timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    report = {
+        "meta": {
+            "commit": commit,
+            "timestamp": timestamp,
+            "base_url": args.base_url,
+            "requests_per_endpoint": args.requests,
+            "concurrency": args.concurrency,
+            "volumes": seeded.get("volumes"),
+        },
+        "endpoints": results,
+    }
+
+    out = Path(args.out) if args.out else RESULTS_DIR / f"{timestamp}-{commit}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2))
+    print(f"Results written to {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+"""
+Synthetic data generator for the benchmark suite.
+
+Seeds a local Postgres (and optionally Redis) with configurable volumes:
+
+    python -m bench.seed --users 20 --projects-per-user 3 --jobs-per-project 10 \
+        --stories-per-job 5 --test-cases-per-story 8
+
+Rows are bulk loaded with COPY so large volumes seed in seconds. Data is
+deterministic for a given --seed, which keeps runs comparable across commits.
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from archive import ensure_partitions
+from db import get_connection, init_db
+from tools.minhash import index_unindexed
+
+BENCH_PREFIX = "bench_user_"
+BENCH_PASSWORD = "bench-password"
+
+VOCABULARY = [
+    "enrollment", "facility", "addenda", "member", "provider", "claim", "eligibility",
+    "coverage", "plan", "premium", "invoice", "payment", "portal", "login", "password",
+    "profile", "address", "dependent", "spouse", "effective", "date", "termination",
+    "renewal", "upload", "document", "signature", "approval", "reject", "submit",
+    "validate", "error", "message", "dashboard", "report", "export", "search", "filter",
+    "notification", "email", "audit", "history", "role", "permission", "tenant",
+]
+PRIORITIES = ["High", "Medium", "Low"]
+FRAMEWORKS = ["java_selenium", "js_testcomplete"]
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(VOCABULARY) for _ in range(words)).capitalize()
+
+
+def _test_case(rng: random.Random, tc_id: str) -> dict:
+    return {
+        "ID": tc_id,
+        "title": _sentence(rng, 6),
+        "preconditions": _sentence(rng, 8),
+        "steps": [_sentence(rng, 7) for _ in range(rng.randint(3, 6))],
+        "expected_results": [_sentence(rng, 6) for _ in range(rng.randint(1, 3))],
+        "priority": rng.choice(PRIORITIES),
+    }
+
+
+def _copy(cur, table: str, columns: list[str], rows):
+    with cur.copy(f"COPY {table} ({', '.join(columns)}) FROM STDIN") as copy:
+        for row in rows:
+            copy.write_row(row)
+
+
+def clear_bench_data(cur):
+    """
+    Remove rows created by a previous seed (cascades to jobs and results).
+    """
+    cur.execute(
+        "DELETE FROM scheduled_jobs WHERE user_id IN "
+        "(SELECT user_id FROM users WHERE display_name LIKE %s)",
+        (BENCH_PREFIX + "%",),
+    )
+    cur.execute("DELETE FROM users WHERE display_name LIKE %s", (BENCH_PREFIX + "%",))
+    cur.execute("DELETE FROM tenants WHERE tenant_name = %s", ("bench_tenant",))
+
+
+def seed(
+    users: int,
+    projects_per_user: int,
+    jobs_per_project: int,
+    stories_per_job: int,
+    test_cases_per_story: int,
+    duplicate_rate: float = 0.1,
+    seed_value: int = 42,
+) -> dict:
+    """
+    Insert synthetic users, projects, jobs, stories, test cases and scripts.
+    Returns the ids the load generator needs (usernames, user ids, job ids).
+    """
+    rng = random.Random(seed_value)
+    conn = get_connection()
+    started = time.perf_counter()
+    try:
+        with conn.cursor() as cur:
+            clear_bench_data(cur)
+
+            cur.execute(
+                "INSERT INTO tenants (tenant_name) VALUES (%s) RETURNING tenant_id",
+                ("bench_tenant",),
+            )
+            tenant_id = cur.fetchone()["tenant_id"]
+
+            usernames = [f"{BENCH_PREFIX}{i}" for i in range(users)]
+            user_ids = []
+            for name in usernames:
+                cur.execute(
+                    "INSERT INTO users (display_name, email, status) "
+                    "VALUES (%s, %s, 'active') RETURNING user_id",
+                    (name, f"{name}@bench.local"),
+                )
+                user_ids.append(cur.fetchone()["user_id"])
+
+            _copy(cur, "user_credentials", ["user_id", "password_hash"],
+                  ((uid, BENCH_PASSWORD) for uid in user_ids))
+            _copy(cur, "tenant_user_access", ["tenant_id", "user_id", "access_role", "access_level", "status"],
+                  ((tenant_id, uid, "tester", "write", "active") for uid in user_ids))
+
+            project_rows = []
+            for uid in user_ids:
+                for p in range(projects_per_user):
+                    project_rows.append((uid, f"Project {p}", None, _sentence(rng, 5)))
+            _copy(cur, "user_projects", ["user_id", "project_name", "sub_project_name", "description"], project_rows)
+            # COPY returns no ids; project-scoped endpoints (exports) need them.
+            cur.execute(
+                "SELECT project_id FROM user_projects WHERE user_id = ANY(%s) ORDER BY project_id",
+                (user_ids,),
+            )
+            project_ids = [row["project_id"] for row in cur.fetchall()]
+
+            # Jobs need their generated ids back, so insert them in one multi-row statement.
+            job_specs = []
+            now = datetime.now()
+            for uid, project_name, _, _ in project_rows:
+                for _ in range(jobs_per_project):
+                    job_specs.append((
+                        uid,
+                        project_name,
+                        _sentence(rng, 5),
+                        rng.choices(["COMPLETED", "FAILED", "IN_PROGRESS", "IN_QUEUE"], [85, 5, 5, 5])[0],
+                        stories_per_job,
+                        rng.choice(FRAMEWORKS),
+                        now - timedelta(minutes=rng.randint(0, 60 * 24 * 365)),
+                    ))
+            # A year of backdated jobs: give each month its own partition.
+            ensure_partitions(cur, (now - timedelta(days=366)).date(), now.date())
+
+            job_ids = []
+            for offset in range(0, len(job_specs), 1000):
+                chunk = job_specs[offset:offset + 1000]
+                placeholders = ", ".join(["(%s, %s, %s, %s, %s, %s, %s)"] * len(chunk))
+                cur.execute(
+                    f"""
+                    INSERT INTO scheduled_jobs (
+                        user_id, project_name, description, status,
+                        user_story_count, framework_choice, submitted_at
+                    )
+                    VALUES {placeholders}
+                    RETURNING job_id
+                    """,
+                    [value for spec in chunk for value in spec],
+                )
+                job_ids.extend(row["job_id"] for row in cur.fetchall())
+
+            story_rows, test_case_rows, script_rows = [], [], []
+            previous_case = None
+            for job_id, spec in zip(job_ids, job_specs):
+                for idx in range(1, stories_per_job + 1):
+                    user_story_id = f"US-{job_id}-{idx}"
+                    story_rows.append((user_story_id, job_id, _sentence(rng, 20), _sentence(rng, 30), spec[6]))
+
+                    cases = []
+                    for n in range(1, test_cases_per_story + 1):
+                        if previous_case and rng.random() < duplicate_rate:
+                            case = dict(previous_case, ID=f"TC-{n:03d}")
+                        else:
+                            case = _test_case(rng, f"TC-{n:03d}")
+                        cases.append(case)
+                        previous_case = case
+                    test_case_rows.append((job_id, user_story_id, json.dumps(cases), spec[6]))
+
+                    script_rows.append((user_story_id, json.dumps({
+                        "framework": spec[5],
+                        "file_name": f"Test{idx}.java" if spec[5] == "java_selenium" else f"test{idx}.js",
+                        "code": "\n".join(_sentence(rng, 10) for _ in range(40)),
+                    }), spec[6]))
+
+            _copy(cur, "user_stories",
+                  ["user_story_id", "job_id", "user_story_text", "acceptance_criteria", "submitted_at"], story_rows)
+            _copy(cur, "function_test_cases", ["job_id", "user_story_id", "result", "submitted_at"], test_case_rows)
+            _copy(cur, "automation_scripts", ["user_story_id", "script", "submitted_at"], script_rows)
+
+        conn.commit()
+
+        with conn.cursor() as cur:
+            cur.execute("ANALYZE")
+        conn.commit()
+
+    except Exception:
+        conn.rollback()
+        raise
+
+    finally:
+        conn.close()
+
+    # COPY bypasses the worker's per-batch indexing; backfill the MinHash/LSH
+    # index like the redundant-tests reindex endpoint does.
+    for uid, project_name, _, _ in project_rows:
+        index_unindexed(user_id=uid, project_name=project_name)
+
+    return {
+        "usernames": usernames,
+        "user_ids": user_ids,
+        "job_ids": job_ids,
+        "project_ids": project_ids,
+        "volumes": {
+            "users": users,
+            "projects": len(project_rows),
+            "jobs": len(job_ids),
+            "stories": len(story_rows),
+            "test_cases": len(job_ids) * stories_per_job * test_cases_per_story,
+        },
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+def seed_queue(job_ids: list[int], count: int):
+    """
+    Push IN_QUEUE jobs onto the job queue so queue-depth dependent code paths
+    see a realistic backlog (Redis for QUEUE_BACKEND=rq).
+    """
+    from job_queue import get_job_queue
+
+    queue = get_job_queue()
+    for job_id in job_ids[:count]:
+        queue.enqueue("worker.generate_functional_tests_job", job_id)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Seed synthetic benchmark data")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--projects-per-user", type=int, default=3)
+    parser.add_argument("--jobs-per-project", type=int, default=10)
+    parser.add_argument("--stories-per-job", type=int, default=5)
+    parser.add_argument("--test-cases-per-story", type=int, default=8)
+    parser.add_argument("--duplicate-rate", type=float, default=0.1,
+                        help="fraction of test cases copied from the previous one")
+    parser.add_argument("--queued-jobs", type=int, default=0,
+                        help="also enqueue this many seeded jobs on the job queue")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default="bench/results/seed.json",
+                        help="where to write the seeded ids for bench.run")
+    args = parser.parse_args(argv)
+
+    init_db()
+    info = seed(
+        args.users,
+        args.projects_per_user,
+        args.jobs_per_project,
+        args.stories_per_job,
+        args.test_cases_per_story,
+        duplicate_rate=args.duplicate_rate,
+        seed_value=args.seed,
+    )
+    if args.queued_jobs:
+        seed_queue(info["job_ids"], args.queued_jobs)
+
+    out = Path(args.out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(info))
+    print(f"Seeded {info['volumes']} in {info['seconds']}s -> {out}")
+
+
+if __name__ == "__main__":
+    main()
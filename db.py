@@ -1,15 +1,345 @@
+import itertools
+import logging
 import os
+import time
+from contextvars import ContextVar
+from pathlib import Path
+
 import psycopg
 from psycopg.rows import dict_row
 #from config import AppConfig
 #cfg =AppConfig()
-import os
-def get_connection():
-    return psycopg.connect(
-        os.environ["database_url"],
-        row_factory=dict_row
+
+import metrics
+import sql_profiler
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = Path(__file__).parent / "migrations"
+
+# Read replicas (comma-separated DSNs). Read-only handlers use
+# get_read_connection(); everything else stays on the primary.
+REPLICA_URLS = [u.strip() for u in os.environ.get("DATABASE_REPLICA_URLS", "").split(",") if u.strip()]
+# How long a failed or lagging replica is skipped before it is tried again.
+REPLICA_RETRY_SECONDS = float(os.environ.get("DB_REPLICA_RETRY_SECONDS", "30"))
+REPLICA_MAX_LAG_SECONDS = float(os.environ.get("DB_REPLICA_MAX_LAG_SECONDS", "10"))
+REPLICA_CHECK_INTERVAL = float(os.environ.get("DB_REPLICA_CHECK_INTERVAL", "5"))
+REPLICA_TIMEOUT = float(os.environ.get("DB_REPLICA_TIMEOUT", "2"))
+# After a write, reads from the same client stay on the primary this long.
+READ_YOUR_WRITES_SECONDS = int(os.environ.get("DB_READ_YOUR_WRITES_SECONDS", "15"))
+PRIMARY_COOKIE = "db_primary_until"
+# Same value as the cookie, for cross-site clients whose browser drops it.
+PRIMARY_HEADER = "X-DB-Primary-Until"
+
+REPLICA_LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN NULL
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE extract(epoch FROM now() - pg_last_xact_replay_timestamp())
+    END AS lag
+"""
+
+
+class InstrumentedCursor(psycopg.Cursor):
+    """
+    Cursor that reports each statement's duration to metrics and, when
+    SQL_PROFILE is enabled, to sql_profiler.
+    """
+
+    def _observe(self, query, params, seconds: float):
+        metrics.observe_query(seconds)
+        if sql_profiler.ENABLED:
+            sql = query if isinstance(query, str) else query.as_string(self)
+            sql_profiler.record(sql, params, seconds, self.rowcount)
+
+    def execute(self, query, params=None, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, params, **kwargs)
+        finally:
+            self._observe(query, params, time.perf_counter() - started)
+
+    def executemany(self, query, params_seq, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, params_seq, **kwargs)
+        finally:
+            self._observe(query, None, time.perf_counter() - started)
+
+
+CONNECTION_KWARGS = {"row_factory": dict_row, "cursor_factory": InstrumentedCursor}
+
+# Created by open_pool() (the API lifespan); scripts and workers connect directly.
+_pool = None
+
+
+def database_url() -> str:
+    return os.environ.get("DATABASE_URL") or os.environ["database_url"]
+
+
+class PooledConnection:
+    """
+    Pooled connection whose close() hands it back to the pool, so handlers
+    keep the get_connection() / conn.close() pattern unchanged.
+    """
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def close(self):
+        if self._conn is not None:
+            self._pool.putconn(self._conn)
+            self._conn = None
+
+
+class Replica:
+    """
+    One read replica and its health: skipped until down_until after a failed
+    connect or excessive replication lag; lag is re-checked every
+    REPLICA_CHECK_INTERVAL seconds.
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self.host = psycopg.conninfo.conninfo_to_dict(url).get("host", "")
+        self.pool = None
+        self.down_until = 0.0
+        self.checked_at = 0.0
+
+    @property
+    def up(self) -> bool:
+        return self.down_until <= time.monotonic()
+
+    def mark_down(self, reason: str):
+        logger.warning("Replica %s unavailable for %ss: %s", self.host, REPLICA_RETRY_SECONDS, reason)
+        self.down_until = time.monotonic() + REPLICA_RETRY_SECONDS
+
+    def connect(self):
+        if self.pool is not None:
+            return PooledConnection(self.pool, self.pool.getconn(timeout=REPLICA_TIMEOUT))
+        return psycopg.connect(self.url, connect_timeout=max(1, int(REPLICA_TIMEOUT)), **CONNECTION_KWARGS)
+
+    def lag_ok(self, conn) -> bool:
+        now = time.monotonic()
+        if now - self.checked_at < REPLICA_CHECK_INTERVAL:
+            return True
+        with conn.cursor() as cur:
+            cur.execute(REPLICA_LAG_SQL)
+            lag = cur.fetchone()["lag"]
+        conn.rollback()
+        self.checked_at = now
+        if lag is not None and lag > REPLICA_MAX_LAG_SECONDS:
+            self.mark_down(f"replication lag {lag:.1f}s")
+            return False
+        return True
+
+
+_replicas = [Replica(url) for url in REPLICA_URLS]
+_next_replica = itertools.count()
+# Epoch seconds until which this request's reads must go to the primary.
+_primary_until: ContextVar[float] = ContextVar("db_primary_until", default=0.0)
+
+
+def _pool_sizes() -> dict:
+    return {
+        "min_size": int(os.environ.get("DB_POOL_MIN_SIZE", "2")),
+        "max_size": int(os.environ.get("DB_POOL_MAX_SIZE", "10")),
+    }
+
+
+def open_pool():
+    """
+    Open the shared connection pool (and one per replica). Connections are
+    established in the background, so startup does not block on (or fail
+    because of) Postgres.
+    """
+    global _pool
+    if _pool is not None:
+        return _pool
+    from psycopg_pool import ConnectionPool
+
+    _pool = ConnectionPool(
+        database_url(),
+        **_pool_sizes(),
+        timeout=float(os.environ.get("DB_POOL_TIMEOUT", "10")),
+        kwargs=CONNECTION_KWARGS,
+        name="sagescript",
+        open=True,
     )
+    for i, replica in enumerate(_replicas):
+        replica.pool = ConnectionPool(
+            replica.url,
+            **_pool_sizes(),
+            timeout=REPLICA_TIMEOUT,
+            kwargs=CONNECTION_KWARGS,
+            check=ConnectionPool.check_connection,
+            name=f"sagescript-replica-{i}",
+            open=True,
+        )
+    return _pool
+
+
+def close_pool():
+    global _pool
+    for replica in _replicas:
+        if replica.pool is not None:
+            replica.pool.close()
+            replica.pool = None
+    if _pool is not None:
+        _pool.close()
+        _pool = None
+
+
+def get_connection():
+    started = time.perf_counter()
+    if _pool is not None:
+        conn = PooledConnection(_pool, _pool.getconn())
+    else:
+        conn = psycopg.connect(database_url(), **CONNECTION_KWARGS)
+    metrics.DB_CONNECT_DURATION.observe(time.perf_counter() - started)
+    return conn
+
+
+def get_read_connection():
+    """
+    Connection for read-only handlers: a healthy replica (round robin), or
+    the primary when no replica is configured or up, or when the client
+    wrote recently (read-your-writes, see primary_affinity_middleware).
+    """
+    if not _replicas:
+        return get_connection()
+    if _primary_until.get() > time.time():
+        metrics.DB_READ_ROUTES.labels("primary").inc()
+        return get_connection()
+
+    started = time.perf_counter()
+    first = next(_next_replica)
+    for i in range(len(_replicas)):
+        replica = _replicas[(first + i) % len(_replicas)]
+        if not replica.up:
+            continue
+        try:
+            conn = replica.connect()
+        except Exception as e:
+            replica.mark_down(str(e))
+            continue
+        try:
+            healthy = replica.lag_ok(conn)
+        except Exception as e:
+            replica.mark_down(str(e))
+            healthy = False
+        if not healthy:
+            conn.close()
+            continue
+        metrics.DB_CONNECT_DURATION.observe(time.perf_counter() - started)
+        metrics.DB_READ_ROUTES.labels("replica").inc()
+        return conn
+
+    metrics.DB_READ_ROUTES.labels("failover").inc()
+    return get_connection()
+
+
+async def primary_affinity_middleware(request, call_next):
+    """
+    Read-your-writes: a successful write (any non-GET/HEAD request) sets a
+    short-lived cookie and X-DB-Primary-Until response header, and requests
+    carrying either read from the primary, so a client sees its own job right
+    after submit or regenerate. The UI is on another site, so the cookie is
+    SameSite=None; clients whose browser blocks third-party cookies echo the
+    header instead.
+    """
+    try:
+        until = max(
+            float(request.cookies.get(PRIMARY_COOKIE) or 0),
+            float(request.headers.get(PRIMARY_HEADER) or 0),
+        )
+    except ValueError:
+        until = 0.0
+    token = _primary_until.set(until)
+    try:
+        response = await call_next(request)
+    finally:
+        _primary_until.reset(token)
+
+    if _replicas and request.method not in ("GET", "HEAD", "OPTIONS") and response.status_code < 400:
+        until = str(int(time.time()) + READ_YOUR_WRITES_SECONDS)
+        response.set_cookie(
+            PRIMARY_COOKIE,
+            until,
+            max_age=READ_YOUR_WRITES_SECONDS,
+            httponly=True,
+            samesite="none",
+            secure=True,
+        )
+        response.headers[PRIMARY_HEADER] = until
+    return response
+
+
+def pool_health() -> dict:
+    """
+    Readiness check: run SELECT 1 on a pooled (or direct) connection.
+    """
+    try:
+        if _pool is not None:
+            with _pool.connection(timeout=2) as conn:
+                conn.execute("SELECT 1")
+            health = {"ok": True, "stats": _pool.get_stats()}
+            if _replicas:
+                # Replicas don't affect readiness: reads fail over to the primary.
+                health["replicas"] = [{"host": r.host, "up": r.up} for r in _replicas]
+            return health
+        with psycopg.connect(database_url(), connect_timeout=2) as conn:
+            conn.execute("SELECT 1")
+        return {"ok": True}
+    except KeyError as e:
+        return {"ok": False, "error": f"{e.args[0]} is not set"}
+    except Exception as e:
+        return {"ok": False, "error": str(e)}
+
+
+def init_db():
+    """
+    Apply pending SQL files from migrations/ in filename order.
+    Applied files are recorded in schema_migrations so re-running is a no-op.
+    """
+    conn = get_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    filename    TEXT PRIMARY KEY,
+                    applied_at  TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+                )
+                """
+            )
+            cur.execute("SELECT filename FROM schema_migrations")
+            applied = {row["filename"] for row in cur.fetchall()}
+        conn.commit()
+
+        for path in sorted(MIGRATIONS_DIR.glob("*.sql")):
+            if path.name in applied:
+                continue
+            with conn.cursor() as cur:
+                cur.execute(path.read_text())
+                cur.execute(
+                    "INSERT INTO schema_migrations (filename) VALUES (%s)",
+                    (path.name,),
+                )
+            conn.commit()
+            print(f"Applied migration {path.name}")
 
+    except Exception:
+        conn.rollback()
+        raise
 
+    finally:
+        conn.close()
 
 
+if __name__ == "__main__":
+    init_db()
@@ -0,0 +1,510 @@
+"""
+Pluggable job queue.
+
+Everything that enqueues or consumes work (app.py, leases.py, admission.py,
+worker.py, metrics.py) goes through get_job_queue(), which returns the backend
+selected by QUEUE_BACKEND:
+
+- "rq" (default): Redis + RQ, as before. Delayed items use the RQ scheduler.
+- "postgres": a job_queue table in the application database. Workers claim
+  ready items in batches with SELECT ... FOR UPDATE SKIP LOCKED, ordered by
+  priority then run_at, and sleep on LISTEN job_queue between claims, so
+  enqueue wakes an idle worker immediately. No Redis required.
+
+Work items are dotted function names plus JSON-serialisable args, e.g.
+enqueue("worker.generate_functional_tests_job", job_id).
+"""
+import abc
+import importlib
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import List, Optional
+
+from psycopg.types.json import Jsonb
+
+from db import database_url, get_connection
+from rq_config import QUEUE_NAME, get_queue, get_redis_connection, redis_health
+
+QUEUE_BACKEND = os.environ.get("QUEUE_BACKEND", "rq").lower()
+# Items claimed per round trip by a Postgres worker. Claimed items wait for
+# the worker that took them, so keep this small when jobs are long.
+QUEUE_CLAIM_BATCH = int(os.environ.get("QUEUE_CLAIM_BATCH", "4"))
+QUEUE_POLL_INTERVAL = float(os.environ.get("QUEUE_POLL_INTERVAL", "5"))
+# Claims older than this are assumed lost (worker died) and made claimable again.
+QUEUE_CLAIM_TIMEOUT = int(os.environ.get("QUEUE_CLAIM_TIMEOUT", "3600"))
+QUEUE_WORKER_TTL = int(os.environ.get("QUEUE_WORKER_TTL", "60"))
+THROUGHPUT_ALPHA = float(os.environ.get("ADMISSION_THROUGHPUT_ALPHA", "0.2"))
+
+PRIORITY_BACKGROUND = 0
+PRIORITY_INTERACTIVE = 10
+
+NOTIFY_CHANNEL = "job_queue"
+
+logger = logging.getLogger("job_queue")
+
+
+def resolve(func: str):
+    module, name = func.rsplit(".", 1)
+    return getattr(importlib.import_module(module), name)
+
+
+class JobQueue(abc.ABC):
+    """
+    Interface shared by the queue backends.
+    """
+
+    backend = "base"
+
+    def __init__(self, name: str = QUEUE_NAME):
+        self.name = name
+
+    @abc.abstractmethod
+    def enqueue(self, func: str, *args, delay: float = 0, priority: int = PRIORITY_BACKGROUND) -> str:
+        """
+        Queue one item (optionally after `delay` seconds); returns its id.
+        """
+
+    @abc.abstractmethod
+    def enqueue_many(self, items: List[dict], cursor=None):
+        """
+        Publish a batch in one round trip. Each item has func, args, priority,
+        delay and an idempotency key; republishing a key must be harmless.
+        """
+
+    @abc.abstractmethod
+    def count(self) -> int:
+        """
+        Items ready or scheduled, not yet claimed.
+        """
+
+    @abc.abstractmethod
+    def oldest_age(self) -> float:
+        """
+        Seconds the oldest waiting item has been queued (0 when empty).
+        """
+
+    @abc.abstractmethod
+    def worker_count(self) -> int:
+        """
+        Live workers consuming this queue.
+        """
+
+    @abc.abstractmethod
+    def record_throughput(self, stories: int, seconds: float):
+        """
+        Fold one finished job's stories/second into the shared estimate.
+        """
+
+    @abc.abstractmethod
+    def throughput(self) -> Optional[float]:
+        """
+        Estimated stories/second across live workers, or None if unknown.
+        """
+
+    @abc.abstractmethod
+    def health(self) -> dict:
+        """
+        Readiness of the backend, as {"ok": bool, ...}.
+        """
+
+    @abc.abstractmethod
+    def work(self, burst: bool = False):
+        """
+        Process items until stopped (or, with burst, until none are ready).
+        """
+
+
+class RQJobQueue(JobQueue):
+    backend = "rq"
+
+    THROUGHPUT_KEY = "admission:stories_per_second"
+    # KEYS[1]: throughput key. ARGV: observed stories/second, alpha.
+    EWMA_LUA = """
+    local current = tonumber(redis.call('GET', KEYS[1]))
+    local observed = tonumber(ARGV[1])
+    if current then
+        observed = current + tonumber(ARGV[2]) * (observed - current)
+    end
+    redis.call('SET', KEYS[1], tostring(observed))
+    return tostring(observed)
+    """
+
+    @property
+    def queue(self):
+        from rq import Queue
+
+        if self.name == QUEUE_NAME:
+            return get_queue()
+        return Queue(name=self.name, connection=get_redis_connection())
+
+    def enqueue(self, func, *args, delay=0, priority=PRIORITY_BACKGROUND):
+        # RQ queues are FIFO; priority is only honoured by the Postgres backend.
+        if delay:
+            return self.queue.enqueue_in(timedelta(seconds=delay), func, *args).id
+        return self.queue.enqueue(func, *args).id
+
+    def enqueue_many(self, items, cursor=None):
+        from rq import Queue
+
+        # The key becomes the RQ job id; a republished key re-enqueues the
+        # same job, which the worker then skips (see outbox.py).
+        queue = self.queue
+        ready = [
+            Queue.prepare_data(item["func"], list(item["args"]), job_id=item["key"])
+            for item in items if not item["delay"]
+        ]
+        if ready:
+            queue.enqueue_many(ready)
+        for item in items:
+            if item["delay"]:
+                queue.enqueue_in(timedelta(seconds=item["delay"]), item["func"], *item["args"], job_id=item["key"])
+
+    def count(self):
+        return self.queue.count
+
+    def oldest_age(self):
+        from rq.job import Job
+
+        queue = self.queue
+        job_ids = queue.get_job_ids(0, 0)
+        if not job_ids:
+            return 0.0
+        job = Job.fetch(job_ids[0], connection=queue.connection)
+        if not job.enqueued_at:
+            return 0.0
+        enqueued_at = job.enqueued_at
+        if enqueued_at.tzinfo is None:
+            enqueued_at = enqueued_at.replace(tzinfo=timezone.utc)
+        return (datetime.now(timezone.utc) - enqueued_at).total_seconds()
+
+    def worker_count(self):
+        from rq import Worker
+
+        queue = self.queue
+        return Worker.count(connection=queue.connection, queue=queue)
+
+    def record_throughput(self, stories, seconds):
+        if stories <= 0 or seconds <= 0 or not os.environ.get("REDIS_URL"):
+            return
+        get_redis_connection().eval(self.EWMA_LUA, 1, self.THROUGHPUT_KEY, stories / seconds, THROUGHPUT_ALPHA)
+
+    def throughput(self):
+        per_worker = get_redis_connection().get(self.THROUGHPUT_KEY)
+        workers = self.worker_count()
+        if per_worker is None or not workers:
+            return None
+        return float(per_worker) * workers
+
+    def health(self):
+        return redis_health()
+
+    def work(self, burst=False):
+        from rq import SimpleWorker
+
+        # The scheduler delivers delayed items (e.g. retries from the lease reaper).
+        SimpleWorker([self.queue], connection=get_redis_connection()).work(
+            burst=burst, with_scheduler=True
+        )
+
+
+class PostgresJobQueue(JobQueue):
+    backend = "postgres"
+
+    def __init__(self, name: str = QUEUE_NAME):
+        super().__init__(name)
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{name}"
+
+    def enqueue(self, func, *args, delay=0, priority=PRIORITY_BACKGROUND, cursor=None):
+        """
+        Insert an item and notify idle workers. Pass `cursor` to enqueue in
+        the caller's transaction (the item becomes visible on its commit).
+        """
+        def insert(cur):
+            cur.execute(
+                """
+                INSERT INTO job_queue (queue_name, func, args, priority, run_at)
+                VALUES (%s, %s, %s, %s, now() + make_interval(secs => %s))
+                RETURNING item_id
+                """,
+                (self.name, func, Jsonb(list(args)), priority, delay),
+            )
+            item_id = cur.fetchone()["item_id"]
+            cur.execute("SELECT pg_notify(%s, %s)", (NOTIFY_CHANNEL, self.name))
+            return str(item_id)
+
+        if cursor is not None:
+            return insert(cursor)
+
+        conn = get_connection()
+        try:
+            with conn.cursor() as cur:
+                item_id = insert(cur)
+            conn.commit()
+            return item_id
+        finally:
+            conn.close()
+
+    def enqueue_many(self, items, cursor=None):
+        """
+        Insert the batch, skipping keys already queued. With `cursor` this
+        runs in the caller's transaction (the outbox relay's), so publishing
+        and marking the outbox rows published commit together.
+        """
+        rows = [
+            (self.name, item["func"], Jsonb(list(item["args"])), item["priority"], item["delay"], item["key"])
+            for item in items
+        ]
+
+        def insert(cur):
+            cur.executemany(
+                """
+                INSERT INTO job_queue (queue_name, func, args, priority, run_at, idempotency_key)
+                VALUES (%s, %s, %s, %s, now() + make_interval(secs => %s), %s)
+                ON CONFLICT (idempotency_key) DO NOTHING
+                """,
+                rows,
+            )
+            cur.execute("SELECT pg_notify(%s, %s)", (NOTIFY_CHANNEL, self.name))
+
+        if cursor is not None:
+            insert(cursor)
+            return
+        conn = get_connection()
+        try:
+            with conn.cursor() as cur:
+                insert(cur)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _query_one(self, sql: str, params=()):
+        conn = get_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(sql, params)
+                row = cur.fetchone()
+            conn.commit()
+            return row
+        finally:
+            conn.close()
+
+    def count(self):
+        return self._query_one(
+            "SELECT count(*) AS n FROM job_queue WHERE queue_name = %s AND claimed_at IS NULL",
+            (self.name,),
+        )["n"]
+
+    def oldest_age(self):
+        return float(self._query_one(
+            """
+            SELECT coalesce(extract(epoch FROM now() - min(enqueued_at)), 0) AS age
+            FROM job_queue
+            WHERE queue_name = %s AND claimed_at IS NULL AND run_at <= now()
+            """,
+            (self.name,),
+        )["age"])
+
+    def worker_count(self):
+        return self._query_one(
+            """
+            SELECT count(*) AS n FROM queue_workers
+            WHERE queue_name = %s AND last_seen > now() - make_interval(secs => %s)
+            """,
+            (self.name, QUEUE_WORKER_TTL),
+        )["n"]
+
+    def record_throughput(self, stories, seconds):
+        if stories <= 0 or seconds <= 0:
+            return
+        self._query_one(
+            """
+            UPDATE queue_workers
+            SET stories_per_second = CASE
+                WHEN stories_per_second IS NULL THEN %(observed)s
+                ELSE stories_per_second + %(alpha)s * (%(observed)s - stories_per_second)
+            END
+            WHERE worker_id = %(worker)s
+            RETURNING worker_id
+            """,
+            {"observed": stories / seconds, "alpha": THROUGHPUT_ALPHA, "worker": self.worker_id},
+        )
+
+    def throughput(self):
+        return self._query_one(
+            """
+            SELECT sum(stories_per_second) AS total FROM queue_workers
+            WHERE queue_name = %s AND last_seen > now() - make_interval(secs => %s)
+            """,
+            (self.name, QUEUE_WORKER_TTL),
+        )["total"]
+
+    def health(self):
+        """
+        Reads both queue tables; the API never calls _maintain, so this is
+        what notices a missing or unreadable job_queue / queue_workers.
+        """
+        try:
+            row = self._query_one(
+                """
+                SELECT
+                    EXISTS (SELECT 1 FROM job_queue WHERE queue_name = %(queue)s) AS has_items,
+                    (
+                        SELECT count(*) FROM queue_workers
+                        WHERE queue_name = %(queue)s
+                          AND last_seen > now() - make_interval(secs => %(ttl)s)
+                    ) AS workers
+                """,
+                {"queue": self.name, "ttl": QUEUE_WORKER_TTL},
+            )
+            return {"ok": True, "workers": row["workers"]}
+        except KeyError as e:
+            return {"ok": False, "error": f"{e.args[0]} is not set"}
+        except Exception as e:
+            return {"ok": False, "error": str(e)}
+
+    def claim(self, limit: int) -> List[dict]:
+        """
+        Claim up to `limit` ready items, highest priority first. Concurrent
+        workers skip each other's locked rows instead of waiting on them.
+        """
+        conn = get_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    UPDATE job_queue q
+                    SET claimed_by = %(worker)s, claimed_at = now()
+                    FROM (
+                        SELECT item_id
+                        FROM job_queue
+                        WHERE queue_name = %(queue)s
+                          AND claimed_at IS NULL
+                          AND run_at <= now()
+                        ORDER BY priority DESC, run_at, item_id
+                        LIMIT %(limit)s
+                        FOR UPDATE SKIP LOCKED
+                    ) ready
+                    WHERE q.item_id = ready.item_id
+                    RETURNING q.item_id, q.func, q.args, q.priority, q.run_at
+                    """,
+                    {"worker": self.worker_id, "queue": self.name, "limit": limit},
+                )
+                items = cur.fetchall()
+            conn.commit()
+        finally:
+            conn.close()
+        items.sort(key=lambda item: (-item["priority"], item["run_at"], item["item_id"]))
+        return items
+
+    def _complete(self, item_id: int, error: Optional[str] = None):
+        conn = get_connection()
+        try:
+            with conn.cursor() as cur:
+                if error is None:
+                    cur.execute("DELETE FROM job_queue WHERE item_id = %s", (item_id,))
+                else:
+                    cur.execute(
+                        "UPDATE job_queue SET failed_at = now(), error = %s WHERE item_id = %s",
+                        (error, item_id),
+                    )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _run(self, item: dict):
+        started = time.perf_counter()
+        try:
+            resolve(item["func"])(*item["args"])
+        except Exception:
+            logger.exception("Queue item %s (%s) failed", item["item_id"], item["func"])
+            self._complete(item["item_id"], traceback.format_exc())
+            return
+        self._complete(item["item_id"])
+        logger.info("Queue item %s (%s) done in %.2fs", item["item_id"], item["func"],
+                    time.perf_counter() - started)
+
+    def _maintain(self):
+        """
+        Worker heartbeat, plus releasing claims abandoned by dead workers.
+        """
+        conn = get_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    INSERT INTO queue_workers (worker_id, queue_name)
+                    VALUES (%s, %s)
+                    ON CONFLICT (worker_id) DO UPDATE SET last_seen = now()
+                    """,
+                    (self.worker_id, self.name),
+                )
+                cur.execute(
+                    """
+                    UPDATE job_queue
+                    SET claimed_by = NULL, claimed_at = NULL
+                    WHERE queue_name = %s
+                      AND claimed_at < now() - make_interval(secs => %s)
+                      AND failed_at IS NULL
+                    """,
+                    (self.name, QUEUE_CLAIM_TIMEOUT),
+                )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _start_heartbeat(self):
+        def loop():
+            while True:
+                time.sleep(QUEUE_WORKER_TTL / 3)
+                try:
+                    self._maintain()
+                except Exception:
+                    logger.exception("Queue worker heartbeat failed")
+
+        threading.Thread(target=loop, name="queue-heartbeat", daemon=True).start()
+
+    def work(self, burst=False):
+        import psycopg
+
+        self._maintain()
+        self._start_heartbeat()
+        listener = psycopg.connect(database_url(), autocommit=True)
+        listener.execute(f"LISTEN {NOTIFY_CHANNEL}")
+        logger.info("Postgres queue worker %s listening on %r", self.worker_id, self.name)
+        try:
+            while True:
+                items = self.claim(QUEUE_CLAIM_BATCH)
+                for item in items:
+                    self._run(item)
+                if items:
+                    continue
+                if burst:
+                    return
+                # Sleep until an enqueue notifies us, or poll for delayed items.
+                for _ in listener.notifies(timeout=QUEUE_POLL_INTERVAL, stop_after=1):
+                    pass
+        finally:
+            listener.close()
+            self._query_one(
+                "DELETE FROM queue_workers WHERE worker_id = %s RETURNING worker_id", (self.worker_id,)
+            )
+
+
+BACKENDS = {
+    "rq": RQJobQueue,
+    "postgres": PostgresJobQueue,
+}
+
+
+@lru_cache(maxsize=None)
+def get_job_queue(backend: Optional[str] = None, name: str = QUEUE_NAME) -> JobQueue:
+    backend = (backend or QUEUE_BACKEND).lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown QUEUE_BACKEND {backend!r}; expected one of {sorted(BACKENDS)}")
+    return BACKENDS[backend](name)
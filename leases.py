@@ -0,0 +1,287 @@
+"""
+Job leases, heartbeats and stuck-job recovery.
+
+A worker that starts a job takes a lease on its scheduled_jobs row
+(lease_owner + lease_expires_at, JOB_LEASE_SECONDS long) and renews it every
+JOB_HEARTBEAT_SECONDS while the job runs. The lease is tied to the attempt
+(lease_attempt_id): renewing and finishing only succeed for the attempt that
+holds it, so an attempt that lost its lease cannot overwrite the outcome of a
+newer one, even one running in the same process.
+
+reap_expired() finds IN_PROGRESS jobs whose lease ran out (the worker died or
+hung), marks the attempt EXPIRED and re-queues the job (through the outbox)
+with capped exponential backoff, or marks it FAILED once JOB_MAX_ATTEMPTS attempts have been made.
+Every worker runs the reaper periodically; SKIP LOCKED keeps them from
+reaping the same job twice.
+"""
+import asyncio
+import logging
+import os
+import random
+import socket
+import threading
+import time
+from typing import Optional
+
+import metrics
+import outbox
+from db import get_connection
+
+logger = logging.getLogger("leases")
+
+JOB_LEASE_SECONDS = int(os.environ.get("JOB_LEASE_SECONDS", "120"))
+JOB_HEARTBEAT_SECONDS = float(os.environ.get("JOB_HEARTBEAT_SECONDS", str(JOB_LEASE_SECONDS / 4)))
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_BASE_SECONDS = float(os.environ.get("JOB_RETRY_BASE_SECONDS", "30"))
+JOB_RETRY_MAX_SECONDS = float(os.environ.get("JOB_RETRY_MAX_SECONDS", "900"))
+JOB_REAPER_INTERVAL = float(os.environ.get("JOB_REAPER_INTERVAL", "30"))
+REAP_BATCH_SIZE = 100
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+class LeaseHeld(Exception):
+    """
+    The job is already running under another worker's live lease.
+    """
+
+
+class StaleDelivery(Exception):
+    """
+    The queue message is a repeat or has been superseded (its enqueue key no
+    longer matches the job, or the job already finished).
+    """
+
+
+def retry_delay(attempts: int) -> float:
+    delay = min(JOB_RETRY_BASE_SECONDS * (2 ** max(attempts - 1, 0)), JOB_RETRY_MAX_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def acquire(cursor, job_id: int, enqueue_key: str = None):
+    """
+    Lock the job row, take its lease and open an attempt record, in the
+    caller's transaction. Returns the started job (job_id, framework_choice,
+    submitted_at, attempts, attempt_id, previous_status), or None if the job
+    does not exist. Raises LeaseHeld if the job's lease is still live, and
+    StaleDelivery if enqueue_key is given but is not the job's current one.
+    """
+    cursor.execute(
+        """
+        SELECT status, enqueue_key, submitted_at, attempts, lease_owner,
+               lease_expires_at > now() AS leased
+        FROM scheduled_jobs
+        WHERE job_id = %s
+        FOR UPDATE
+        """,
+        (job_id,),
+    )
+    lease = cursor.fetchone()
+    if not lease:
+        return None
+    if enqueue_key is not None and (
+        lease["enqueue_key"] != enqueue_key or lease["status"] not in ("IN_QUEUE", "IN_PROGRESS")
+    ):
+        raise StaleDelivery(f"job {job_id} delivery {enqueue_key} is stale ({lease['status']})")
+    if lease["leased"]:
+        raise LeaseHeld(f"job {job_id} is leased by {lease['lease_owner']}")
+
+    cursor.execute(
+        """
+        INSERT INTO job_attempts (job_id, submitted_at, attempt, worker_id)
+        VALUES (%s, %s, %s, %s)
+        RETURNING attempt_id
+        """,
+        (job_id, lease["submitted_at"], lease["attempts"] + 1, WORKER_ID),
+    )
+    attempt_id = cursor.fetchone()["attempt_id"]
+    cursor.execute(
+        """
+        UPDATE scheduled_jobs
+        SET status = 'IN_PROGRESS',
+            lease_owner = %s,
+            lease_attempt_id = %s,
+            lease_expires_at = now() + make_interval(secs => %s),
+            attempts = attempts + 1,
+            next_attempt_at = NULL
+        WHERE job_id = %s
+        RETURNING job_id, framework_choice, submitted_at, attempts
+        """,
+        (WORKER_ID, attempt_id, JOB_LEASE_SECONDS, job_id),
+    )
+    job = cursor.fetchone()
+    job["attempt_id"] = attempt_id
+    job["previous_status"] = lease["status"]
+    return job
+
+
+def renew(job_id: int, attempt_id: int) -> bool:
+    """
+    Extend the lease. Returns False if it is no longer ours (reaped or
+    regenerated), in which case the caller should stop working on the job.
+    """
+    conn = get_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                """
+                UPDATE scheduled_jobs
+                SET lease_expires_at = now() + make_interval(secs => %s)
+                WHERE job_id = %s AND lease_attempt_id = %s AND status = 'IN_PROGRESS'
+                RETURNING job_id
+                """,
+                (JOB_LEASE_SECONDS, job_id, attempt_id),
+            )
+            held = cursor.fetchone() is not None
+            if held:
+                cursor.execute(
+                    "UPDATE job_attempts SET heartbeat_at = now() WHERE attempt_id = %s",
+                    (attempt_id,),
+                )
+        conn.commit()
+        return held
+    finally:
+        conn.close()
+
+
+async def heartbeat(job_id: int, attempt_id: int, work: asyncio.Future):
+    """
+    Renew the lease until cancelled; cancel `work` if the lease is lost.
+    A failed renewal (e.g. a database blip) is retried on the next beat.
+    """
+    while True:
+        await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+        try:
+            held = await asyncio.to_thread(renew, job_id, attempt_id)
+        except Exception:
+            logger.exception("Job %s: lease renewal failed", job_id)
+            continue
+        if not held:
+            logger.error("Job %s: lease lost; abandoning attempt %s", job_id, attempt_id)
+            work.cancel()
+            return
+
+
+def release(cursor, job_id: int, attempt_id: int, status: str) -> Optional[float]:
+    """
+    Write the final status and close the attempt, only if this attempt still
+    holds the lease. Returns the seconds since the job was submitted (both
+    ends read from the database clock), or None if the status was not written.
+    """
+    cursor.execute(
+        """
+        UPDATE scheduled_jobs
+        SET status = %s, lease_owner = NULL, lease_attempt_id = NULL, lease_expires_at = NULL
+        WHERE job_id = %s AND lease_attempt_id = %s
+        RETURNING extract(epoch FROM now() - submitted_at) AS elapsed
+        """,
+        (status, job_id, attempt_id),
+    )
+    row = cursor.fetchone()
+    released = row is not None
+    cursor.execute(
+        """
+        UPDATE job_attempts
+        SET finished_at = now(), outcome = %s
+        WHERE attempt_id = %s AND finished_at IS NULL
+        """,
+        (status if released else "EXPIRED", attempt_id),
+    )
+    return float(row["elapsed"]) if released else None
+
+
+def reap_expired() -> int:
+    """
+    Re-queue or fail IN_PROGRESS jobs whose lease has expired.
+    Returns the number of jobs reaped.
+    """
+    retries = 0
+    failed = 0
+    conn = get_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT job_id, attempts
+                FROM scheduled_jobs
+                WHERE status = 'IN_PROGRESS' AND lease_expires_at < now()
+                ORDER BY lease_expires_at
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+                """,
+                (REAP_BATCH_SIZE,),
+            )
+            expired = cursor.fetchall()
+
+            for job in expired:
+                cursor.execute(
+                    """
+                    UPDATE job_attempts
+                    SET finished_at = now(), outcome = 'EXPIRED'
+                    WHERE job_id = %s AND finished_at IS NULL
+                    """,
+                    (job["job_id"],),
+                )
+                if job["attempts"] >= JOB_MAX_ATTEMPTS:
+                    cursor.execute(
+                        """
+                        UPDATE scheduled_jobs
+                        SET status = 'FAILED', lease_owner = NULL, lease_attempt_id = NULL, lease_expires_at = NULL
+                        WHERE job_id = %s
+                        """,
+                        (job["job_id"],),
+                    )
+                    failed += 1
+                    continue
+
+                delay = retry_delay(job["attempts"])
+                cursor.execute(
+                    """
+                    UPDATE scheduled_jobs
+                    SET status = 'IN_QUEUE',
+                        lease_owner = NULL,
+                        lease_attempt_id = NULL,
+                        lease_expires_at = NULL,
+                        next_attempt_at = now() + make_interval(secs => %s)
+                    WHERE job_id = %s
+                    """,
+                    (delay, job["job_id"]),
+                )
+                outbox.enqueue_job(cursor, job["job_id"], delay=delay)
+                retries += 1
+
+        conn.commit()
+
+    except Exception:
+        conn.rollback()
+        raise
+
+    finally:
+        conn.close()
+
+    if expired:
+        for _ in range(retries):
+            metrics.record_job_transition("IN_PROGRESS", "IN_QUEUE")
+        for _ in range(failed):
+            metrics.record_job_transition("IN_PROGRESS", "FAILED")
+        metrics.JOB_LEASES_EXPIRED.inc(len(expired))
+        logger.warning("Reaped %d expired job leases (%d re-queued, %d failed)", len(expired), retries, failed)
+
+    return len(expired)
+
+
+def start_reaper() -> threading.Thread:
+    """
+    Run reap_expired() every JOB_REAPER_INTERVAL seconds in a daemon thread.
+    """
+    def loop():
+        while True:
+            time.sleep(JOB_REAPER_INTERVAL)
+            try:
+                reap_expired()
+            except Exception:
+                logger.exception("Lease reaper failed")
+
+    thread = threading.Thread(target=loop, name="lease-reaper", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,262 @@
+"""
+LLM backends used by the worker to generate test cases and automation scripts.
+
+LLM_BACKEND selects the implementation:
+- "openai"  langchain_openai.ChatOpenAI (OPENAI_API_KEY, LLM_MODEL, and
+            OPENAI_BASE_URL for OpenAI-compatible servers such as bench.fake_llm)
+- "google"  langchain_google_genai.ChatGoogleGenerativeAI (GOOGLE_API_KEY, LLM_MODEL)
+- "stub"    deterministic offline backend for tests and throughput runs
+
+Provider SDKs are imported only when their backend is created, so the API
+and the stub backend never pay for them.
+"""
+import abc
+import asyncio
+import hashlib
+import json
+import os
+import random
+
+TEST_CASE_PROMPT = """You are a senior QA engineer. Write functional test cases for the user story below.
+
+User story:
+{user_story}
+
+Acceptance criteria:
+{acceptance_criteria}
+
+Respond with JSON only, no markdown, in exactly this shape:
+{{"test_cases": [{{"ID": "TC-001", "title": "...", "preconditions": "...",
+"steps": ["..."], "expected_results": ["..."], "priority": "High|Medium|Low"}}]}}
+"""
+
+SCRIPT_PROMPT = """Write a {framework} automation script covering these functional test cases.
+
+User story:
+{user_story}
+
+Test cases (JSON):
+{test_cases}
+
+Respond with the source code only, no explanations or markdown fences.
+"""
+
+FRAMEWORK_LABELS = {
+    "java_selenium": "Java + Selenium",
+    "js_testcomplete": "JavaScript + TestComplete",
+}
+FRAMEWORK_FILE_NAMES = {
+    "java_selenium": "GeneratedTest.java",
+    "js_testcomplete": "generated_test.js",
+}
+
+
+class RateLimitError(Exception):
+    """
+    The provider rejected a call with HTTP 429 / quota exhausted.
+    """
+
+    def __init__(self, message: str = "rate limited", retry_after: float = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _is_rate_limit(error: Exception) -> bool:
+    # Provider SDK exception types differ; match on name/status to avoid importing them.
+    if type(error).__name__ in ("RateLimitError", "ResourceExhausted", "TooManyRequests"):
+        return True
+    return getattr(error, "status_code", None) == 429 or getattr(error, "code", None) == 429
+
+
+def _retry_after(error: Exception):
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def strip_code_fences(text: str) -> str:
+    """
+    Remove a surrounding ```json / ``` block that models often add.
+    """
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        if text.rstrip().endswith("```"):
+            text = text.rstrip()[:-3]
+    return text.strip()
+
+
+class LLMBackend(abc.ABC):
+    provider = "base"
+
+    def __init__(self, model: str):
+        self.model = model
+
+    @abc.abstractmethod
+    async def complete(self, prompt: str) -> str:
+        """
+        Return the full completion for a prompt.
+        """
+
+    async def stream(self, prompt: str):
+        """
+        Yield the completion in chunks; backends without streaming yield it whole.
+        """
+        yield await self.complete(prompt)
+
+    def stream_test_cases(self, user_story: str, acceptance_criteria: str):
+        return self.stream(TEST_CASE_PROMPT.format(
+            user_story=user_story, acceptance_criteria=acceptance_criteria or ""
+        ))
+
+    async def generate_test_cases(self, user_story: str, acceptance_criteria: str) -> str:
+        prompt = TEST_CASE_PROMPT.format(
+            user_story=user_story, acceptance_criteria=acceptance_criteria or ""
+        )
+        return strip_code_fences(await self.complete(prompt))
+
+    async def generate_automation_script(self, user_story: str, test_cases: list, framework: str) -> str:
+        prompt = SCRIPT_PROMPT.format(
+            framework=FRAMEWORK_LABELS.get(framework, framework),
+            user_story=user_story,
+            test_cases=json.dumps(test_cases),
+        )
+        return strip_code_fences(await self.complete(prompt))
+
+
+class LangChainBackend(LLMBackend):
+    def __init__(self, model: str, chat_model):
+        super().__init__(model)
+        self.chat_model = chat_model
+
+    async def complete(self, prompt: str) -> str:
+        try:
+            message = await self.chat_model.ainvoke(prompt)
+        except Exception as e:
+            if _is_rate_limit(e):
+                raise RateLimitError(str(e), retry_after=_retry_after(e)) from e
+            raise
+        return message.content
+
+    async def stream(self, prompt: str):
+        try:
+            async for chunk in self.chat_model.astream(prompt):
+                if chunk.content:
+                    yield chunk.content
+        except Exception as e:
+            if _is_rate_limit(e):
+                raise RateLimitError(str(e), retry_after=_retry_after(e)) from e
+            raise
+
+
+class OpenAIBackend(LangChainBackend):
+    provider = "openai"
+
+    def __init__(self, model: str):
+        from langchain_openai import ChatOpenAI
+
+        # SDK-level retries are disabled; rate_limiter owns backoff.
+        super().__init__(model, ChatOpenAI(
+            model=model,
+            temperature=0,
+            max_retries=0,
+            base_url=os.environ.get("OPENAI_BASE_URL"),
+        ))
+
+
+class GoogleBackend(LangChainBackend):
+    provider = "google"
+
+    def __init__(self, model: str):
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
+        super().__init__(model, ChatGoogleGenerativeAI(model=model, temperature=0, max_retries=0))
+
+
+class StubBackend(LLMBackend):
+    """
+    Offline backend: sleeps for a configurable latency and returns
+    deterministic, schema-valid output derived from the prompt.
+
+    STUB_LLM_LATENCY_MS   mean latency per call (default 200)
+    STUB_LLM_JITTER_MS    uniform +/- jitter (default 50)
+    STUB_LLM_TEST_CASES   test cases per story (default 5)
+    STUB_LLM_429_RATE     fraction of calls rejected with RateLimitError (default 0)
+    STUB_LLM_CHUNK_CHARS  characters per streamed chunk (default 64)
+    """
+    provider = "stub"
+
+    def __init__(self, model: str = "stub"):
+        super().__init__(model)
+        self.latency_ms = float(os.environ.get("STUB_LLM_LATENCY_MS", "200"))
+        self.jitter_ms = float(os.environ.get("STUB_LLM_JITTER_MS", "50"))
+        self.test_cases = int(os.environ.get("STUB_LLM_TEST_CASES", "5"))
+        self.rate_limit_rate = float(os.environ.get("STUB_LLM_429_RATE", "0"))
+        self.chunk_chars = int(os.environ.get("STUB_LLM_CHUNK_CHARS", "64"))
+
+    def _latency(self, seed: str) -> float:
+        rng = random.Random(seed)
+        return max(self.latency_ms + rng.uniform(-self.jitter_ms, self.jitter_ms), 0) / 1000
+
+    def _maybe_throttle(self):
+        if self.rate_limit_rate and random.random() < self.rate_limit_rate:
+            raise RateLimitError("stub 429", retry_after=1)
+
+    async def complete(self, prompt: str) -> str:
+        await asyncio.sleep(self._latency(prompt))
+        self._maybe_throttle()
+        return self._render(prompt)
+
+    async def stream(self, prompt: str):
+        # Spread the call's latency over its chunks, like a real token stream.
+        self._maybe_throttle()
+        text = self._render(prompt)
+        chunks = [text[i:i + self.chunk_chars] for i in range(0, len(text), self.chunk_chars)]
+        delay = self._latency(prompt) / max(len(chunks), 1)
+        for chunk in chunks:
+            await asyncio.sleep(delay)
+            yield chunk
+
+    def _render(self, prompt: str) -> str:
+        return render_stub_completion(prompt, self.test_cases)
+
+
+def render_stub_completion(prompt: str, test_cases: int = 5) -> str:
+    """
+    Deterministic, schema-valid output for one of this module's prompts:
+    a script for SCRIPT_PROMPT, otherwise a test case list.
+    """
+    digest = hashlib.sha1(prompt.encode()).hexdigest()[:8]
+    if prompt.startswith("Write a "):
+        return f"// generated script {digest}\n"
+    priorities = ["High", "Medium", "Low"]
+    return json.dumps({
+        "test_cases": [
+            {
+                "ID": f"TC-{n:03d}",
+                "title": f"Scenario {n} for story {digest}",
+                "preconditions": "User is logged in",
+                "steps": [f"Step {s} of scenario {n}" for s in range(1, 4)],
+                "expected_results": [f"Scenario {n} succeeds"],
+                "priority": priorities[n % 3],
+            }
+            for n in range(1, test_cases + 1)
+        ]
+    })
+
+
+BACKENDS = {
+    "openai": (OpenAIBackend, "gpt-4o-mini"),
+    "google": (GoogleBackend, "gemini-2.5-flash"),
+    "stub": (StubBackend, "stub"),
+}
+
+
+def get_backend(name: str = None, model: str = None) -> LLMBackend:
+    name = (name or os.environ.get("LLM_BACKEND", "openai")).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown LLM_BACKEND {name!r}; expected one of {sorted(BACKENDS)}")
+    backend_class, default_model = BACKENDS[name]
+    return backend_class(model or os.environ.get("LLM_MODEL", default_model))
@@ -0,0 +1,213 @@
+"""
+Prometheus metrics for the API, database and queue.
+
+The API exposes these on GET /metrics. Worker processes call
+start_worker_metrics_server() to expose their own registry on
+WORKER_METRICS_PORT.
+"""
+import os
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+from prometheus_client.core import GaugeMetricFamily, REGISTRY
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+GENERATION_BUCKETS = (5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200)
+
+REQUEST_LATENCY = Histogram(
+    "sagescript_http_request_duration_seconds",
+    "HTTP request latency by route",
+    ["method", "route"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUEST_COUNT = Counter(
+    "sagescript_http_requests_total",
+    "HTTP requests by route and status code",
+    ["method", "route", "status"],
+)
+DB_QUERY_DURATION = Histogram(
+    "sagescript_db_query_duration_seconds",
+    "Duration of individual SQL statements by route",
+    ["route"],
+    buckets=LATENCY_BUCKETS,
+)
+DB_QUERIES_PER_REQUEST = Histogram(
+    "sagescript_db_queries_per_request",
+    "Number of SQL statements executed per HTTP request",
+    ["route"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89),
+)
+DB_CONNECT_DURATION = Histogram(
+    "sagescript_db_connection_acquire_seconds",
+    "Time spent acquiring a database connection",
+    buckets=LATENCY_BUCKETS,
+)
+DB_READ_ROUTES = Counter(
+    "sagescript_db_read_connections_total",
+    "Read-only connections by where they were routed (replica, primary, failover)",
+    ["target"],
+)
+JOB_TRANSITIONS = Counter(
+    "sagescript_job_state_transitions_total",
+    "scheduled_jobs status transitions",
+    ["from_status", "to_status"],
+)
+JOB_LEASES_EXPIRED = Counter(
+    "sagescript_job_leases_expired_total",
+    "Jobs reaped because their worker stopped renewing the lease",
+)
+JOB_GENERATION_DURATION = Histogram(
+    "sagescript_job_generation_seconds",
+    "End-to-end time from submitted_at to a job finishing",
+    ["status"],
+    buckets=GENERATION_BUCKETS,
+)
+LLM_RATE_LIMIT_WAIT = Histogram(
+    "sagescript_llm_rate_limit_wait_seconds",
+    "Time spent waiting for the shared LLM token buckets",
+    ["provider", "model"],
+    buckets=(0, 0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+LLM_THROTTLED_TOTAL = Counter(
+    "sagescript_llm_throttled_total",
+    "LLM calls rejected by the provider with 429",
+    ["provider", "model"],
+)
+LLM_CONCURRENCY_LIMIT = Gauge(
+    "sagescript_llm_concurrency_limit",
+    "Current adaptive (AIMD) limit on in-flight LLM calls",
+    ["backend"],
+)
+
+
+class RequestStats:
+    """
+    Mutable per-request counters shared between the middleware and db cursors.
+    """
+
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.queries = 0
+        self.db_seconds = 0.0
+
+    @property
+    def route(self) -> str:
+        return _route_label(self.scope)
+
+
+request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def observe_query(seconds: float):
+    """
+    Record one SQL statement against the current route.
+    """
+    stats = request_stats.get()
+    DB_QUERY_DURATION.labels(stats.route if stats else "background").observe(seconds)
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += seconds
+
+
+def record_job_transition(from_status: Optional[str], to_status: str):
+    JOB_TRANSITIONS.labels(from_status or "NEW", to_status).inc()
+
+
+def observe_job_finished(seconds: float, status: str):
+    """
+    Record end-to-end generation time for a job that reached COMPLETED/FAILED
+    (measured by the database, see leases.release).
+    """
+    JOB_GENERATION_DURATION.labels(status).observe(seconds)
+
+
+def _route_label(scope: dict) -> str:
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+async def metrics_middleware(request, call_next):
+    """
+    Times each request and counts its SQL statements under the route template
+    (e.g. /api/jobs/{job_id}) so label cardinality stays bounded.
+    """
+    stats = RequestStats(request.scope)
+    stats_token = request_stats.set(stats)
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        elapsed = time.perf_counter() - started
+        route = stats.route
+        REQUEST_LATENCY.labels(request.method, route).observe(elapsed)
+        REQUEST_COUNT.labels(request.method, route, str(status)).inc()
+        DB_QUERIES_PER_REQUEST.labels(route).observe(stats.queries)
+        request_stats.reset(stats_token)
+
+
+class QueueCollector:
+    """
+    Reads test_generation_queue depth and oldest job age, and the outbox
+    backlog, at scrape time.
+    """
+
+    def collect(self):
+        yield from self._queue()
+        yield from self._outbox()
+
+    def _queue(self):
+        depth = GaugeMetricFamily(
+            "sagescript_queue_depth", "Jobs waiting in the queue", labels=["queue"]
+        )
+        oldest = GaugeMetricFamily(
+            "sagescript_queue_oldest_job_age_seconds",
+            "Age of the oldest job waiting in the queue",
+            labels=["queue"],
+        )
+        try:
+            from job_queue import get_job_queue
+
+            queue = get_job_queue()
+            depth.add_metric([queue.name], queue.count())
+            oldest.add_metric([queue.name], queue.oldest_age())
+        except Exception:
+            # Queue backend unavailable: report nothing rather than failing the scrape.
+            return
+        yield depth
+        yield oldest
+
+    def _outbox(self):
+        # A growing age means no relay is publishing (see outbox.py).
+        try:
+            import outbox
+
+            stats = outbox.pending_stats()
+        except Exception:
+            return
+        yield GaugeMetricFamily(
+            "sagescript_outbox_pending", "Outbox messages not yet published to the queue",
+            value=stats["pending"],
+        )
+        yield GaugeMetricFamily(
+            "sagescript_outbox_oldest_pending_age_seconds",
+            "Age of the oldest unpublished outbox message",
+            value=stats["oldest_age"],
+        )
+
+
+def register_queue_collector():
+    REGISTRY.register(QueueCollector())
+
+
+def start_worker_metrics_server():
+    """
+    Expose this process's metrics on WORKER_METRICS_PORT, if set.
+    """
+    port = os.environ.get("WORKER_METRICS_PORT")
+    if port:
+        start_http_server(int(port))
@@ -0,0 +1,76 @@
+-- Base schema used by app.py and tools/.
+-- Every statement is idempotent so this can be applied to an existing database.
+
+CREATE TABLE IF NOT EXISTS users (
+    user_id       SERIAL PRIMARY KEY,
+    display_name  TEXT NOT NULL UNIQUE,
+    email         TEXT NOT NULL UNIQUE,
+    status        TEXT NOT NULL DEFAULT 'active'
+);
+
+CREATE TABLE IF NOT EXISTS user_credentials (
+    user_id        INTEGER PRIMARY KEY REFERENCES users (user_id) ON DELETE CASCADE,
+    password_hash  TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS tenants (
+    tenant_id    SERIAL PRIMARY KEY,
+    tenant_name  TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS tenant_user_access (
+    tenant_id     INTEGER NOT NULL REFERENCES tenants (tenant_id) ON DELETE CASCADE,
+    user_id       INTEGER NOT NULL REFERENCES users (user_id) ON DELETE CASCADE,
+    access_role   TEXT NOT NULL DEFAULT 'tester',
+    access_level  TEXT NOT NULL DEFAULT 'read',
+    status        TEXT NOT NULL DEFAULT 'active',
+    PRIMARY KEY (tenant_id, user_id)
+);
+
+CREATE TABLE IF NOT EXISTS user_projects (
+    project_id        SERIAL PRIMARY KEY,
+    user_id           INTEGER NOT NULL REFERENCES users (user_id) ON DELETE CASCADE,
+    project_name      TEXT NOT NULL,
+    sub_project_name  TEXT,
+    description       TEXT
+);
+
+CREATE TABLE IF NOT EXISTS scheduled_jobs (
+    job_id            SERIAL PRIMARY KEY,
+    user_id           INTEGER NOT NULL,
+    project_name      TEXT NOT NULL,
+    sub_project_name  TEXT,
+    description       TEXT,
+    status            TEXT NOT NULL DEFAULT 'IN_QUEUE',
+    user_story_count  INTEGER NOT NULL DEFAULT 0,
+    framework_choice  TEXT,
+    submitted_at      TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS user_stories (
+    user_story_id        TEXT PRIMARY KEY,
+    job_id               INTEGER NOT NULL REFERENCES scheduled_jobs (job_id) ON DELETE CASCADE,
+    user_story_text      TEXT NOT NULL,
+    acceptance_criteria  TEXT
+);
+
+CREATE TABLE IF NOT EXISTS function_test_cases (
+    test_case_id   SERIAL PRIMARY KEY,
+    job_id         INTEGER NOT NULL REFERENCES scheduled_jobs (job_id) ON DELETE CASCADE,
+    user_story_id  TEXT REFERENCES user_stories (user_story_id) ON DELETE CASCADE,
+    result         JSONB NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS automation_scripts (
+    automation_id  SERIAL PRIMARY KEY,
+    user_story_id  TEXT NOT NULL REFERENCES user_stories (user_story_id) ON DELETE CASCADE,
+    script         JSONB NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_scheduled_jobs_user_submitted
+    ON scheduled_jobs (user_id, submitted_at DESC);
+CREATE INDEX IF NOT EXISTS idx_user_stories_job ON user_stories (job_id);
+CREATE INDEX IF NOT EXISTS idx_function_test_cases_job ON function_test_cases (job_id);
+CREATE INDEX IF NOT EXISTS idx_function_test_cases_story ON function_test_cases (user_story_id);
+CREATE INDEX IF NOT EXISTS idx_automation_scripts_story ON automation_scripts (user_story_id);
+CREATE INDEX IF NOT EXISTS idx_user_projects_user ON user_projects (user_id);
@@ -0,0 +1,95 @@
+-- Full-text search over user stories and generated test cases.
+--
+-- user_stories gets a generated tsvector column. Test cases live inside
+-- function_test_cases.result arrays, so each one is copied into
+-- test_case_search (one row per test case) by a trigger as results are
+-- written; its tsvector is generated from the title and every string field.
+
+ALTER TABLE user_stories
+    ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(user_story_text, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(acceptance_criteria, '')), 'B')
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_user_stories_search
+    ON user_stories USING GIN (search_vector);
+
+CREATE TABLE IF NOT EXISTS test_case_search (
+    search_id         BIGSERIAL PRIMARY KEY,
+    test_case_row_id  INTEGER NOT NULL REFERENCES function_test_cases (test_case_id) ON DELETE CASCADE,
+    job_id            INTEGER NOT NULL,
+    user_story_id     TEXT,
+    case_key          TEXT,
+    title             TEXT,
+    body              JSONB NOT NULL,
+    search_vector     tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(jsonb_to_tsvector('english', body, '["string"]'), 'B')
+    ) STORED
+);
+
+CREATE INDEX IF NOT EXISTS idx_test_case_search_vector
+    ON test_case_search USING GIN (search_vector);
+CREATE INDEX IF NOT EXISTS idx_test_case_search_row ON test_case_search (test_case_row_id);
+CREATE INDEX IF NOT EXISTS idx_test_case_search_job ON test_case_search (job_id);
+
+-- Every JSON object nested anywhere in a result is one test case
+-- (results are arrays, sometimes arrays of arrays).
+CREATE OR REPLACE FUNCTION index_test_case_rows() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO test_case_search (test_case_row_id, job_id, user_story_id, case_key, title, body)
+    SELECT
+        n.test_case_id,
+        n.job_id,
+        n.user_story_id,
+        coalesce(tc ->> 'ID', tc ->> 'test_case_id'),
+        coalesce(tc ->> 'title', tc ->> 'Title'),
+        tc
+    FROM new_rows n
+    CROSS JOIN LATERAL jsonb_path_query(n.result, 'strict $.** ? (@.type() == "object")') AS tc;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION reindex_test_case_row() RETURNS trigger AS $$
+BEGIN
+    DELETE FROM test_case_search WHERE test_case_row_id = NEW.test_case_id;
+    INSERT INTO test_case_search (test_case_row_id, job_id, user_story_id, case_key, title, body)
+    SELECT
+        NEW.test_case_id,
+        NEW.job_id,
+        NEW.user_story_id,
+        coalesce(tc ->> 'ID', tc ->> 'test_case_id'),
+        coalesce(tc ->> 'title', tc ->> 'Title'),
+        tc
+    FROM jsonb_path_query(NEW.result, 'strict $.** ? (@.type() == "object")') AS tc;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_index_test_cases ON function_test_cases;
+CREATE TRIGGER trg_index_test_cases
+    AFTER INSERT ON function_test_cases
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION index_test_case_rows();
+
+DROP TRIGGER IF EXISTS trg_reindex_test_cases ON function_test_cases;
+CREATE TRIGGER trg_reindex_test_cases
+    AFTER UPDATE OF result ON function_test_cases
+    FOR EACH ROW EXECUTE FUNCTION reindex_test_case_row();
+
+-- Backfill rows written before this migration.
+INSERT INTO test_case_search (test_case_row_id, job_id, user_story_id, case_key, title, body)
+SELECT
+    ftc.test_case_id,
+    ftc.job_id,
+    ftc.user_story_id,
+    coalesce(tc ->> 'ID', tc ->> 'test_case_id'),
+    coalesce(tc ->> 'title', tc ->> 'Title'),
+    tc
+FROM function_test_cases ftc
+CROSS JOIN LATERAL jsonb_path_query(ftc.result, 'strict $.** ? (@.type() == "object")') AS tc
+WHERE NOT EXISTS (
+    SELECT 1 FROM test_case_search tcs WHERE tcs.test_case_row_id = ftc.test_case_id
+);
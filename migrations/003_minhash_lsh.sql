@@ -0,0 +1,25 @@
+-- MinHash signatures and LSH band buckets for near-duplicate test cases.
+-- Rows are keyed by project (user_id + project_name, as on scheduled_jobs)
+-- and cascade away with their test_case_search row.
+
+CREATE TABLE IF NOT EXISTS test_case_minhash (
+    search_id     BIGINT PRIMARY KEY REFERENCES test_case_search (search_id) ON DELETE CASCADE,
+    user_id       INTEGER NOT NULL,
+    project_name  TEXT NOT NULL,
+    signature     BYTEA NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_test_case_minhash_project
+    ON test_case_minhash (user_id, project_name);
+
+CREATE TABLE IF NOT EXISTS test_case_lsh_bands (
+    user_id       INTEGER NOT NULL,
+    project_name  TEXT NOT NULL,
+    band          SMALLINT NOT NULL,
+    bucket        BIGINT NOT NULL,
+    search_id     BIGINT NOT NULL REFERENCES test_case_minhash (search_id) ON DELETE CASCADE,
+    PRIMARY KEY (user_id, project_name, band, bucket, search_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_test_case_lsh_bands_search
+    ON test_case_lsh_bands (search_id);
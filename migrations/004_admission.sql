@@ -0,0 +1,5 @@
+-- Admission control counts stories in queued/running jobs on every submit.
+
+CREATE INDEX IF NOT EXISTS idx_scheduled_jobs_pending
+    ON scheduled_jobs (user_id)
+    WHERE status IN ('IN_QUEUE', 'IN_PROGRESS');
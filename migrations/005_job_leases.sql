@@ -0,0 +1,27 @@
+-- Lease-based job execution: the worker running a job holds a lease that it
+-- renews with heartbeats; a reaper re-queues (or fails) jobs whose lease
+-- expired. Every execution attempt is recorded in job_attempts.
+
+ALTER TABLE scheduled_jobs
+    ADD COLUMN IF NOT EXISTS lease_owner       TEXT,
+    ADD COLUMN IF NOT EXISTS lease_expires_at  TIMESTAMPTZ,
+    ADD COLUMN IF NOT EXISTS attempts          INTEGER NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS next_attempt_at   TIMESTAMPTZ;
+
+CREATE INDEX IF NOT EXISTS idx_scheduled_jobs_lease
+    ON scheduled_jobs (lease_expires_at)
+    WHERE status = 'IN_PROGRESS';
+
+CREATE TABLE IF NOT EXISTS job_attempts (
+    attempt_id    BIGSERIAL PRIMARY KEY,
+    job_id        INTEGER NOT NULL REFERENCES scheduled_jobs (job_id) ON DELETE CASCADE,
+    attempt       INTEGER NOT NULL,
+    worker_id     TEXT NOT NULL,
+    started_at    TIMESTAMPTZ NOT NULL DEFAULT now(),
+    heartbeat_at  TIMESTAMPTZ NOT NULL DEFAULT now(),
+    finished_at   TIMESTAMPTZ,
+    -- RUNNING, COMPLETED, FAILED or EXPIRED (lease ran out; reaped)
+    outcome       TEXT NOT NULL DEFAULT 'RUNNING'
+);
+
+CREATE INDEX IF NOT EXISTS idx_job_attempts_job ON job_attempts (job_id, attempt);
@@ -0,0 +1,36 @@
+-- Postgres queue backend (QUEUE_BACKEND=postgres), see job_queue.py.
+-- Workers claim ready items with FOR UPDATE SKIP LOCKED, highest priority
+-- first, and are woken by NOTIFY job_queue on enqueue. Successful items are
+-- deleted; failed ones keep failed_at/error for inspection.
+
+CREATE TABLE IF NOT EXISTS job_queue (
+    item_id      BIGSERIAL PRIMARY KEY,
+    queue_name   TEXT NOT NULL,
+    func         TEXT NOT NULL,
+    args         JSONB NOT NULL DEFAULT '[]',
+    priority     INTEGER NOT NULL DEFAULT 0,
+    run_at       TIMESTAMPTZ NOT NULL DEFAULT now(),
+    enqueued_at  TIMESTAMPTZ NOT NULL DEFAULT now(),
+    claimed_by   TEXT,
+    claimed_at   TIMESTAMPTZ,
+    failed_at    TIMESTAMPTZ,
+    error        TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_job_queue_ready
+    ON job_queue (queue_name, priority DESC, run_at, item_id)
+    WHERE claimed_at IS NULL;
+
+CREATE INDEX IF NOT EXISTS idx_job_queue_claimed
+    ON job_queue (claimed_at)
+    WHERE claimed_at IS NOT NULL AND failed_at IS NULL;
+
+-- Live Postgres-backend workers and their throughput (stories/second EWMA),
+-- used by admission control in place of RQ's worker registry.
+CREATE TABLE IF NOT EXISTS queue_workers (
+    worker_id           TEXT PRIMARY KEY,
+    queue_name          TEXT NOT NULL,
+    started_at          TIMESTAMPTZ NOT NULL DEFAULT now(),
+    last_seen           TIMESTAMPTZ NOT NULL DEFAULT now(),
+    stories_per_second  DOUBLE PRECISION
+);
@@ -0,0 +1,31 @@
+-- Transactional outbox for enqueue intents (see outbox.py).
+--
+-- Code that changes a job's state writes the matching enqueue into
+-- job_outbox in the same transaction; a relay publishes pending rows to the
+-- job queue in batches and marks them published. Delivery is at-least-once:
+-- every message carries an idempotency key, which is also stored on the job
+-- (scheduled_jobs.enqueue_key) so workers drop stale or repeated deliveries.
+
+CREATE TABLE IF NOT EXISTS job_outbox (
+    outbox_id        BIGSERIAL PRIMARY KEY,
+    idempotency_key  TEXT NOT NULL UNIQUE,
+    func             TEXT NOT NULL,
+    args             JSONB NOT NULL DEFAULT '[]',
+    priority         INTEGER NOT NULL DEFAULT 0,
+    delay_seconds    DOUBLE PRECISION NOT NULL DEFAULT 0,
+    created_at       TIMESTAMPTZ NOT NULL DEFAULT now(),
+    published_at     TIMESTAMPTZ,
+    attempts         INTEGER NOT NULL DEFAULT 0,
+    last_error       TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_job_outbox_pending
+    ON job_outbox (outbox_id)
+    WHERE published_at IS NULL;
+
+ALTER TABLE scheduled_jobs ADD COLUMN IF NOT EXISTS enqueue_key TEXT;
+
+-- Lets the Postgres queue backend drop duplicate publishes.
+ALTER TABLE job_queue ADD COLUMN IF NOT EXISTS idempotency_key TEXT;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_job_queue_idempotency
+    ON job_queue (idempotency_key);
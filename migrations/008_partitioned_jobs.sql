@@ -0,0 +1,230 @@
+-- Monthly range partitioning of job data and a compressed archive for old
+-- results (see archive.py). Requires PostgreSQL 15+ (cross-partition updates
+-- of a referenced row, e.g. regenerate resetting submitted_at, must fire
+-- ON UPDATE rather than ON DELETE actions).
+--
+-- scheduled_jobs, user_stories, function_test_cases and automation_scripts
+-- are partitioned by month on the job's submitted_at. The child tables carry
+-- a copy of it so lookups can prune to one partition, and every key and
+-- foreign key includes it. Unpartitioned tables are converted in place:
+-- renamed, copied into the partitioned replacements and dropped.
+
+CREATE OR REPLACE FUNCTION create_monthly_partitions(parent regclass, from_month date, to_month date)
+RETURNS integer AS $$
+DECLARE
+    m        date := date_trunc('month', from_month);
+    name     text;
+    created  integer := 0;
+BEGIN
+    WHILE m <= to_month LOOP
+        name := format('%s_p%s', parent::text, to_char(m, 'YYYYMM'));
+        IF to_regclass(name) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF %s FOR VALUES FROM (%L) TO (%L)',
+                name, parent, m, (m + interval '1 month')::date
+            );
+            created := created + 1;
+        END IF;
+        m := (m + interval '1 month')::date;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+ALTER TABLE automation_scripts  RENAME TO automation_scripts_unpartitioned;
+ALTER TABLE function_test_cases RENAME TO function_test_cases_unpartitioned;
+ALTER TABLE user_stories        RENAME TO user_stories_unpartitioned;
+ALTER TABLE scheduled_jobs      RENAME TO scheduled_jobs_unpartitioned;
+
+CREATE TABLE scheduled_jobs (
+    LIKE scheduled_jobs_unpartitioned INCLUDING DEFAULTS
+) PARTITION BY RANGE (submitted_at);
+
+CREATE TABLE user_stories (
+    LIKE user_stories_unpartitioned INCLUDING DEFAULTS INCLUDING GENERATED,
+    submitted_at  TIMESTAMP NOT NULL
+) PARTITION BY RANGE (submitted_at);
+
+CREATE TABLE function_test_cases (
+    LIKE function_test_cases_unpartitioned INCLUDING DEFAULTS,
+    submitted_at  TIMESTAMP NOT NULL
+) PARTITION BY RANGE (submitted_at);
+
+CREATE TABLE automation_scripts (
+    LIKE automation_scripts_unpartitioned INCLUDING DEFAULTS,
+    submitted_at  TIMESTAMP NOT NULL
+) PARTITION BY RANGE (submitted_at);
+
+-- One partition per month from the oldest job to three months ahead; the
+-- default partitions only catch rows outside that range.
+SELECT create_monthly_partitions(
+    t,
+    coalesce((SELECT min(submitted_at) FROM scheduled_jobs_unpartitioned), now())::date,
+    (now() + interval '3 months')::date
+)
+FROM unnest(
+    ARRAY['scheduled_jobs', 'user_stories', 'function_test_cases', 'automation_scripts']::regclass[]
+) AS t;
+
+CREATE TABLE scheduled_jobs_default PARTITION OF scheduled_jobs DEFAULT;
+CREATE TABLE user_stories_default PARTITION OF user_stories DEFAULT;
+CREATE TABLE function_test_cases_default PARTITION OF function_test_cases DEFAULT;
+CREATE TABLE automation_scripts_default PARTITION OF automation_scripts DEFAULT;
+
+INSERT INTO scheduled_jobs SELECT * FROM scheduled_jobs_unpartitioned;
+
+INSERT INTO user_stories (user_story_id, job_id, user_story_text, acceptance_criteria, submitted_at)
+SELECT us.user_story_id, us.job_id, us.user_story_text, us.acceptance_criteria, sj.submitted_at
+FROM user_stories_unpartitioned us
+JOIN scheduled_jobs_unpartitioned sj ON sj.job_id = us.job_id;
+
+INSERT INTO function_test_cases (test_case_id, job_id, user_story_id, result, submitted_at)
+SELECT ftc.test_case_id, ftc.job_id, ftc.user_story_id, ftc.result, sj.submitted_at
+FROM function_test_cases_unpartitioned ftc
+JOIN scheduled_jobs_unpartitioned sj ON sj.job_id = ftc.job_id;
+
+INSERT INTO automation_scripts (automation_id, user_story_id, script, submitted_at)
+SELECT ascr.automation_id, ascr.user_story_id, ascr.script, sj.submitted_at
+FROM automation_scripts_unpartitioned ascr
+JOIN user_stories_unpartitioned us ON us.user_story_id = ascr.user_story_id
+JOIN scheduled_jobs_unpartitioned sj ON sj.job_id = us.job_id;
+
+-- Keep the id sequences when the old tables go.
+ALTER SEQUENCE scheduled_jobs_job_id_seq OWNED BY scheduled_jobs.job_id;
+ALTER SEQUENCE function_test_cases_test_case_id_seq OWNED BY function_test_cases.test_case_id;
+ALTER SEQUENCE automation_scripts_automation_id_seq OWNED BY automation_scripts.automation_id;
+
+-- Tables that referenced the old ones get the partition key too.
+ALTER TABLE test_case_search ADD COLUMN IF NOT EXISTS submitted_at TIMESTAMP;
+UPDATE test_case_search tcs
+SET submitted_at = ftc.submitted_at
+FROM function_test_cases ftc
+WHERE ftc.test_case_id = tcs.test_case_row_id;
+ALTER TABLE test_case_search ALTER COLUMN submitted_at SET NOT NULL;
+
+ALTER TABLE job_attempts ADD COLUMN IF NOT EXISTS submitted_at TIMESTAMP;
+UPDATE job_attempts ja
+SET submitted_at = sj.submitted_at
+FROM scheduled_jobs sj
+WHERE sj.job_id = ja.job_id;
+ALTER TABLE job_attempts ALTER COLUMN submitted_at SET NOT NULL;
+
+-- Also drops the old foreign keys and the test_case_search triggers.
+DROP TABLE
+    automation_scripts_unpartitioned,
+    function_test_cases_unpartitioned,
+    user_stories_unpartitioned,
+    scheduled_jobs_unpartitioned
+CASCADE;
+
+ALTER TABLE scheduled_jobs ADD COLUMN archived_at TIMESTAMPTZ;
+
+-- ON UPDATE CASCADE moves a regenerated job's rows to its new month.
+ALTER TABLE scheduled_jobs ADD PRIMARY KEY (job_id, submitted_at);
+
+ALTER TABLE user_stories
+    ADD PRIMARY KEY (user_story_id, submitted_at),
+    ADD FOREIGN KEY (job_id, submitted_at) REFERENCES scheduled_jobs (job_id, submitted_at)
+        ON DELETE CASCADE ON UPDATE CASCADE;
+
+ALTER TABLE function_test_cases
+    ADD PRIMARY KEY (test_case_id, submitted_at),
+    ADD FOREIGN KEY (job_id, submitted_at) REFERENCES scheduled_jobs (job_id, submitted_at)
+        ON DELETE CASCADE ON UPDATE CASCADE,
+    ADD FOREIGN KEY (user_story_id, submitted_at) REFERENCES user_stories (user_story_id, submitted_at)
+        ON DELETE CASCADE ON UPDATE CASCADE;
+
+ALTER TABLE automation_scripts
+    ADD PRIMARY KEY (automation_id, submitted_at),
+    ADD FOREIGN KEY (user_story_id, submitted_at) REFERENCES user_stories (user_story_id, submitted_at)
+        ON DELETE CASCADE ON UPDATE CASCADE;
+
+ALTER TABLE test_case_search
+    ADD FOREIGN KEY (test_case_row_id, submitted_at)
+        REFERENCES function_test_cases (test_case_id, submitted_at)
+        ON DELETE CASCADE ON UPDATE CASCADE;
+
+ALTER TABLE job_attempts
+    ADD FOREIGN KEY (job_id, submitted_at) REFERENCES scheduled_jobs (job_id, submitted_at)
+        ON DELETE CASCADE ON UPDATE CASCADE;
+
+CREATE INDEX idx_scheduled_jobs_user_submitted ON scheduled_jobs (user_id, submitted_at DESC);
+CREATE INDEX idx_scheduled_jobs_submitted ON scheduled_jobs (submitted_at DESC);
+CREATE INDEX idx_scheduled_jobs_pending
+    ON scheduled_jobs (user_id)
+    WHERE status IN ('IN_QUEUE', 'IN_PROGRESS');
+CREATE INDEX idx_scheduled_jobs_lease
+    ON scheduled_jobs (lease_expires_at)
+    WHERE status = 'IN_PROGRESS';
+CREATE INDEX idx_scheduled_jobs_unarchived
+    ON scheduled_jobs (submitted_at)
+    WHERE archived_at IS NULL;
+CREATE INDEX idx_user_stories_job ON user_stories (job_id);
+CREATE INDEX idx_user_stories_search ON user_stories USING GIN (search_vector);
+CREATE INDEX idx_function_test_cases_job ON function_test_cases (job_id);
+CREATE INDEX idx_function_test_cases_story ON function_test_cases (user_story_id);
+CREATE INDEX idx_automation_scripts_story ON automation_scripts (user_story_id);
+
+-- Search rows now carry the partition key of their test case row.
+CREATE OR REPLACE FUNCTION index_test_case_rows() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO test_case_search (test_case_row_id, submitted_at, job_id, user_story_id, case_key, title, body)
+    SELECT
+        n.test_case_id,
+        n.submitted_at,
+        n.job_id,
+        n.user_story_id,
+        coalesce(tc ->> 'ID', tc ->> 'test_case_id'),
+        coalesce(tc ->> 'title', tc ->> 'Title'),
+        tc
+    FROM new_rows n
+    CROSS JOIN LATERAL jsonb_path_query(n.result, 'strict $.** ? (@.type() == "object")') AS tc;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION reindex_test_case_row() RETURNS trigger AS $$
+BEGIN
+    DELETE FROM test_case_search WHERE test_case_row_id = NEW.test_case_id;
+    INSERT INTO test_case_search (test_case_row_id, submitted_at, job_id, user_story_id, case_key, title, body)
+    SELECT
+        NEW.test_case_id,
+        NEW.submitted_at,
+        NEW.job_id,
+        NEW.user_story_id,
+        coalesce(tc ->> 'ID', tc ->> 'test_case_id'),
+        coalesce(tc ->> 'title', tc ->> 'Title'),
+        tc
+    FROM jsonb_path_query(NEW.result, 'strict $.** ? (@.type() == "object")') AS tc;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_index_test_cases
+    AFTER INSERT ON function_test_cases
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION index_test_case_rows();
+
+CREATE TRIGGER trg_reindex_test_cases
+    AFTER UPDATE OF result ON function_test_cases
+    FOR EACH ROW EXECUTE FUNCTION reindex_test_case_row();
+
+-- Archived jobs: stories, test case rows and scripts as one gzip-compressed
+-- JSON document per job. The counts keep job lists and dashboards correct
+-- without decompressing anything.
+CREATE TABLE IF NOT EXISTS job_archive (
+    job_id           INTEGER PRIMARY KEY,
+    submitted_at     TIMESTAMP NOT NULL,
+    archived_at      TIMESTAMPTZ NOT NULL DEFAULT now(),
+    story_count      INTEGER NOT NULL,
+    test_case_rows   INTEGER NOT NULL,
+    test_case_count  INTEGER NOT NULL,
+    script_count     INTEGER NOT NULL,
+    raw_bytes        BIGINT NOT NULL,
+    payload          BYTEA NOT NULL,
+    FOREIGN KEY (job_id, submitted_at) REFERENCES scheduled_jobs (job_id, submitted_at)
+        ON DELETE CASCADE ON UPDATE CASCADE
+);
+
+-- Already compressed: store out of line without a second TOAST compression.
+ALTER TABLE job_archive ALTER COLUMN payload SET STORAGE EXTERNAL;
@@ -0,0 +1,7 @@
+-- The job_attempts row of the attempt holding a job's lease. Renewing and
+-- releasing a lease match on it rather than on lease_owner (host:pid), so an
+-- attempt that was reaped cannot heartbeat or finish a later attempt of the
+-- same job run by the same process.
+
+ALTER TABLE scheduled_jobs
+    ADD COLUMN IF NOT EXISTS lease_attempt_id BIGINT;
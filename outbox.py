@@ -0,0 +1,222 @@
+"""
+Transactional outbox for job queue messages.
+
+Nothing on the request path talks to the queue directly. Code that changes a
+job's state calls enqueue_job() (or add()) with its own cursor, so the enqueue
+intent commits or rolls back together with the state change. A relay then
+publishes pending rows to the job queue:
+
+- rows are claimed in batches (FOR UPDATE SKIP LOCKED, so several relays can
+  run) and published in one pipelined call per batch (RQ enqueue_many, or a
+  single INSERT for the Postgres backend);
+- delivery is at-least-once: a crash after publishing but before marking
+  the rows published republishes them, so every message carries an
+  idempotency key. Workers compare it with scheduled_jobs.enqueue_key and
+  skip stale or repeated deliveries.
+
+The relay runs in a thread in every API and worker process (several relays
+are safe), so messages are published even when no worker is up, or on its
+own:
+
+    python outbox.py
+
+The API's /metrics reports the number and age of unpublished messages
+(sagescript_outbox_pending, sagescript_outbox_oldest_pending_age_seconds).
+"""
+import logging
+import os
+import threading
+import time
+import uuid
+
+from psycopg.types.json import Jsonb
+
+from db import database_url, get_connection
+
+logger = logging.getLogger("outbox")
+
+OUTBOX_BATCH_SIZE = int(os.environ.get("OUTBOX_BATCH_SIZE", "100"))
+OUTBOX_POLL_INTERVAL = float(os.environ.get("OUTBOX_POLL_INTERVAL", "1"))
+OUTBOX_RETRY_MAX_SECONDS = float(os.environ.get("OUTBOX_RETRY_MAX_SECONDS", "30"))
+
+NOTIFY_CHANNEL = "job_outbox"
+GENERATE_FUNC = "worker.generate_functional_tests_job"
+
+
+def add(cursor, func: str, *args, key: str = None, priority: int = 0, delay: float = 0) -> str:
+    """
+    Record an enqueue intent in the caller's transaction. Re-adding an
+    existing key is a no-op. Returns the idempotency key.
+    """
+    key = key or f"msg-{uuid.uuid4().hex}"
+    cursor.execute(
+        """
+        INSERT INTO job_outbox (idempotency_key, func, args, priority, delay_seconds)
+        VALUES (%s, %s, %s, %s, %s)
+        ON CONFLICT (idempotency_key) DO NOTHING
+        """,
+        (key, func, Jsonb(list(args)), priority, delay),
+    )
+    cursor.execute("SELECT pg_notify(%s, '')", (NOTIFY_CHANNEL,))
+    return key
+
+
+def enqueue_job(cursor, job_id: int, priority: int = 0, delay: float = 0) -> str:
+    """
+    Queue a generation run for a job: stamp a fresh enqueue key on the job
+    and add the matching outbox message, in the caller's transaction.
+    """
+    key = f"job-{job_id}-{uuid.uuid4().hex}"
+    cursor.execute(
+        "UPDATE scheduled_jobs SET enqueue_key = %s WHERE job_id = %s",
+        (key, job_id),
+    )
+    return add(cursor, GENERATE_FUNC, job_id, key, key=key, priority=priority, delay=delay)
+
+
+def relay_once(batch_size: int = OUTBOX_BATCH_SIZE) -> int:
+    """
+    Publish one batch of pending messages. Returns how many were published.
+    """
+    from job_queue import get_job_queue
+
+    queue = get_job_queue()
+    conn = get_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT outbox_id, idempotency_key AS key, func, args, priority, delay_seconds AS delay
+                FROM job_outbox
+                WHERE published_at IS NULL
+                ORDER BY outbox_id
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+                """,
+                (batch_size,),
+            )
+            rows = cur.fetchall()
+            if not rows:
+                conn.commit()
+                return 0
+
+            ids = [row["outbox_id"] for row in rows]
+            try:
+                # The Postgres backend inserts in this same transaction.
+                queue.enqueue_many(rows, cursor=cur)
+            except Exception as e:
+                conn.rollback()
+                cur.execute(
+                    """
+                    UPDATE job_outbox SET attempts = attempts + 1, last_error = %s
+                    WHERE outbox_id = ANY(%s)
+                    """,
+                    (str(e), ids),
+                )
+                conn.commit()
+                raise
+
+            cur.execute(
+                "UPDATE job_outbox SET published_at = now() WHERE outbox_id = ANY(%s)",
+                (ids,),
+            )
+        conn.commit()
+        return len(rows)
+
+    except Exception:
+        conn.rollback()
+        raise
+
+    finally:
+        conn.close()
+
+
+def pending_stats() -> dict:
+    """
+    Unpublished messages and the age in seconds of the oldest one.
+    """
+    conn = get_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT
+                    count(*) AS pending,
+                    coalesce(extract(epoch FROM now() - min(created_at)), 0) AS oldest_age
+                FROM job_outbox
+                WHERE published_at IS NULL
+                """
+            )
+            row = cur.fetchone()
+        conn.commit()
+        return {"pending": row["pending"], "oldest_age": float(row["oldest_age"])}
+    finally:
+        conn.close()
+
+
+def purge_published(older_than_hours: int = 24) -> int:
+    conn = get_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                DELETE FROM job_outbox
+                WHERE published_at < now() - make_interval(hours => %s)
+                """,
+                (older_than_hours,),
+            )
+            deleted = cur.rowcount
+        conn.commit()
+        return deleted
+    finally:
+        conn.close()
+
+
+def run_relay():
+    """
+    Publish continuously: drain full batches back to back, then wait for a
+    NOTIFY from add() or the poll interval. Publish failures back off
+    exponentially up to OUTBOX_RETRY_MAX_SECONDS.
+    """
+    import psycopg
+
+    listener = psycopg.connect(database_url(), autocommit=True)
+    listener.execute(f"LISTEN {NOTIFY_CHANNEL}")
+    failures = 0
+    last_purge = 0.0
+    try:
+        while True:
+            try:
+                published = relay_once()
+                failures = 0
+                if time.monotonic() - last_purge > 3600:
+                    purge_published()
+                    last_purge = time.monotonic()
+            except Exception:
+                failures += 1
+                delay = min(2 ** failures, OUTBOX_RETRY_MAX_SECONDS)
+                logger.exception("Outbox relay failed; retrying in %.0fs", delay)
+                time.sleep(delay)
+                continue
+            if published:
+                logger.debug("Relayed %d outbox messages", published)
+            if published >= OUTBOX_BATCH_SIZE:
+                continue
+            for _ in listener.notifies(timeout=OUTBOX_POLL_INTERVAL, stop_after=1):
+                pass
+    finally:
+        listener.close()
+
+
+def start_relay() -> threading.Thread:
+    thread = threading.Thread(target=run_relay, name="outbox-relay", daemon=True)
+    thread.start()
+    return thread
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=os.environ.get("LOG_LEVEL", "INFO").upper(),
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    run_relay()
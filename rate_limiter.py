@@ -0,0 +1,275 @@
+"""
+Cluster-wide LLM rate limiting with adaptive concurrency.
+
+Every generation call made by a worker goes through GovernedBackend, which:
+
+1. takes a slot from AdaptiveConcurrency, a per-process AIMD limit that grows
+   by ~1 per window of successful calls and halves on a 429 or latency spike;
+2. acquires request and token budget from Redis token buckets shared by all
+   workers (per provider and per provider+model), atomically in one Lua call;
+3. on a provider 429, sets a shared cooldown so every worker backs off, then
+   retries with capped exponential backoff.
+
+Limits come from LLM_RATE_LIMITS, a JSON object keyed by provider or
+"provider:model":
+
+    LLM_RATE_LIMITS='{"openai": {"rpm": 500, "tpm": 200000}, "openai:gpt-4o-mini": {"rpm": 300}}'
+
+Without REDIS_URL only the per-process adaptive limit applies.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+
+import metrics
+from llm import LLMBackend, RateLimitError
+
+logger = logging.getLogger("rate_limiter")
+
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", "5"))
+LLM_EXPECTED_OUTPUT_TOKENS = int(os.environ.get("LLM_EXPECTED_OUTPUT_TOKENS", "1500"))
+LLM_LATENCY_SPIKE_FACTOR = float(os.environ.get("LLM_LATENCY_SPIKE_FACTOR", "3"))
+LLM_DEFAULT_COOLDOWN_S = float(os.environ.get("LLM_DEFAULT_COOLDOWN_S", "5"))
+
+# KEYS: bucket keys..., cooldown key (last).
+# ARGV: capacity, refill per ms, cost for each bucket.
+# Returns 0 when every bucket was debited, otherwise milliseconds to wait.
+TOKEN_BUCKET_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local cooldown = redis.call('PTTL', KEYS[#KEYS])
+if cooldown > 0 then
+    return cooldown
+end
+local buckets = #KEYS - 1
+local wait = 0
+local levels = {}
+for i = 1, buckets do
+    local capacity = tonumber(ARGV[(i - 1) * 3 + 1])
+    local rate = tonumber(ARGV[(i - 1) * 3 + 2])
+    local cost = math.min(tonumber(ARGV[(i - 1) * 3 + 3]), capacity)
+    local state = redis.call('HMGET', KEYS[i], 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + math.max(now - ts, 0) * rate)
+    levels[i] = tokens - cost
+    if tokens < cost then
+        wait = math.max(wait, math.ceil((cost - tokens) / rate))
+    end
+end
+if wait > 0 then
+    return wait
+end
+for i = 1, buckets do
+    local capacity = tonumber(ARGV[(i - 1) * 3 + 1])
+    local rate = tonumber(ARGV[(i - 1) * 3 + 2])
+    redis.call('HSET', KEYS[i], 'tokens', levels[i], 'ts', now)
+    redis.call('PEXPIRE', KEYS[i], math.ceil(capacity / rate) * 2)
+end
+return 0
+"""
+
+
+def load_limits() -> dict:
+    raw = os.environ.get("LLM_RATE_LIMITS")
+    return json.loads(raw) if raw else {}
+
+
+def estimate_tokens(prompt: str) -> int:
+    # ~4 characters per token, plus the expected completion size.
+    return len(prompt) // 4 + LLM_EXPECTED_OUTPUT_TOKENS
+
+
+class DistributedRateLimiter:
+    """
+    Redis token buckets shared by every worker process.
+    """
+
+    def __init__(self, redis, limits: dict = None):
+        self.redis = redis
+        self.limits = load_limits() if limits is None else limits
+        self._script = redis.register_script(TOKEN_BUCKET_LUA)
+
+    def _buckets(self, provider: str, model: str, tokens: int) -> tuple[list, list]:
+        keys, args = [], []
+        for scope in (provider, f"{provider}:{model}"):
+            limits = self.limits.get(scope, {})
+            for kind, cost in (("rpm", 1), ("tpm", tokens)):
+                per_minute = limits.get(kind)
+                if not per_minute:
+                    continue
+                # Hash tag keeps a provider's keys in one Redis Cluster slot.
+                keys.append(f"llm:rl:{{{provider}}}:{scope}:{kind}")
+                args.extend([per_minute, per_minute / 60000, cost])
+        keys.append(f"llm:rl:{{{provider}}}:cooldown")
+        return keys, args
+
+    async def acquire(self, provider: str, model: str, tokens: int) -> float:
+        """
+        Wait until the provider/model buckets admit one request of `tokens`.
+        Returns seconds spent waiting.
+        """
+        keys, args = self._buckets(provider, model, tokens)
+        started = time.perf_counter()
+        while True:
+            wait_ms = int(await self._script(keys=keys, args=args))
+            if wait_ms <= 0:
+                break
+            # Jitter so waiting workers don't retry in lockstep.
+            await asyncio.sleep(wait_ms / 1000 * random.uniform(1.0, 1.2))
+        waited = time.perf_counter() - started
+        metrics.LLM_RATE_LIMIT_WAIT.labels(provider, model).observe(waited)
+        return waited
+
+    async def cooldown(self, provider: str, seconds: float):
+        """
+        Make every worker pause calls to `provider` (after a 429).
+        """
+        await self.redis.set(f"llm:rl:{{{provider}}}:cooldown", 1, px=max(int(seconds * 1000), 1))
+
+    async def close(self):
+        await self.redis.aclose()
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD limit on in-flight calls: +1/limit per success (about +1 per window),
+    halved on throttling or when latency exceeds LLM_LATENCY_SPIKE_FACTOR x
+    the moving average.
+    """
+
+    def __init__(self, max_limit: int, min_limit: int = 1, initial: int = None, label: str = "default"):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.limit = float(initial or max(min_limit, max_limit // 2))
+        self.in_flight = 0
+        self.latency_ewma = None
+        self.label = label
+        self._cond = asyncio.Condition()
+        metrics.LLM_CONCURRENCY_LIMIT.labels(label).set(self.limit)
+
+    async def acquire(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self):
+        async with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def _set(self, limit: float):
+        self.limit = min(max(limit, self.min_limit), self.max_limit)
+        metrics.LLM_CONCURRENCY_LIMIT.labels(self.label).set(self.limit)
+
+    def on_success(self, latency: float):
+        spike = (
+            self.latency_ewma is not None
+            and latency > self.latency_ewma * LLM_LATENCY_SPIKE_FACTOR
+        )
+        self.latency_ewma = latency if self.latency_ewma is None else 0.9 * self.latency_ewma + 0.1 * latency
+        if spike:
+            self._set(self.limit / 2)
+        else:
+            self._set(self.limit + 1 / self.limit)
+
+    def on_throttle(self):
+        self._set(self.limit / 2)
+
+
+class GovernedBackend(LLMBackend):
+    """
+    Wraps an llm.LLMBackend so every completion is concurrency- and rate-limited.
+    """
+
+    def __init__(self, backend, concurrency: AdaptiveConcurrency, limiter: DistributedRateLimiter = None):
+        super().__init__(backend.model)
+        self.backend = backend
+        self.concurrency = concurrency
+        self.limiter = limiter
+        self.provider = backend.provider
+
+    async def _before_call(self, prompt: str):
+        await self.concurrency.acquire()
+        if self.limiter is not None:
+            try:
+                await self.limiter.acquire(self.provider, self.model, estimate_tokens(prompt))
+            except BaseException:
+                await self.concurrency.release()
+                raise
+
+    async def _throttled(self, error: RateLimitError, attempt: int) -> float:
+        """
+        Record a 429 and return the backoff before the next attempt.
+        """
+        metrics.LLM_THROTTLED_TOTAL.labels(self.provider, self.model).inc()
+        self.concurrency.on_throttle()
+        retry_after = error.retry_after or LLM_DEFAULT_COOLDOWN_S
+        if self.limiter is not None:
+            await self.limiter.cooldown(self.provider, retry_after)
+        delay = min(retry_after * (2 ** attempt), 60) * random.uniform(0.8, 1.2)
+        logger.warning("%s/%s throttled, retrying in %.1fs", self.provider, self.model, delay)
+        return delay
+
+    async def complete(self, prompt: str) -> str:
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            await self._before_call(prompt)
+            try:
+                started = time.perf_counter()
+                try:
+                    text = await self.backend.complete(prompt)
+                except RateLimitError as e:
+                    if attempt == LLM_MAX_RETRIES:
+                        raise
+                    delay = await self._throttled(e, attempt)
+                else:
+                    self.concurrency.on_success(time.perf_counter() - started)
+                    return text
+            finally:
+                await self.concurrency.release()
+            await asyncio.sleep(delay)
+
+    async def stream(self, prompt: str):
+        # A 429 is only retried if it arrives before the first chunk.
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            await self._before_call(prompt)
+            yielded = False
+            try:
+                started = time.perf_counter()
+                try:
+                    async for chunk in self.backend.stream(prompt):
+                        yielded = True
+                        yield chunk
+                except RateLimitError as e:
+                    if yielded or attempt == LLM_MAX_RETRIES:
+                        raise
+                    delay = await self._throttled(e, attempt)
+                else:
+                    self.concurrency.on_success(time.perf_counter() - started)
+                    return
+            finally:
+                await self.concurrency.release()
+            await asyncio.sleep(delay)
+
+    async def close(self):
+        if self.limiter is not None:
+            await self.limiter.close()
+
+
+def govern(backend, max_in_flight: int) -> GovernedBackend:
+    """
+    Wrap `backend` with adaptive concurrency and, when REDIS_URL is set, the
+    shared token buckets. Call within the event loop that will use it, once
+    per process (see worker.governed_backend), so the AIMD limit adapts
+    across jobs.
+    """
+    limiter = None
+    if os.environ.get("REDIS_URL"):
+        from redis.asyncio import Redis
+
+        limiter = DistributedRateLimiter(Redis.from_url(os.environ["REDIS_URL"]))
+    concurrency = AdaptiveConcurrency(max_in_flight, label=f"{backend.provider}:{backend.model}")
+    return GovernedBackend(backend, concurrency, limiter)
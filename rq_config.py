@@ -1,35 +1,47 @@
 import os
+from functools import lru_cache
+
 from redis import Redis
 from rq import Queue
 
-#redis_conn = Redis(host="localhost", port=6379, db=0)
-
-# REDIS_HOST = "localhost"
-# REDIS_PORT =  6379
-# REDIS_DB = int(os.getenv("REDIS_DB", 0))
-
-# redis_conn = Redis(
-#     host=REDIS_HOST,
-#     port=REDIS_PORT,
-#     db=REDIS_DB,
-#     socket_connect_timeout=5,
-#     socket_timeout=5
-# )
-
-redis_conn = Redis.from_url(
-    os.environ["REDIS_URL"],
-    decode_responses=True
-)
-
-# redis_conn  = Redis(
-#     host=os.environ["REDIS_HOST"],  # "redis"
-#     port=int(os.environ.get("REDIS_PORT", 6379)),
-#     decode_responses=True
-# )
-
-print("REDIS_URL =", os.environ.get("REDIS_URL"))
-
-test_generation_queue = Queue(
-    name="functional-test-generation",
-    connection=redis_conn
-)
+QUEUE_NAME = "functional-test-generation"
+
+# Read by `rq worker -c rq_config`; the API never touches Redis at import time.
+REDIS_URL = os.environ.get("REDIS_URL")
+
+
+@lru_cache(maxsize=None)
+def get_redis_connection() -> Redis:
+    """
+    Shared Redis connection, created on first use.
+    RQ stores pickled job data, so responses are left as bytes.
+    """
+    return Redis.from_url(
+        os.environ["REDIS_URL"],
+        socket_connect_timeout=5,
+        socket_timeout=5,
+    )
+
+
+@lru_cache(maxsize=None)
+def get_queue() -> Queue:
+    return Queue(name=QUEUE_NAME, connection=get_redis_connection())
+
+
+def redis_health() -> dict:
+    try:
+        get_redis_connection().ping()
+        return {"ok": True}
+    except KeyError as e:
+        return {"ok": False, "error": f"{e.args[0]} is not set"}
+    except Exception as e:
+        return {"ok": False, "error": str(e)}
+
+
+def __getattr__(name):
+    # Backwards compatible lazy module attributes (`from rq_config import test_generation_queue`).
+    if name == "redis_conn":
+        return get_redis_connection()
+    if name == "test_generation_queue":
+        return get_queue()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,129 @@
+"""
+Opt-in per-request SQL profiler.
+
+Enable with SQL_PROFILE=1. Every statement run through db.InstrumentedCursor
+is recorded with its duration and row count for the current request (or any
+block wrapped in profile()). At the end of the request:
+
+- statements slower than SQL_SLOW_QUERY_MS are logged with parameters redacted,
+- statement shapes repeated SQL_N_PLUS_ONE_THRESHOLD+ times are logged as
+  probable N+1 queries,
+- a Server-Timing header ("db;dur=12.3;desc=\"5 queries\"") is attached so
+  browser devtools show DB time per call.
+"""
+import logging
+import os
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+logger = logging.getLogger("sql_profiler")
+
+ENABLED = os.environ.get("SQL_PROFILE", "").lower() in ("1", "true", "yes")
+SLOW_QUERY_MS = float(os.environ.get("SQL_SLOW_QUERY_MS", "200"))
+N_PLUS_ONE_THRESHOLD = int(os.environ.get("SQL_N_PLUS_ONE_THRESHOLD", "3"))
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+# IN lists of literals or placeholders, whatever their length.
+_IN_LIST = re.compile(r"\bIN\s*\(\s*(?:\?|%s)(?:\s*,\s*(?:\?|%s))*\s*\)", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+
+
+def statement_shape(sql: str) -> str:
+    """
+    Normalize a statement so calls differing only in literals compare equal.
+    """
+    shape = _STRING_LITERAL.sub("?", sql)
+    shape = _NUMBER_LITERAL.sub("?", shape)
+    shape = _IN_LIST.sub("IN (?)", shape)
+    return _WHITESPACE.sub(" ", shape).strip()
+
+
+def redact_params(params) -> str:
+    """
+    Describe parameters by type only, never by value.
+    """
+    if params is None:
+        return "none"
+    if isinstance(params, dict):
+        return "{" + ", ".join(f"{k}: <{type(v).__name__}>" for k, v in params.items()) + "}"
+    try:
+        return "[" + ", ".join(f"<{type(v).__name__}>" for v in params) + "]"
+    except TypeError:
+        return f"<{type(params).__name__}>"
+
+
+class RequestProfile:
+    def __init__(self, label: str):
+        self.label = label
+        self.statements = []  # (shape, duration_ms, rowcount)
+
+    @property
+    def db_ms(self) -> float:
+        return sum(duration for _, duration, _ in self.statements)
+
+    def repeated_shapes(self) -> list[tuple[str, int]]:
+        counts = Counter(shape for shape, _, _ in self.statements)
+        return [(shape, n) for shape, n in counts.most_common() if n >= N_PLUS_ONE_THRESHOLD]
+
+    def server_timing(self) -> str:
+        return f'db;dur={self.db_ms:.1f};desc="{len(self.statements)} queries"'
+
+
+_current: ContextVar[Optional[RequestProfile]] = ContextVar("sql_profile", default=None)
+
+
+def record(sql: str, params, seconds: float, rowcount: int):
+    """
+    Called by db.InstrumentedCursor after each statement.
+    """
+    profile_ = _current.get()
+    if profile_ is None:
+        return
+    shape = statement_shape(sql)
+    duration_ms = seconds * 1000
+    profile_.statements.append((shape, duration_ms, rowcount))
+    if duration_ms >= SLOW_QUERY_MS:
+        logger.warning(
+            "Slow query (%.1f ms, %s rows) in %s: %s params=%s",
+            duration_ms, rowcount, profile_.label, shape, redact_params(params),
+        )
+
+
+def _report(profile_: RequestProfile):
+    for shape, n in profile_.repeated_shapes():
+        logger.warning(
+            "Probable N+1 in %s: statement executed %d times: %s",
+            profile_.label, n, shape,
+        )
+    logger.debug(
+        "%s: %d statements, %.1f ms in database",
+        profile_.label, len(profile_.statements), profile_.db_ms,
+    )
+
+
+@contextmanager
+def profile(label: str):
+    """
+    Profile every statement executed inside the block (e.g. a worker job).
+    """
+    profile_ = RequestProfile(label)
+    token = _current.set(profile_)
+    try:
+        yield profile_
+    finally:
+        _current.reset(token)
+        _report(profile_)
+
+
+async def profiler_middleware(request, call_next):
+    with profile(f"{request.method} {request.url.path}") as profile_:
+        started = time.perf_counter()
+        response = await call_next(request)
+        logger.debug("%s took %.1f ms", profile_.label, (time.perf_counter() - started) * 1000)
+    response.headers.append("Server-Timing", profile_.server_timing())
+    return response
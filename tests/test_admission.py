@@ -0,0 +1,40 @@
+import pytest
+from fastapi import HTTPException
+
+import admission
+
+
+def _story(chars, criteria=0):
+    return {"user_story": "s" * chars, "acceptance_criteria": "a" * criteria}
+
+
+def test_accepts_requests_within_limits():
+    admission.check_request_size([_story(10, 10)] * admission.MAX_STORIES_PER_REQUEST)
+    admission.check_request_size([_story(admission.MAX_STORY_CHARS)])
+    admission.check_request_size([{"user_story": "s", "acceptance_criteria": None}])
+
+
+def test_rejects_too_many_stories():
+    with pytest.raises(HTTPException) as excinfo:
+        admission.check_request_size([_story(10)] * (admission.MAX_STORIES_PER_REQUEST + 1))
+    assert excinfo.value.status_code == 413
+    assert str(admission.MAX_STORIES_PER_REQUEST) in excinfo.value.detail["message"]
+
+
+def test_rejects_oversized_story_counting_acceptance_criteria():
+    half = admission.MAX_STORY_CHARS // 2
+    payloads = [_story(10), _story(half, admission.MAX_STORY_CHARS - half + 1)]
+    with pytest.raises(HTTPException) as excinfo:
+        admission.check_request_size(payloads)
+    assert excinfo.value.status_code == 413
+    assert excinfo.value.detail["message"].startswith("User story 1 ")
+
+
+def test_limits_follow_module_settings(monkeypatch):
+    monkeypatch.setattr(admission, "MAX_STORIES_PER_REQUEST", 2)
+    monkeypatch.setattr(admission, "MAX_STORY_CHARS", 5)
+    admission.check_request_size([_story(5), _story(2, 3)])
+    with pytest.raises(HTTPException):
+        admission.check_request_size([_story(1)] * 3)
+    with pytest.raises(HTTPException):
+        admission.check_request_size([_story(3, 3)])
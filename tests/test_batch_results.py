@@ -0,0 +1,94 @@
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app as api
+from tools import batch_results
+
+JOB = {
+    "job_id": 7,
+    "project_name": "Checkout",
+    "description": "Cart stories",
+    "status": "COMPLETED",
+    "submitted_at": datetime(2026, 10, 1),
+}
+TEST_CASES = [
+    {"ID": "TC-1", "title": "Add item", "priority": "High", "steps": ["Open cart"]},
+    {"ID": "TC-2", "title": "Remove item", "priority": " low ", "steps": ["Open cart"]},
+    {"test_case_id": "TC-3", "Title": "Empty cart", "Priority": "Medium"},
+]
+SCRIPTS = [{"script": {"language": "python"}}, {"script": {"language": "java"}}]
+
+
+@pytest.fixture
+def no_database(monkeypatch):
+    def connect():
+        raise AssertionError("validation must fail before connecting")
+
+    monkeypatch.setattr(batch_results, "get_read_connection", connect)
+
+
+@pytest.mark.parametrize(
+    "job_ids, fields",
+    [
+        ([1], "bodies"),
+        ([1], ""),
+        ([], "summary"),
+        (list(range(batch_results.RESULTS_BATCH_MAX_JOBS + 1)), "summary"),
+    ],
+)
+def test_fetch_results_validates_before_connecting(no_database, job_ids, fields):
+    with pytest.raises(ValueError):
+        batch_results.fetch_results(job_ids, fields)
+
+
+def test_duplicate_ids_count_once(no_database):
+    ids = list(range(batch_results.RESULTS_BATCH_MAX_JOBS)) * 2
+    with pytest.raises(AssertionError, match="before connecting"):
+        batch_results.fetch_results(ids, "summary")
+
+
+def test_summary_projection():
+    entry = batch_results._project(JOB, "summary", TEST_CASES, SCRIPTS)
+    assert entry["job_info"]["status"] == "Completed"
+    assert entry["job_info"]["test_count"] == 3
+    assert (entry["high_priority_count"], entry["medium_priority_count"], entry["low_priority_count"]) == (1, 1, 1)
+    assert entry["automation_script_count"] == 2
+    assert "test_cases" not in entry
+
+
+def test_titles_projection():
+    entry = batch_results._project(JOB, "titles", TEST_CASES, SCRIPTS)
+    assert entry["test_cases"] == [
+        {"ID": "TC-1", "title": "Add item", "priority": "High"},
+        {"ID": "TC-2", "title": "Remove item", "priority": " low "},
+        {"ID": "TC-3", "title": "Empty cart", "priority": "Medium"},
+    ]
+    assert entry["automation_script_count"] == 2
+
+
+def test_full_projection():
+    entry = batch_results._project(JOB, "full", TEST_CASES, SCRIPTS)
+    assert entry["test_cases"] == TEST_CASES
+    assert entry["automation_scripts"] == {"language": "python"}
+    assert "automation_script_count" not in entry
+    assert batch_results._project(JOB, "full", [], [])["automation_scripts"] == {}
+
+
+def test_counts_normalise_priorities():
+    assert batch_results._counts(TEST_CASES[:2] + [{"priority": None}]) == {"high": 1, "medium": 0, "low": 1}
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "job_ids=1,2&fields=bodies",
+        "job_ids=1,x",
+        "job_ids=",
+        "job_ids=" + ",".join(str(i) for i in range(batch_results.RESULTS_BATCH_MAX_JOBS + 1)),
+    ],
+)
+def test_endpoint_rejects_bad_requests(no_database, query):
+    response = TestClient(api.app).get(f"/api/results?{query}")
+    assert response.status_code == 400
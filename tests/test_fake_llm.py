@@ -0,0 +1,39 @@
+import random
+import statistics
+
+import pytest
+
+from bench.fake_llm import parse_latency
+
+
+def _samples(spec, n=2000):
+    rng = random.Random(7)
+    latency = parse_latency(spec)
+    return [latency(rng) for _ in range(n)]
+
+
+def test_fixed():
+    assert set(_samples("fixed:250", 10)) == {0.25}
+
+
+def test_uniform_stays_in_range():
+    samples = _samples("uniform:100:300")
+    assert min(samples) >= 0.1 and max(samples) <= 0.3
+
+
+def test_lognormal_median():
+    assert statistics.median(_samples("lognormal:800:0.5")) == pytest.approx(0.8, rel=0.1)
+
+
+def test_exponential_mean():
+    assert statistics.mean(_samples("exponential:200")) == pytest.approx(0.2, rel=0.1)
+    assert set(_samples("exponential:0", 10)) == {0.0}
+
+
+@pytest.mark.parametrize(
+    "spec",
+    ["", "fixed", "fixed:abc", "fixed:1:2", "uniform:100", "lognormal:800", "exponential:1:2", "gamma:1:2"],
+)
+def test_bad_specs(spec):
+    with pytest.raises(ValueError, match="Bad latency spec"):
+        parse_latency(spec)
@@ -0,0 +1,63 @@
+import pytest
+
+from tools import minhash
+
+pytest.importorskip("numpy")
+
+BASE = (
+    "Verify that a registered user can log in with a valid email and password "
+    "and is redirected to the dashboard showing their recent projects and alerts"
+)
+NEAR = BASE + " today"
+OTHER = "Export the monthly invoice report as a spreadsheet and email it to the finance team"
+
+
+def _exact_jaccard(a, b):
+    sa, sb = minhash.shingles(a), minhash.shingles(b)
+    return len(sa & sb) / len(sa | sb)
+
+
+def test_shingles_are_word_trigrams_ignoring_case_and_punctuation():
+    assert minhash.shingles("One two, THREE four!") == minhash.shingles("one two three four")
+    assert len(minhash.shingles("one two three four")) == 2
+    assert all(0 <= s < 2 ** 32 for s in minhash.shingles(BASE))
+
+
+def test_short_text_still_has_a_shingle():
+    assert len(minhash.shingles("login")) == 1
+    assert len(minhash.signature("login")) == minhash.NUM_PERM * 4
+
+
+def test_signature_is_deterministic():
+    sig = minhash.signature(BASE)
+    assert len(sig) == minhash.NUM_PERM * 4
+    assert sig == minhash.signature(BASE)
+    assert minhash.jaccard_estimate(sig, sig) == 1.0
+
+
+def test_jaccard_estimate_tracks_exact_jaccard():
+    near = minhash.jaccard_estimate(minhash.signature(BASE), minhash.signature(NEAR))
+    other = minhash.jaccard_estimate(minhash.signature(BASE), minhash.signature(OTHER))
+    assert abs(near - _exact_jaccard(BASE, NEAR)) < 0.15
+    assert other < 0.1
+
+
+def test_band_buckets():
+    buckets = minhash.band_buckets(minhash.signature(BASE))
+    assert len(buckets) == minhash.BANDS
+    assert all(-(2 ** 63) <= b < 2 ** 63 for b in buckets)
+    assert buckets == minhash.band_buckets(minhash.signature(BASE))
+    # Near-duplicates collide in at least one band; unrelated texts do not.
+    assert set(buckets) & set(minhash.band_buckets(minhash.signature(NEAR)))
+    assert not set(buckets) & set(minhash.band_buckets(minhash.signature(OTHER)))
+
+
+def test_test_case_text_joins_known_fields():
+    tc = {
+        "title": "Login",
+        "preconditions": "User exists",
+        "steps": ["Open page", "Submit"],
+        "expected_results": ["Dashboard"],
+        "priority": "High",
+    }
+    assert minhash.test_case_text(tc) == "Login User exists Open page Submit Dashboard"
@@ -0,0 +1,55 @@
+import asyncio
+
+import rate_limiter
+from rate_limiter import AdaptiveConcurrency
+
+
+def test_initial_limit_defaults_to_half_of_max():
+    assert AdaptiveConcurrency(max_limit=8).limit == 4
+    assert AdaptiveConcurrency(max_limit=1).limit == 1
+    assert AdaptiveConcurrency(max_limit=8, initial=6).limit == 6
+
+
+def test_success_grows_about_one_per_window():
+    concurrency = AdaptiveConcurrency(max_limit=16, initial=4)
+    for _ in range(4):
+        concurrency.on_success(1.0)
+    assert 4.9 < concurrency.limit < 5.0
+
+
+def test_throttle_halves_and_clamps_to_min():
+    concurrency = AdaptiveConcurrency(max_limit=16, min_limit=2, initial=8)
+    concurrency.on_throttle()
+    assert concurrency.limit == 4
+    concurrency.on_throttle()
+    concurrency.on_throttle()
+    assert concurrency.limit == 2
+
+
+def test_success_clamps_to_max():
+    concurrency = AdaptiveConcurrency(max_limit=4, initial=4)
+    concurrency.on_success(1.0)
+    assert concurrency.limit == 4
+
+
+def test_latency_spike_halves():
+    concurrency = AdaptiveConcurrency(max_limit=16, initial=8)
+    concurrency.on_success(1.0)
+    limit = concurrency.limit
+    concurrency.on_success(1.0 * rate_limiter.LLM_LATENCY_SPIKE_FACTOR + 1)
+    assert concurrency.limit == limit / 2
+
+
+def test_acquire_blocks_at_limit():
+    async def scenario():
+        concurrency = AdaptiveConcurrency(max_limit=2, initial=2)
+        await concurrency.acquire()
+        await concurrency.acquire()
+        waiter = asyncio.ensure_future(concurrency.acquire())
+        await asyncio.sleep(0.01)
+        assert not waiter.done()
+        await concurrency.release()
+        await asyncio.wait_for(waiter, 1)
+        assert concurrency.in_flight == 2
+
+    asyncio.run(scenario())
@@ -0,0 +1,37 @@
+from sql_profiler import redact_params, statement_shape
+
+
+def test_string_literals_including_escaped_quotes():
+    sql = "SELECT * FROM users WHERE name = 'O''Brien' AND email = 'a@b.c'"
+    assert statement_shape(sql) == "SELECT * FROM users WHERE name = ? AND email = ?"
+    assert statement_shape(sql) == statement_shape("SELECT * FROM users WHERE name = 'x' AND email = ''")
+
+
+def test_numbers_but_not_identifiers():
+    sql = "SELECT t1.a FROM scheduled_jobs_p202601 t1 WHERE job_id = 42 AND score > 0.75 LIMIT 10"
+    assert statement_shape(sql) == "SELECT t1.a FROM scheduled_jobs_p202601 t1 WHERE job_id = ? AND score > ? LIMIT ?"
+
+
+def test_in_lists_of_any_length_compare_equal():
+    shape = statement_shape("SELECT * FROM jobs WHERE job_id IN (1, 2, 3) AND status in ('A','B')")
+    assert shape == "SELECT * FROM jobs WHERE job_id IN (?) AND status IN (?)"
+    assert shape == statement_shape("SELECT * FROM jobs WHERE job_id IN (7) AND status in ('C')")
+    assert statement_shape("WHERE id IN (%s, %s)") == statement_shape("WHERE id IN (%s)")
+
+
+def test_whitespace_is_collapsed():
+    assert statement_shape("\n  SELECT 1\n\tFROM   jobs \n") == "SELECT ? FROM jobs"
+
+
+def test_redact_params_shows_types_only():
+    secret = "hunter2"
+    redacted = redact_params({"email": "a@b.c", "password": secret, "user_id": 7, "note": None})
+    assert redacted == "{email: <str>, password: <str>, user_id: <int>, note: <NoneType>}"
+    assert redact_params(("a@b.c", 7, [1, 2])) == "[<str>, <int>, <list>]"
+    assert redact_params([secret]) == "[<str>]"
+    assert secret not in redacted
+
+
+def test_redact_params_without_params():
+    assert redact_params(None) == "none"
+    assert redact_params(42) == "<int>"
@@ -0,0 +1,74 @@
+import json
+
+from tools import test_case_stream
+
+
+def _case(n, **overrides):
+    case = {
+        "ID": f"TC-{n}",
+        "title": f"Login {n} with a \"quoted\" {{brace}} [bracket]",
+        "preconditions": "User exists",
+        "steps": ["Open login page", "Submit credentials"],
+        "expected_results": ["Dashboard is shown"],
+        "priority": "High",
+    }
+    case.update(overrides)
+    return case
+
+
+def _feed(parser, text, size):
+    completed = []
+    for i in range(0, len(text), size):
+        completed.extend(parser.feed(text[i:i + size]))
+    return completed
+
+
+def test_object_wrapper_in_small_chunks():
+    cases = [_case(1), _case(2), _case(3)]
+    text = json.dumps({"test_cases": cases})
+    for size in (1, 3, 7, len(text)):
+        parser = test_case_stream.TestCaseStreamParser()
+        assert _feed(parser, text, size) == cases
+        assert parser.complete
+        assert parser.invalid == 0
+
+
+def test_cases_emitted_as_their_closing_brace_arrives():
+    first = json.dumps(_case(1))
+    text = '{"test_cases": [' + first + ", " + json.dumps(_case(2)) + "]}"
+    split = text.index(first) + len(first)
+    parser = test_case_stream.TestCaseStreamParser()
+    assert [tc["ID"] for tc in parser.feed(text[:split])] == ["TC-1"]
+    assert not parser.complete
+    assert [tc["ID"] for tc in parser.feed(text[split:])] == ["TC-2"]
+    assert parser.complete
+
+
+def test_bare_array_inside_code_fence():
+    text = "Here you go:\n```json\n" + json.dumps([_case(1)]) + "\n```\n"
+    parser = test_case_stream.TestCaseStreamParser()
+    assert _feed(parser, text, 5) == [_case(1)]
+    assert parser.complete
+
+
+def test_other_keys_are_ignored():
+    text = json.dumps({"notes": [{"ID": "x"}], "test_cases": [_case(1)], "extra": [{"ID": "y"}]})
+    parser = test_case_stream.TestCaseStreamParser()
+    assert parser.feed(text) == [_case(1)]
+
+
+def test_invalid_cases_are_counted_and_skipped():
+    bad = _case(2)
+    del bad["steps"]
+    text = json.dumps({"test_cases": [_case(1), bad, _case(3, steps="not a list")]})
+    parser = test_case_stream.TestCaseStreamParser()
+    assert [tc["ID"] for tc in parser.feed(text)] == ["TC-1"]
+    assert parser.invalid == 2
+
+
+def test_truncated_stream_is_not_complete():
+    text = json.dumps({"test_cases": [_case(1), _case(2)]})
+    parser = test_case_stream.TestCaseStreamParser()
+    completed = parser.feed(text[: text.index('"TC-2"')])
+    assert [tc["ID"] for tc in completed] == ["TC-1"]
+    assert not parser.complete
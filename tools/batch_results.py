@@ -0,0 +1,244 @@
+import os
+import sys
+from pathlib import Path
+from typing import Any, Dict, List
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import archive
+from db import get_read_connection
+from tools.extract_rows import extract_test_cases
+from tools.priority_summary import summarize_test_case_priorities
+
+RESULTS_BATCH_MAX_JOBS = int(os.environ.get("RESULTS_BATCH_MAX_JOBS", "100"))
+
+# summary: job info, test/priority/script counts
+# titles:  summary + ID, title and priority of every test case
+# full:    the same payload as GET /api/results/{job_id} for every job
+PROJECTIONS = ("summary", "titles", "full")
+
+STATUS_LABELS = {
+    "IN_QUEUE": "In Queue",
+    "IN_PROGRESS": "In Progress",
+    "COMPLETED": "Completed",
+    "FAILED": "Failed",
+}
+
+# Test cases of the requested jobs flattened in SQL the way extract_test_cases
+# does it (every object reachable through nested arrays), so summary and
+# titles never ship result bodies out of the database.
+TEST_CASES_CTE = """
+    WITH RECURSIVE items (job_id, test_case_id, path, value) AS (
+        SELECT job_id, test_case_id, ARRAY[]::bigint[], result
+        FROM function_test_cases
+        WHERE job_id = ANY(%(job_ids)s) AND submitted_at = ANY(%(submitted)s)
+      UNION ALL
+        SELECT i.job_id, i.test_case_id, i.path || e.n, e.value
+        FROM items i
+        CROSS JOIN LATERAL jsonb_array_elements(
+            CASE WHEN jsonb_typeof(i.value) = 'array' THEN i.value ELSE '[]'::jsonb END
+        ) WITH ORDINALITY AS e (value, n)
+    ),
+    test_cases AS (
+        SELECT
+            job_id,
+            test_case_id,
+            path,
+            coalesce(value ->> 'ID', value ->> 'test_case_id') AS id,
+            coalesce(value ->> 'title', value ->> 'Title') AS title,
+            coalesce(value ->> 'Priority', value ->> 'priority') AS priority
+        FROM items
+        WHERE jsonb_typeof(value) = 'object'
+    )
+"""
+
+SUMMARY_SQL = TEST_CASES_CTE + """
+    SELECT
+        job_id,
+        count(*) AS test_count,
+        count(*) FILTER (WHERE lower(trim(priority)) = 'high') AS high,
+        count(*) FILTER (WHERE lower(trim(priority)) = 'medium') AS medium,
+        count(*) FILTER (WHERE lower(trim(priority)) = 'low') AS low
+    FROM test_cases
+    GROUP BY job_id
+"""
+
+TITLES_SQL = TEST_CASES_CTE + """
+    SELECT job_id, id, title, priority
+    FROM test_cases
+    ORDER BY job_id, test_case_id, path
+"""
+
+FULL_SQL = """
+    SELECT job_id, result
+    FROM function_test_cases
+    WHERE job_id = ANY(%(job_ids)s) AND submitted_at = ANY(%(submitted)s)
+    ORDER BY job_id, test_case_id
+"""
+
+SCRIPT_COUNTS_SQL = """
+    SELECT us.job_id, count(*) AS scripts
+    FROM automation_scripts ascr
+    JOIN user_stories us
+        ON us.user_story_id = ascr.user_story_id AND us.submitted_at = ascr.submitted_at
+    WHERE us.job_id = ANY(%(job_ids)s)
+      AND us.submitted_at = ANY(%(submitted)s)
+      AND ascr.submitted_at = ANY(%(submitted)s)
+    GROUP BY us.job_id
+"""
+
+# get_job_results returns the job's first script.
+FIRST_SCRIPTS_SQL = """
+    SELECT DISTINCT ON (us.job_id) us.job_id, ascr.script
+    FROM automation_scripts ascr
+    JOIN user_stories us
+        ON us.user_story_id = ascr.user_story_id AND us.submitted_at = ascr.submitted_at
+    WHERE us.job_id = ANY(%(job_ids)s)
+      AND us.submitted_at = ANY(%(submitted)s)
+      AND ascr.submitted_at = ANY(%(submitted)s)
+    ORDER BY us.job_id, ascr.automation_id
+"""
+
+
+def _counts(test_cases: List[Dict[str, Any]]) -> Dict[str, int]:
+    counts = {"high": 0, "medium": 0, "low": 0}
+    for tc in test_cases:
+        priority = str(tc.get("priority") or "").strip().lower()
+        if priority in counts:
+            counts[priority] += 1
+    return counts
+
+
+def _title(tc: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "ID": tc.get("ID", tc.get("test_case_id")),
+        "title": tc.get("title", tc.get("Title")),
+        "priority": tc.get("Priority", tc.get("priority")),
+    }
+
+
+def _entry(job: Dict[str, Any], test_count: int, counts: Dict[str, int]) -> Dict[str, Any]:
+    return {
+        "job_info": {
+            "job_id": job["job_id"],
+            "project_name": job["project_name"],
+            "description": job["description"],
+            "status": STATUS_LABELS.get(job["status"], "In Queue"),
+            "submitted_at": job["submitted_at"],
+            "test_count": test_count,
+        },
+        "high_priority_count": counts.get("high", 0),
+        "medium_priority_count": counts.get("medium", 0),
+        "low_priority_count": counts.get("low", 0),
+    }
+
+
+def _project(job: Dict[str, Any], fields: str, test_cases: list, scripts: list) -> Dict[str, Any]:
+    """
+    Build a job's entry from its full test case dicts and script rows
+    (used for `full` and for archived jobs).
+    """
+    summary = summarize_test_case_priorities(test_cases)
+    entry = _entry(job, len(test_cases), summary)
+    if fields == "full":
+        entry["test_cases"] = test_cases
+        entry["automation_scripts"] = scripts[0]["script"] if scripts else {}
+        return entry
+    entry["automation_script_count"] = len(scripts)
+    if fields == "titles":
+        entry["test_cases"] = [_title(tc) for tc in test_cases]
+    return entry
+
+
+def fetch_results(job_ids: List[int], fields: str = "summary") -> Dict[str, Any]:
+    """
+    Results for many jobs in one round of set-based queries (jobs, test
+    cases, scripts and, if any are archived, the archive), whatever the
+    number of jobs. Entries follow the order of job_ids; unknown ids are
+    listed under "missing".
+    """
+    if fields not in PROJECTIONS:
+        raise ValueError(f"fields must be one of: {', '.join(PROJECTIONS)}")
+    job_ids = list(dict.fromkeys(job_ids))
+    if not job_ids or len(job_ids) > RESULTS_BATCH_MAX_JOBS:
+        raise ValueError(f"Between 1 and {RESULTS_BATCH_MAX_JOBS} job ids are required")
+
+    conn = get_read_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT job_id, project_name, description, status, submitted_at, archived_at
+                FROM scheduled_jobs
+                WHERE job_id = ANY(%s)
+                """,
+                (job_ids,),
+            )
+            jobs = {row["job_id"]: row for row in cursor.fetchall()}
+
+            hot = [job for job in jobs.values() if not job["archived_at"]]
+            archived_ids = [job["job_id"] for job in jobs.values() if job["archived_at"]]
+            entries = {}
+
+            if hot:
+                # The jobs' submitted_at values prune every lookup to their partitions.
+                params = {
+                    "job_ids": [job["job_id"] for job in hot],
+                    "submitted": list({job["submitted_at"] for job in hot}),
+                }
+                if fields == "full":
+                    cursor.execute(FULL_SQL, params)
+                    results = {}
+                    for row in cursor.fetchall():
+                        results.setdefault(row["job_id"], []).append(row["result"])
+                    cursor.execute(FIRST_SCRIPTS_SQL, params)
+                    scripts = {row["job_id"]: [row] for row in cursor.fetchall()}
+                    for job in hot:
+                        test_cases = extract_test_cases(results.get(job["job_id"], []))
+                        entries[job["job_id"]] = _project(job, fields, test_cases, scripts.get(job["job_id"], []))
+                else:
+                    if fields == "titles":
+                        cursor.execute(TITLES_SQL, params)
+                        titles = {}
+                        for row in cursor.fetchall():
+                            titles.setdefault(row.pop("job_id"), []).append(
+                                {"ID": row["id"], "title": row["title"], "priority": row["priority"]}
+                            )
+                        summaries = {
+                            job_id: {"test_count": len(rows), **_counts(rows)}
+                            for job_id, rows in titles.items()
+                        }
+                    else:
+                        cursor.execute(SUMMARY_SQL, params)
+                        summaries = {row.pop("job_id"): row for row in cursor.fetchall()}
+                    cursor.execute(SCRIPT_COUNTS_SQL, params)
+                    script_counts = {row["job_id"]: row["scripts"] for row in cursor.fetchall()}
+
+                    for job in hot:
+                        summary = summaries.get(job["job_id"], {})
+                        entry = _entry(job, summary.get("test_count", 0), summary)
+                        entry["automation_script_count"] = script_counts.get(job["job_id"], 0)
+                        if fields == "titles":
+                            entry["test_cases"] = titles.get(job["job_id"], [])
+                        entries[job["job_id"]] = entry
+
+            if archived_ids:
+                cursor.execute(
+                    "SELECT job_id, payload FROM job_archive WHERE job_id = ANY(%s)",
+                    (archived_ids,),
+                )
+                for row in cursor.fetchall():
+                    document = archive.unpack(row["payload"])
+                    results = [r["result"] for r in document["function_test_cases"]]
+                    entries[row["job_id"]] = _project(
+                        jobs[row["job_id"]], fields, extract_test_cases(results), document["automation_scripts"]
+                    )
+
+        return {
+            "fields": fields,
+            "jobs": [entries[job_id] for job_id in job_ids if job_id in entries],
+            "missing": [job_id for job_id in job_ids if job_id not in jobs],
+        }
+
+    finally:
+        conn.close()
@@ -0,0 +1,254 @@
+import csv
+import heapq
+import json
+import os
+import re
+import sys
+import tempfile
+import zipfile
+from pathlib import Path
+from typing import Any, Dict, Iterator, Tuple
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import archive
+from db import get_read_connection
+from tools.extract_rows import extract_test_cases
+
+# Rows fetched per round trip from the server-side cursor.
+EXPORT_FETCH_SIZE = int(os.environ.get("EXPORT_FETCH_SIZE", "500"))
+# Archived jobs (one compressed document each) fetched per round trip.
+ARCHIVE_FETCH_SIZE = 10
+# CSV rows encoded per yielded chunk.
+CSV_ROWS_PER_CHUNK = 256
+
+COLUMNS = [
+    "job_id",
+    "user_story_id",
+    "test_case_id",
+    "title",
+    "preconditions",
+    "steps",
+    "expected_results",
+    "priority",
+]
+
+# WHERE clauses (on scheduled_jobs sj) for the two export scopes.
+SCOPES = {
+    "job": "sj.job_id = %s",
+    "project": "sj.user_id = %s AND sj.project_name = %s",
+}
+
+
+def _field(tc: Dict[str, Any], *names: str) -> Any:
+    for name in names:
+        if name in tc:
+            return tc[name]
+    return ""
+
+
+def _joined(value: Any) -> str:
+    if isinstance(value, list):
+        return "\n".join(str(v) for v in value)
+    return "" if value is None else str(value)
+
+
+def _flatten(row: Dict[str, Any], tc: Dict[str, Any]) -> list:
+    return [
+        row["job_id"],
+        row["user_story_id"],
+        _field(tc, "ID", "test_case_id", "Test Case ID"),
+        _field(tc, "title", "Title"),
+        _joined(_field(tc, "preconditions", "Preconditions")),
+        _joined(_field(tc, "steps", "Steps")),
+        _joined(_field(tc, "expected_results", "Expected Results", "Expected Result")),
+        _field(tc, "priority", "Priority"),
+    ]
+
+
+def _archived_documents(conn, where: str, params: Tuple, name: str) -> Iterator[Tuple[int, dict]]:
+    """
+    (job_id, document) for every archived job in the scope, by job_id.
+    """
+    with conn.cursor(name=name) as cursor:
+        cursor.itersize = ARCHIVE_FETCH_SIZE
+        cursor.execute(
+            f"""
+            SELECT ja.job_id, ja.payload
+            FROM job_archive ja
+            JOIN scheduled_jobs sj ON sj.job_id = ja.job_id AND sj.submitted_at = ja.submitted_at
+            WHERE {where}
+            ORDER BY ja.job_id
+            """,
+            params,
+        )
+        for row in cursor:
+            yield row["job_id"], archive.unpack(row["payload"])
+
+
+def _live_result_rows(conn, where: str, params: Tuple) -> Iterator[Dict[str, Any]]:
+    with conn.cursor(name="export_test_cases") as cursor:
+        cursor.itersize = EXPORT_FETCH_SIZE
+        cursor.execute(
+            f"""
+            SELECT ftc.job_id, ftc.user_story_id, ftc.result
+            FROM function_test_cases ftc
+            JOIN scheduled_jobs sj ON sj.job_id = ftc.job_id AND sj.submitted_at = ftc.submitted_at
+            WHERE {where}
+            ORDER BY ftc.job_id, ftc.user_story_id, ftc.test_case_id
+            """,
+            params,
+        )
+        yield from cursor
+
+
+def _archived_result_rows(conn, where: str, params: Tuple) -> Iterator[Dict[str, Any]]:
+    for job_id, document in _archived_documents(conn, where, params, "export_archived_test_cases"):
+        rows = sorted(document["function_test_cases"], key=lambda r: (r["user_story_id"], r["test_case_id"]))
+        for row in rows:
+            yield {"job_id": job_id, "user_story_id": row["user_story_id"], "result": row["result"]}
+
+
+def iter_test_case_rows(scope: str, params: Tuple) -> Iterator[list]:
+    """
+    Yield one flat row per test case in the scope, reading function_test_cases
+    through a server-side cursor so memory stays constant. Archived jobs are
+    read from job_archive one document at a time and merged in job order.
+    """
+    where = SCOPES[scope]
+    conn = get_read_connection()
+    try:
+        rows = heapq.merge(
+            _live_result_rows(conn, where, params),
+            _archived_result_rows(conn, where, params),
+            key=lambda row: row["job_id"],
+        )
+        for row in rows:
+            for tc in extract_test_cases([row["result"]]):
+                yield _flatten(row, tc)
+    finally:
+        conn.close()
+
+
+class _Sink:
+    """
+    Minimal file object that hands written data back to a generator.
+    zipfile treats it as unseekable and writes data descriptors instead.
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def write(self, data) -> int:
+        self.buffer.extend(data.encode() if isinstance(data, str) else data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+def stream_csv(scope: str, params: Tuple) -> Iterator[bytes]:
+    sink = _Sink()
+    writer = csv.writer(sink)
+    writer.writerow(COLUMNS)
+    pending = 0
+    for row in iter_test_case_rows(scope, params):
+        writer.writerow(row)
+        pending += 1
+        if pending >= CSV_ROWS_PER_CHUNK:
+            yield sink.drain()
+            pending = 0
+    yield sink.drain()
+
+
+def stream_xlsx(scope: str, params: Tuple) -> Iterator[bytes]:
+    """
+    openpyxl's write-only mode spools rows to disk, so the workbook is built
+    without holding it in memory and then streamed from a temp file.
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Test Cases")
+    sheet.append(COLUMNS)
+    for row in iter_test_case_rows(scope, params):
+        sheet.append(row)
+
+    with tempfile.TemporaryFile() as tmp:
+        workbook.save(tmp)
+        tmp.seek(0)
+        while True:
+            chunk = tmp.read(64 * 1024)
+            if not chunk:
+                break
+            yield chunk
+
+
+def _script_file(row: Dict[str, Any]) -> Tuple[str, str]:
+    script = row["script"]
+    if isinstance(script, str):
+        try:
+            script = json.loads(script)
+        except json.JSONDecodeError:
+            return f"{row['user_story_id']}.txt", script
+    if isinstance(script, dict) and "code" in script:
+        file_name = re.sub(r"[^\w.\-]", "_", script.get("file_name") or "script.txt")
+        return f"{row['user_story_id']}_{file_name}", script["code"]
+    return f"{row['user_story_id']}.json", json.dumps(script, indent=2)
+
+
+def stream_scripts_zip(scope: str, params: Tuple) -> Iterator[bytes]:
+    """
+    Zip archive with one automation script file per story (archived jobs
+    included), written entry by entry straight to the response.
+    """
+    where = SCOPES[scope]
+    sink = _Sink()
+    conn = get_read_connection()
+    try:
+        with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED) as zip_file:
+            with conn.cursor(name="export_scripts") as cursor:
+                cursor.itersize = EXPORT_FETCH_SIZE
+                cursor.execute(
+                    f"""
+                    SELECT DISTINCT ON (us.user_story_id)
+                        us.job_id,
+                        us.user_story_id,
+                        ascr.script
+                    FROM automation_scripts ascr
+                    JOIN user_stories us
+                        ON us.user_story_id = ascr.user_story_id AND us.submitted_at = ascr.submitted_at
+                    JOIN scheduled_jobs sj ON sj.job_id = us.job_id AND sj.submitted_at = us.submitted_at
+                    WHERE {where}
+                    ORDER BY us.user_story_id, ascr.automation_id DESC
+                    """,
+                    params,
+                )
+                for row in cursor:
+                    name, content = _script_file(row)
+                    zip_file.writestr(f"job_{row['job_id']}/{name}", content)
+                    yield sink.drain()
+
+            # Archived jobs: the newest script of each story in the document.
+            for job_id, document in _archived_documents(conn, where, params, "export_archived_scripts"):
+                latest = {}
+                for row in sorted(document["automation_scripts"], key=lambda r: r["automation_id"]):
+                    latest[row["user_story_id"]] = row
+                for user_story_id in sorted(latest):
+                    name, content = _script_file(latest[user_story_id])
+                    zip_file.writestr(f"job_{job_id}/{name}", content)
+                    yield sink.drain()
+        yield sink.drain()
+    finally:
+        conn.close()
+
+
+EXPORTERS = {
+    "csv": (stream_csv, "text/csv", "csv"),
+    "xlsx": (stream_xlsx, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "xlsx"),
+}
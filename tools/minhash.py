@@ -0,0 +1,308 @@
+import hashlib
+import os
+import re
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from db import get_connection, get_read_connection
+
+# 128 permutations split into 16 bands of 8 rows: pairs with Jaccard above
+# ~(1/16)^(1/8) = 0.71 almost always share a bucket; candidates are then
+# verified against the requested threshold.
+NUM_PERM = 128
+BANDS = 16
+ROWS_PER_BAND = NUM_PERM // BANDS
+SHINGLE_WORDS = 3
+INDEX_BATCH_SIZE = int(os.environ.get("MINHASH_INDEX_BATCH_SIZE", "2000"))
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_WORD = re.compile(r"\w+")
+_permutations = None
+
+
+def _get_permutations():
+    """
+    Fixed (seeded) hash permutations so signatures are comparable across runs.
+    """
+    global _permutations
+    if _permutations is None:
+        import numpy as np
+
+        rng = np.random.RandomState(1)
+        _permutations = (
+            rng.randint(1, _MERSENNE_PRIME, size=NUM_PERM, dtype=np.uint64),
+            rng.randint(0, _MERSENNE_PRIME, size=NUM_PERM, dtype=np.uint64),
+        )
+    return _permutations
+
+
+def test_case_text(tc: Dict[str, Any]) -> str:
+    parts = []
+    for key in ("title", "Title", "preconditions", "steps", "Steps", "expected_results"):
+        value = tc.get(key)
+        if isinstance(value, list):
+            parts.extend(str(v) for v in value)
+        elif value:
+            parts.append(str(value))
+    return " ".join(parts)
+
+
+def shingles(text: str) -> set:
+    """
+    Word 3-gram shingles hashed to 32 bits.
+    """
+    words = _WORD.findall(text.lower())
+    if len(words) < SHINGLE_WORDS:
+        grams = [" ".join(words)]
+    else:
+        grams = [" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)]
+    return {int.from_bytes(hashlib.blake2b(g.encode(), digest_size=4).digest(), "little") for g in grams}
+
+
+def signature(text: str) -> bytes:
+    import numpy as np
+
+    a, b = _get_permutations()
+    hashes = np.fromiter(shingles(text), dtype=np.uint64)
+    # (a*x + b) mod p, truncated to 32 bits; uint64 overflow wraps, as in datasketch.
+    permuted = np.bitwise_and((np.outer(a, hashes) + b[:, None]) % _MERSENNE_PRIME, _MAX_HASH)
+    return permuted.min(axis=1).astype(np.uint32).tobytes()
+
+
+def band_buckets(sig: bytes) -> List[int]:
+    """
+    One signed 64-bit bucket id per band (fits a BIGINT column).
+    """
+    width = ROWS_PER_BAND * 4
+    return [
+        int.from_bytes(hashlib.blake2b(sig[i * width:(i + 1) * width], digest_size=8).digest(), "little", signed=True)
+        for i in range(BANDS)
+    ]
+
+
+def jaccard_estimate(sig_a: bytes, sig_b: bytes) -> float:
+    equal = sum(1 for i in range(0, len(sig_a), 4) if sig_a[i:i + 4] == sig_b[i:i + 4])
+    return equal / NUM_PERM
+
+
+def index_unindexed(job_id: Optional[int] = None, user_id: Optional[int] = None,
+                    project_name: Optional[str] = None, test_case_row: Optional[tuple] = None) -> int:
+    """
+    Compute signatures and LSH buckets for test cases that don't have one yet,
+    for one function_test_cases row ((test_case_id, submitted_at), as each
+    batch is stored), one job or a whole project (backfill). Safe to run
+    concurrently for overlapping scopes. Returns the number of test cases
+    indexed.
+    """
+    if test_case_row is not None:
+        scope, params = "tcs.test_case_row_id = %s AND tcs.submitted_at = %s", tuple(test_case_row)
+    elif job_id is not None:
+        scope, params = "sj.job_id = %s", (job_id,)
+    else:
+        scope, params = "sj.user_id = %s AND sj.project_name = %s", (user_id, project_name)
+
+    indexed = 0
+    conn = get_connection()
+    try:
+        while True:
+            with conn.cursor() as cur:
+                cur.execute(
+                    f"""
+                    SELECT tcs.search_id, tcs.body, sj.user_id, sj.project_name
+                    FROM test_case_search tcs
+                    JOIN scheduled_jobs sj ON sj.job_id = tcs.job_id AND sj.submitted_at = tcs.submitted_at
+                    WHERE {scope}
+                      AND NOT EXISTS (
+                          SELECT 1 FROM test_case_minhash m WHERE m.search_id = tcs.search_id
+                      )
+                    ORDER BY tcs.search_id
+                    LIMIT %s
+                    """,
+                    (*params, INDEX_BATCH_SIZE),
+                )
+                rows = cur.fetchall()
+                if not rows:
+                    break
+
+                signatures, bands = [], []
+                for row in rows:
+                    sig = signature(test_case_text(row["body"]))
+                    signatures.append((row["search_id"], row["user_id"], row["project_name"], sig))
+                    for band, bucket in enumerate(band_buckets(sig)):
+                        bands.append((row["user_id"], row["project_name"], band, bucket, row["search_id"]))
+
+                # COPY into staging tables, then insert skipping rows a
+                # concurrent run (job end vs. project reindex) already added.
+                cur.execute(
+                    """
+                    CREATE TEMP TABLE IF NOT EXISTS minhash_staging
+                        (LIKE test_case_minhash) ON COMMIT DELETE ROWS
+                    """
+                )
+                cur.execute(
+                    """
+                    CREATE TEMP TABLE IF NOT EXISTS lsh_bands_staging
+                        (LIKE test_case_lsh_bands) ON COMMIT DELETE ROWS
+                    """
+                )
+                with cur.copy("COPY minhash_staging (search_id, user_id, project_name, signature) FROM STDIN") as copy:
+                    for record in signatures:
+                        copy.write_row(record)
+                with cur.copy(
+                    "COPY lsh_bands_staging (user_id, project_name, band, bucket, search_id) FROM STDIN"
+                ) as copy:
+                    for record in bands:
+                        copy.write_row(record)
+                cur.execute(
+                    """
+                    INSERT INTO test_case_minhash (search_id, user_id, project_name, signature)
+                    SELECT search_id, user_id, project_name, signature
+                    FROM minhash_staging
+                    ORDER BY search_id
+                    ON CONFLICT (search_id) DO NOTHING
+                    RETURNING search_id
+                    """
+                )
+                inserted = [row["search_id"] for row in cur.fetchall()]
+                cur.execute(
+                    """
+                    INSERT INTO test_case_lsh_bands (user_id, project_name, band, bucket, search_id)
+                    SELECT user_id, project_name, band, bucket, search_id
+                    FROM lsh_bands_staging
+                    WHERE search_id = ANY(%s)
+                    ORDER BY search_id, band
+                    ON CONFLICT DO NOTHING
+                    """,
+                    (inserted,),
+                )
+                indexed += len(inserted)
+            conn.commit()
+
+    except Exception:
+        conn.rollback()
+        raise
+
+    finally:
+        conn.close()
+
+    return indexed
+
+
+def find_redundant_clusters(user_id: int, project_name: str, threshold: float = 0.8) -> List[Dict[str, Any]]:
+    """
+    Group a project's test cases into clusters of near-duplicates.
+
+    Only test cases sharing an LSH bucket are compared (against the bucket's
+    first member), so cost grows with the number of candidates rather than
+    with n^2.
+    """
+    conn = get_read_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT array_agg(search_id ORDER BY search_id) AS members
+                FROM test_case_lsh_bands
+                WHERE user_id = %s AND project_name = %s
+                GROUP BY band, bucket
+                HAVING count(*) > 1
+                """,
+                (user_id, project_name),
+            )
+            buckets = [row["members"] for row in cur.fetchall()]
+            candidate_ids = sorted({sid for members in buckets for sid in members})
+            if not candidate_ids:
+                return []
+
+            cur.execute(
+                "SELECT search_id, signature FROM test_case_minhash WHERE search_id = ANY(%s)",
+                (candidate_ids,),
+            )
+            signatures = {row["search_id"]: bytes(row["signature"]) for row in cur.fetchall()}
+
+            parent = {sid: sid for sid in candidate_ids}
+
+            def find(x):
+                while parent[x] != x:
+                    parent[x] = parent[parent[x]]
+                    x = parent[x]
+                return x
+
+            scores = {}
+            for members in buckets:
+                head = members[0]
+                for other in members[1:]:
+                    score = jaccard_estimate(signatures[head], signatures[other])
+                    if score >= threshold:
+                        root_a, root_b = find(head), find(other)
+                        if root_a != root_b:
+                            parent[max(root_a, root_b)] = min(root_a, root_b)
+                        scores[other] = max(scores.get(other, 0.0), score)
+
+            groups: Dict[int, List[int]] = {}
+            for sid in candidate_ids:
+                groups.setdefault(find(sid), []).append(sid)
+            groups = {root: ids for root, ids in groups.items() if len(ids) > 1}
+            if not groups:
+                return []
+
+            member_ids = [sid for ids in groups.values() for sid in ids]
+            cur.execute(
+                """
+                SELECT search_id, job_id, user_story_id, case_key, title
+                FROM test_case_search
+                WHERE search_id = ANY(%s)
+                """,
+                (member_ids,),
+            )
+            details = {row["search_id"]: row for row in cur.fetchall()}
+
+    finally:
+        conn.close()
+
+    clusters = []
+    for root, ids in groups.items():
+        clusters.append({
+            "keep": _describe(details[root]),
+            "redundant": [
+                dict(_describe(details[sid]), similarity=round(scores.get(sid, 1.0), 3))
+                for sid in ids if sid != root
+            ],
+        })
+    clusters.sort(key=lambda c: len(c["redundant"]), reverse=True)
+    return clusters
+
+
+def archived_job_count(user_id: int, project_name: str) -> int:
+    """
+    Archived jobs in the project. Archiving deletes a job's test cases and,
+    with them, their signatures, so these jobs take no part in detection.
+    """
+    conn = get_read_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT count(*) AS n
+                FROM scheduled_jobs
+                WHERE user_id = %s AND project_name = %s AND archived_at IS NOT NULL
+                """,
+                (user_id, project_name),
+            )
+            return cur.fetchone()["n"]
+    finally:
+        conn.close()
+
+
+def _describe(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "searchId": row["search_id"],
+        "jobId": row["job_id"],
+        "userStoryId": row["user_story_id"],
+        "testCaseId": row["case_key"],
+        "title": row["title"],
+    }
@@ -36,7 +36,8 @@ def summarize_test_case_priorities(test_cases: List[Dict[str, Any]]) -> Dict[str
     summary = {"high": 0, "medium": 0, "low": 0}
 
     for tc in test_cases or []:
-        priority = str(tc.get("Priority", "")).strip().lower()
+        # Older rows use "Priority"; the worker stores TestCase.model_dump() keys.
+        priority = str(tc.get("Priority", tc.get("priority", ""))).strip().lower()
         if priority in summary:
             summary[priority] += 1
 
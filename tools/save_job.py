@@ -3,12 +3,15 @@ import sys
 from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+import outbox
 from db import get_connection
+from job_queue import PRIORITY_INTERACTIVE
 
 
 def save_scheduled_job(payloads: list[dict]) -> int:
     """
-    Creates a scheduled job and associated user stories.
+    Creates a scheduled job and associated user stories, and queues it
+    through the outbox in the same transaction.
     Returns job_id.
     """
     conn = get_connection()
@@ -29,7 +32,7 @@ def save_scheduled_job(payloads: list[dict]) -> int:
                     framework_choice
                 )
                 VALUES (%s, %s, %s, %s, %s, %s, %s)
-                RETURNING job_id
+                RETURNING job_id, submitted_at
                 """,
                 (
                     first["user_id"],
@@ -42,7 +45,8 @@ def save_scheduled_job(payloads: list[dict]) -> int:
                 ),
             )
 
-            job_id = cursor.fetchone()["job_id"]
+            job = cursor.fetchone()
+            job_id = job["job_id"]
 
             # 2️⃣ Insert user stories
             for idx, p in enumerate(payloads, start=1):
@@ -54,18 +58,22 @@ def save_scheduled_job(payloads: list[dict]) -> int:
                         user_story_id,
                         job_id,
                         user_story_text,
-                        acceptance_criteria
+                        acceptance_criteria,
+                        submitted_at
                     )
-                    VALUES (%s, %s, %s, %s)
+                    VALUES (%s, %s, %s, %s, %s)
                     """,
                     (
                         user_story_id,
                         job_id,
                         p["user_story"],
                         p["acceptance_criteria"],
+                        job["submitted_at"],
                     ),
                 )
 
+            outbox.enqueue_job(cursor, job_id, priority=PRIORITY_INTERACTIVE)
+
         conn.commit()
         return job_id
 
@@ -0,0 +1,218 @@
+import base64
+import json
+import sys
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from db import get_read_connection
+
+HIGHLIGHT_OPTIONS = "StartSel=<mark>, StopSel=</mark>, MaxFragments=2, MaxWords=20, MinWords=5"
+
+
+def _html_escaped(expr: str) -> str:
+    """
+    SQL expression HTML-escaping the text `expr`, so the <mark> tags
+    ts_headline adds are the only markup in a highlight.
+    """
+    return f"replace(replace(replace({expr}, '&', '&amp;'), '<', '&lt;'), '>', '&gt;')"
+
+
+STORY_HITS = """
+    SELECT
+        'story' AS kind,
+        's:' || us.user_story_id AS doc_id,
+        us.job_id,
+        us.user_story_id,
+        NULL::bigint AS search_id,
+        us.submitted_at,
+        ts_rank_cd(us.search_vector, q.query) AS rank
+    FROM user_stories us
+    JOIN scoped_jobs sj ON sj.job_id = us.job_id AND sj.submitted_at = us.submitted_at
+    CROSS JOIN q
+    WHERE us.search_vector @@ q.query
+"""
+
+TEST_CASE_HITS = """
+    SELECT
+        'test_case' AS kind,
+        't:' || tcs.search_id AS doc_id,
+        tcs.job_id,
+        tcs.user_story_id,
+        tcs.search_id,
+        tcs.submitted_at,
+        ts_rank_cd(tcs.search_vector, q.query) AS rank
+    FROM test_case_search tcs
+    JOIN scoped_jobs sj ON sj.job_id = tcs.job_id AND sj.submitted_at = tcs.submitted_at
+    CROSS JOIN q
+    WHERE tcs.search_vector @@ q.query
+"""
+
+# A test case's title and steps as one text, for highlighting.
+STEPS_TEXT = """
+    coalesce(tcs.title, '') || ' ' || coalesce((
+        SELECT string_agg(step, ' ')
+        FROM jsonb_array_elements_text(
+            CASE WHEN jsonb_typeof(tcs.body -> 'steps') = 'array'
+                 THEN tcs.body -> 'steps' ELSE '[]'::jsonb END
+        ) AS step
+    ), '')
+"""
+
+
+def encode_cursor(rank: float, doc_id: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps([rank, doc_id]).encode()).decode()
+
+
+def decode_cursor(cursor: str):
+    rank, doc_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    return float(rank), str(doc_id)
+
+
+def search(
+    q: str,
+    user_id: int,
+    tenant_id: Optional[int] = None,
+    project_name: Optional[str] = None,
+    kind: str = "all",
+    limit: int = 20,
+    cursor: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Ranked full-text search over user stories and test cases visible to the
+    user (their own jobs, or every job in a tenant they have active access to).
+    Results are ordered by (rank DESC, doc_id) and paginated by keyset:
+    pass the returned next_cursor to fetch the following page.
+    Highlights are only computed for the rows on the page; they are
+    HTML-escaped text with matches wrapped in <mark>.
+
+    Archived jobs (archive.py) are not searchable: their stories and test
+    cases only exist as compressed documents. archived_jobs_excluded counts
+    the archived jobs in scope.
+    """
+    params: Dict[str, Any] = {"q": q, "user_id": user_id, "limit": limit}
+
+    if tenant_id is not None:
+        params["tenant_id"] = tenant_id
+        scope = """
+            sj.user_id IN (
+                SELECT tua.user_id FROM tenant_user_access tua
+                WHERE tua.tenant_id = %(tenant_id)s AND tua.status = 'active'
+            )
+            AND EXISTS (
+                SELECT 1 FROM tenant_user_access tua
+                WHERE tua.tenant_id = %(tenant_id)s
+                  AND tua.user_id = %(user_id)s
+                  AND tua.status = 'active'
+            )
+        """
+    else:
+        scope = "sj.user_id = %(user_id)s"
+    if project_name:
+        params["project_name"] = project_name
+        scope += " AND sj.project_name = %(project_name)s"
+
+    parts = []
+    if kind in ("all", "stories"):
+        parts.append(STORY_HITS)
+    if kind in ("all", "test_cases"):
+        parts.append(TEST_CASE_HITS)
+    if not parts:
+        raise ValueError("type must be one of: all, stories, test_cases")
+
+    keyset = ""
+    if cursor:
+        params["after_rank"], params["after_doc"] = decode_cursor(cursor)
+        keyset = """
+            WHERE h.rank < %(after_rank)s
+               OR (h.rank = %(after_rank)s AND h.doc_id > %(after_doc)s)
+        """
+
+    sql = f"""
+        WITH q AS (
+            SELECT websearch_to_tsquery('english', %(q)s) AS query
+        ),
+        scoped_jobs AS (
+            SELECT sj.job_id, sj.submitted_at, sj.project_name
+            FROM scheduled_jobs sj
+            WHERE {scope} AND sj.archived_at IS NULL
+        ),
+        hits AS (
+            {" UNION ALL ".join(parts)}
+        ),
+        page AS (
+            SELECT h.*
+            FROM hits h
+            {keyset}
+            ORDER BY h.rank DESC, h.doc_id
+            LIMIT %(limit)s
+        )
+        SELECT
+            p.kind,
+            p.doc_id,
+            p.rank,
+            p.job_id,
+            sj.project_name,
+            p.user_story_id,
+            tcs.case_key,
+            tcs.title,
+            CASE
+                WHEN p.kind = 'story' THEN ts_headline(
+                    'english',
+                    {_html_escaped("us.user_story_text || ' ' || coalesce(us.acceptance_criteria, '')")},
+                    q.query,
+                    %(highlight)s
+                )
+                ELSE ts_headline(
+                    'english',
+                    {_html_escaped(STEPS_TEXT)},
+                    q.query,
+                    %(highlight)s
+                )
+            END AS highlight
+        FROM page p
+        CROSS JOIN q
+        JOIN scheduled_jobs sj ON sj.job_id = p.job_id AND sj.submitted_at = p.submitted_at
+        LEFT JOIN user_stories us
+            ON p.kind = 'story' AND us.user_story_id = p.user_story_id AND us.submitted_at = p.submitted_at
+        LEFT JOIN test_case_search tcs ON tcs.search_id = p.search_id
+        ORDER BY p.rank DESC, p.doc_id
+    """
+    params["highlight"] = HIGHLIGHT_OPTIONS
+
+    conn = get_read_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(sql, params)
+            rows = cur.fetchall()
+            cur.execute(
+                f"""
+                SELECT count(*) AS n
+                FROM scheduled_jobs sj
+                WHERE {scope} AND sj.archived_at IS NOT NULL
+                """,
+                params,
+            )
+            archived = cur.fetchone()["n"]
+    finally:
+        conn.close()
+
+    results = [
+        {
+            "type": row["kind"],
+            "jobId": row["job_id"],
+            "project": row["project_name"],
+            "userStoryId": row["user_story_id"],
+            "testCaseId": row["case_key"],
+            "title": row["title"],
+            "highlight": row["highlight"],
+            "rank": row["rank"],
+        }
+        for row in rows
+    ]
+    next_cursor = None
+    if len(rows) == limit:
+        next_cursor = encode_cursor(rows[-1]["rank"], rows[-1]["doc_id"])
+
+    return {"results": results, "next_cursor": next_cursor, "archived_jobs_excluded": archived}
@@ -1,24 +1,118 @@
-from schemas.test_case import TestCasesSchema,TestCase
+import asyncio
 import json
-import random
+import logging
+import os
+import sys
+from pathlib import Path
+from typing import AsyncIterable, List, Optional
 
-def store_test_cases(test_Cases: str ):
-    """
-    Validates and stores LLM output (test_Cases) as a JSON file.
+sys.path.insert(0, str(Path(__file__).parent.parent))
 
-    :param test_Cases: JSON string containing test case data.
+from db import get_connection
+from tools.minhash import index_unindexed
+from tools.test_case_stream import TestCaseStreamParser
+
+logger = logging.getLogger("store_test_cases")
 
+STORE_BATCH_SIZE = int(os.environ.get("STORE_BATCH_SIZE", "5"))
+
+
+def _insert_batch(job_id: int, user_story_id: str, test_cases: list):
+    """
+    Persist one batch as a function_test_cases row (result is a JSON array,
+    which is what extract_rows expects). A story's cases may span several
+    rows, so counts must add up the arrays (archive.TEST_COUNT_SQL), not
+    count rows. The row takes the job's submitted_at, which picks its
+    partition. Returns the row's key, (test_case_id, submitted_at).
     """
-    thread_id = random.randint(1, 1000000)
-    file_path: str = f"test_cases_{thread_id}.json"
+    conn = get_connection()
     try:
-        test_cases_data = json.loads(test_Cases)  # Convert string JSON to Python dict
-        validated_data = TestCasesSchema(**test_cases_data)  # Validate with Pydantic
+        with conn.cursor() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO function_test_cases (job_id, user_story_id, result, submitted_at)
+                SELECT job_id, %s, %s, submitted_at
+                FROM scheduled_jobs
+                WHERE job_id = %s
+                RETURNING test_case_id, submitted_at
+                """,
+                (user_story_id, json.dumps(test_cases), job_id),
+            )
+            row = cursor.fetchone()
+        conn.commit()
+        return (row["test_case_id"], row["submitted_at"]) if row else None
 
-        with open(file_path, "w") as file:
-            json.dump(validated_data.dict(), file, indent=4)
+    except Exception:
+        conn.rollback()
+        raise
 
-        print(f"Test cases stored successfully in {file_path}")
+    finally:
+        conn.close()
+
+
+def _store_batch(job_id: int, user_story_id: str, test_cases: list, index_duplicates: bool):
+    row = _insert_batch(job_id, user_story_id, test_cases)
+    if index_duplicates and row is not None:
+        # Best effort: the worker's end-of-job sweep indexes anything missed.
+        try:
+            index_unindexed(test_case_row=row)
+        except Exception:
+            logger.exception("Job %s: duplicate-detection indexing of a batch failed", job_id)
+
+
+async def store_test_case_stream(
+    chunks: AsyncIterable[str],
+    job_id: int,
+    user_story_id: str,
+    batch_size: int = STORE_BATCH_SIZE,
+    keep: Optional[List[dict]] = None,
+    index_duplicates: bool = False,
+) -> int:
+    """
+    Parse test cases out of an LLM token stream as they complete, validate
+    each one and persist them to function_test_cases in batches, so the first
+    results are visible before the model has finished.
+
+    :param keep: optional list that receives every stored test case (e.g. for
+        a follow-up automation-script prompt).
+    :param index_duplicates: sign each stored batch into the project's
+        MinHash/LSH index (tools.minhash) as it lands.
+    :return: number of test cases stored.
+    """
+    parser = TestCaseStreamParser()
+    batch, stored = [], 0
+    async for chunk in chunks:
+        batch.extend(parser.feed(chunk))
+        if len(batch) >= batch_size:
+            await asyncio.to_thread(_store_batch, job_id, user_story_id, batch, index_duplicates)
+            stored += len(batch)
+            if keep is not None:
+                keep.extend(batch)
+            batch = []
+
+    if batch:
+        await asyncio.to_thread(_store_batch, job_id, user_story_id, batch, index_duplicates)
+        stored += len(batch)
+        if keep is not None:
+            keep.extend(batch)
+
+    if not parser.complete:
+        raise ValueError(
+            f"LLM output for {user_story_id} ended before the test_cases array closed "
+            f"({stored} stored, {parser.invalid} invalid)"
+        )
+    return stored
+
+
+def store_test_cases(test_Cases: str, job_id: int, user_story_id: str) -> int:
+    """
+    Validates a complete LLM output string and stores its test cases in
+    function_test_cases.
+
+    :param test_Cases: JSON string containing test case data.
+    :return: number of test cases stored.
+    """
+    async def single_chunk():
+        yield test_Cases
 
-    except Exception as e:
-        print(f"Error storing test cases: {e}")
\ No newline at end of file
+    return asyncio.run(store_test_case_stream(single_chunk(), job_id, user_story_id))
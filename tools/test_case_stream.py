@@ -0,0 +1,93 @@
+import json
+import logging
+from typing import Any, Dict, List
+
+from pydantic import ValidationError
+
+from schemas.test_case import TestCase
+
+logger = logging.getLogger(__name__)
+
+
+class TestCaseStreamParser:
+    """
+    Incrementally extracts test cases from an LLM token stream shaped like
+    {"test_cases": [{...}, {...}]} (a bare top-level array also works).
+
+    feed() returns the test cases whose closing brace arrived in that chunk,
+    already validated against schemas.test_case.TestCase. Only the text of
+    the test case currently being received is buffered, so memory does not
+    grow with the size of the whole response. Text outside the JSON (e.g. a
+    ```json fence) is ignored.
+    """
+
+    def __init__(self):
+        self._stack: List[str] = []  # open containers: "{" or "["
+        self._items_depth = None  # stack depth of the test_cases array
+        self._in_string = False
+        self._escape = False
+        self._key_chars: List[str] = []
+        self._last_key = None
+        self._capture: List[str] = []  # text of the test case being received
+        self._capturing = False
+        self.invalid = 0
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        completed = []
+        for ch in chunk:
+            if self._capturing:
+                self._capture.append(ch)
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if len(self._stack) == 1 and self._stack[0] == "{":
+                        self._last_key = "".join(self._key_chars)
+                elif len(self._stack) == 1:
+                    self._key_chars.append(ch)
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                self._key_chars = []
+            elif ch in "{[":
+                if ch == "[" and self._items_depth is None and (
+                    not self._stack or (len(self._stack) == 1 and self._last_key == "test_cases")
+                ):
+                    self._items_depth = len(self._stack) + 1
+                elif ch == "{" and self._items_depth is not None and len(self._stack) == self._items_depth:
+                    self._capturing = True
+                    self._capture = [ch]
+                self._stack.append(ch)
+            elif ch in "}]":
+                if not self._stack:
+                    continue
+                self._stack.pop()
+                if self._capturing and ch == "}" and len(self._stack) == self._items_depth:
+                    self._capturing = False
+                    test_case = self._validate("".join(self._capture))
+                    self._capture = []
+                    if test_case is not None:
+                        completed.append(test_case)
+                elif ch == "]" and self._items_depth is not None and len(self._stack) < self._items_depth:
+                    self._items_depth = -1  # array closed; ignore anything after it
+        return completed
+
+    def _validate(self, text: str):
+        try:
+            return TestCase.model_validate(json.loads(text)).model_dump(by_alias=True)
+        except (json.JSONDecodeError, ValidationError) as e:
+            self.invalid += 1
+            logger.warning("Skipping invalid test case from stream: %s", e)
+            return None
+
+    @property
+    def complete(self) -> bool:
+        """
+        True once the test_cases array has been closed.
+        """
+        return self._items_depth == -1
@@ -0,0 +1,324 @@
+"""
+Test generation worker.
+
+generate_functional_tests_job(job_id) is the queue entrypoint, published via
+the outbox for app.submit_tests and app.regenerate_job. Within one process a job's stories
+are processed concurrently, so an I/O-bound job keeps up to LLM_MAX_IN_FLIGHT
+model calls in flight instead of idling on one at a time. Calls go through
+rate_limiter (shared Redis token buckets + adaptive concurrency). Test cases
+are parsed out of the model's token stream, validated one by one and stored
+in small batches as they arrive (tools.store_test_cases); automation scripts
+are written in batched transactions. While a job runs the worker holds a
+heartbeat-renewed lease on it (leases.py); each worker process also runs the
+reaper that re-queues jobs whose worker died, the outbox relay that
+publishes enqueue intents to the queue (outbox.py) and periodic archival of
+old results (archive.py). Each stored batch of test cases is signed into
+the project's MinHash/LSH index (tools.minhash) for redundant-test
+detection as it lands.
+
+Run a worker (in-process jobs, so metrics and concurrency share one process):
+
+    python worker.py
+
+Run a single job offline with the stub model:
+
+    LLM_BACKEND=stub python worker.py --job 42
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+import archive
+import leases
+import metrics
+import outbox
+import sql_profiler
+from db import get_connection
+from job_queue import get_job_queue
+from llm import FRAMEWORK_FILE_NAMES, get_backend
+from rate_limiter import govern
+from tools.minhash import index_unindexed
+from tools.store_test_cases import store_test_case_stream
+
+logger = logging.getLogger("worker")
+
+LLM_MAX_IN_FLIGHT = int(os.environ.get("LLM_MAX_IN_FLIGHT", "8"))
+WORKER_WRITE_BATCH = int(os.environ.get("WORKER_WRITE_BATCH", "20"))
+# Run the outbox relay in this process (disable when it runs as `python outbox.py`).
+OUTBOX_RELAY_IN_WORKER = os.environ.get("OUTBOX_RELAY_IN_WORKER", "1") == "1"
+
+
+class ResultWriter:
+    """
+    Buffers per-story automation scripts and writes them in batched transactions.
+    Flushes run in a thread so DB round trips don't stall in-flight LLM calls.
+    """
+
+    def __init__(self, job_id: int, batch_size: int = WORKER_WRITE_BATCH):
+        self.job_id = job_id
+        self.batch_size = batch_size
+        self.script_rows = []  # (user_story_id, script json)
+        self._lock = asyncio.Lock()
+
+    async def add(self, user_story_id: str, script: dict):
+        self.script_rows.append((user_story_id, json.dumps(script)))
+        if len(self.script_rows) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self):
+        async with self._lock:
+            script_rows, self.script_rows = self.script_rows, []
+            if script_rows:
+                await asyncio.to_thread(self._write, script_rows)
+
+    def _write(self, script_rows: list):
+        conn = get_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.executemany(
+                    """
+                    INSERT INTO automation_scripts (user_story_id, script, submitted_at)
+                    SELECT %s, %s, submitted_at
+                    FROM scheduled_jobs
+                    WHERE job_id = %s
+                    """,
+                    [row + (self.job_id,) for row in script_rows],
+                )
+            conn.commit()
+
+        except Exception:
+            conn.rollback()
+            raise
+
+        finally:
+            conn.close()
+
+
+def _start_job(job_id: int, enqueue_key: str = None):
+    """
+    Lease the job and mark it IN_PROGRESS, clear results from a previous run
+    and load its stories. Raises leases.LeaseHeld if another worker has it and
+    leases.StaleDelivery for a repeated or superseded queue message.
+    """
+    conn = get_connection()
+    try:
+        with conn.cursor() as cursor:
+            started = leases.acquire(cursor, job_id, enqueue_key)
+            if not started:
+                return None, []
+
+            # Retried jobs replace results from the failed attempt.
+            submitted_at = started["submitted_at"]
+            cursor.execute(
+                "DELETE FROM function_test_cases WHERE job_id = %s AND submitted_at = %s",
+                (job_id, submitted_at),
+            )
+            cursor.execute(
+                """
+                DELETE FROM automation_scripts
+                WHERE submitted_at = %s
+                  AND user_story_id IN (
+                      SELECT user_story_id FROM user_stories WHERE job_id = %s AND submitted_at = %s
+                  )
+                """,
+                (submitted_at, job_id, submitted_at),
+            )
+
+            cursor.execute(
+                """
+                SELECT user_story_id, user_story_text, acceptance_criteria
+                FROM user_stories
+                WHERE job_id = %s AND submitted_at = %s
+                ORDER BY user_story_id
+                """,
+                (job_id, submitted_at),
+            )
+            stories = cursor.fetchall()
+
+        conn.commit()
+        metrics.record_job_transition(started["previous_status"], "IN_PROGRESS")
+        return started, stories
+
+    except Exception:
+        conn.rollback()
+        raise
+
+    finally:
+        conn.close()
+
+
+def _finish_job(job_id: int, status: str, attempt_id: int) -> bool:
+    conn = get_connection()
+    try:
+        with conn.cursor() as cursor:
+            elapsed = leases.release(cursor, job_id, attempt_id, status)
+        conn.commit()
+    finally:
+        conn.close()
+    if elapsed is None:
+        logger.error("Job %s: lease lost before finishing; %s not recorded", job_id, status)
+        return False
+    metrics.record_job_transition("IN_PROGRESS", status)
+    metrics.observe_job_finished(elapsed, status)
+    return True
+
+
+async def _process_story(job_id: int, story: dict, framework: str, backend, writer: ResultWriter):
+    test_cases = []
+    await store_test_case_stream(
+        backend.stream_test_cases(story["user_story_text"], story["acceptance_criteria"]),
+        job_id,
+        story["user_story_id"],
+        keep=test_cases if framework else None,
+        index_duplicates=True,
+    )
+
+    if framework:
+        code = await backend.generate_automation_script(story["user_story_text"], test_cases, framework)
+        await writer.add(story["user_story_id"], {
+            "framework": framework,
+            "file_name": FRAMEWORK_FILE_NAMES.get(framework, "generated_test.txt"),
+            "code": code,
+        })
+
+
+_loop = None
+_governed_backend = None
+
+
+def _event_loop() -> asyncio.AbstractEventLoop:
+    """
+    The worker process's event loop. Jobs run one after another on the same
+    loop so the governed backend below can be shared between them.
+    """
+    global _loop
+    if _loop is None or _loop.is_closed():
+        _loop = asyncio.new_event_loop()
+    return _loop
+
+
+def governed_backend():
+    """
+    The process-wide rate-limited backend, built on first use inside the
+    worker's event loop. Its AIMD window and Redis client carry over from
+    job to job instead of restarting with each one.
+    """
+    global _governed_backend
+    if _governed_backend is None:
+        _governed_backend = govern(get_backend(), LLM_MAX_IN_FLIGHT)
+    return _governed_backend
+
+
+async def run_job(job_id: int, backend=None, enqueue_key: str = None) -> str:
+    """
+    Generate and store test cases for every story in the job, calling the
+    model through `backend` (default: governed_backend()).
+    Returns the final job status.
+    """
+    try:
+        job, stories = await asyncio.to_thread(_start_job, job_id, enqueue_key)
+    except leases.LeaseHeld as e:
+        logger.warning("Skipping duplicate delivery: %s", e)
+        return "LEASED"
+    except leases.StaleDelivery as e:
+        logger.info("Skipping delivery: %s", e)
+        return "STALE"
+    if job is None:
+        logger.warning("Job %s not found; skipping", job_id)
+        return "MISSING"
+
+    started = time.monotonic()
+    backend = backend or governed_backend()
+    writer = ResultWriter(job_id)
+    work = asyncio.gather(
+        *(_process_story(job_id, story, job["framework_choice"], backend, writer) for story in stories),
+        return_exceptions=True,
+    )
+    heartbeat = asyncio.create_task(leases.heartbeat(job_id, job["attempt_id"], work))
+    try:
+        results = await work
+        await writer.flush()
+    except asyncio.CancelledError:
+        # Cancelled by the heartbeat because the lease was lost.
+        if not heartbeat.done() or heartbeat.cancelled():
+            raise
+        return "LEASE_LOST"
+    finally:
+        heartbeat.cancel()
+
+    failures = 0
+    for story, result in zip(stories, results):
+        if isinstance(result, BaseException):
+            failures += 1
+            logger.error("Story %s failed: %r", story["user_story_id"], result)
+
+    # Feeds the throughput estimate admission control uses for queue wait.
+    try:
+        await asyncio.to_thread(get_job_queue().record_throughput, len(stories), time.monotonic() - started)
+    except Exception:
+        logger.exception("Job %s: failed to record throughput", job_id)
+
+    # Batches are indexed as they are stored; this sweeps up any that failed.
+    try:
+        indexed = await asyncio.to_thread(index_unindexed, job_id=job_id)
+        if indexed:
+            logger.info("Job %s: indexed %d missed test cases for duplicate detection", job_id, indexed)
+    except Exception:
+        logger.exception("Job %s: duplicate-detection indexing failed", job_id)
+
+    status = "FAILED" if failures else "COMPLETED"
+    if not await asyncio.to_thread(_finish_job, job_id, status, job["attempt_id"]):
+        return "LEASE_LOST"
+    logger.info("Job %s %s: %d stories, %d failed", job_id, status, len(stories), failures)
+    return status
+
+
+def generate_functional_tests_job(job_id, enqueue_key=None):
+    """
+    Queue entrypoint. enqueue_key is the outbox idempotency key (absent for
+    messages enqueued before the outbox and for --job runs).
+    """
+    with sql_profiler.profile(f"job {job_id}"):
+        return _event_loop().run_until_complete(run_job(int(job_id), enqueue_key=enqueue_key))
+
+
+def index_project_duplicates(user_id, project_name):
+    """
+    RQ entrypoint: backfill the MinHash/LSH index for a whole project.
+    """
+    return index_unindexed(user_id=int(user_id), project_name=project_name)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Functional test generation worker")
+    parser.add_argument("--job", type=int, help="run a single job and exit")
+    parser.add_argument("--burst", action="store_true", help="exit when the queue is empty")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=os.environ.get("LOG_LEVEL", "INFO").upper(),
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    if args.job is not None:
+        print(generate_functional_tests_job(args.job))
+        return
+
+    metrics.start_worker_metrics_server()
+    leases.start_reaper()
+    if OUTBOX_RELAY_IN_WORKER:
+        outbox.start_relay()
+    if archive.ARCHIVE_INTERVAL > 0:
+        archive.start_archiver()
+    get_job_queue().work(burst=args.burst)
+
+
+if __name__ == "__main__":
+    main()